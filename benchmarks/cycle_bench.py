@@ -0,0 +1,186 @@
+"""Fleet-scale benchmark for the monitoring cycle.
+
+Builds a fleet of local fake targets (80% accepting, 15% refusing, 5% black-holed),
+runs one `run_cycle` in which every offline target confirms a transition, then drains
+the outbox into a local fake Telegram API. Each size runs in a fresh process so peak RSS
+is per size.
+
+    python benchmarks/cycle_bench.py                     # compare against baseline.json
+    python benchmarks/cycle_bench.py --update-baseline   # record a new baseline
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import resource
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SRC_DIR = ROOT_DIR / "src"
+BENCH_DIR = Path(__file__).resolve().parent
+for path in (SRC_DIR, BENCH_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+DEFAULT_SIZES = (10, 100, 1_000, 10_000)
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+REFUSED_BUCKETS = frozenset({3, 10, 17})
+BLACKHOLED_BUCKETS = frozenset({6})
+
+
+def run_size(size: int, timeout: float, concurrency: int, engine: str) -> dict[str, float]:
+    from fakes import FakeFleet, FakeTelegram, loopback_host, raise_fd_limit
+
+    from lumenguard import runner
+    from lumenguard.config import RuntimeConfig
+    from lumenguard.outbox import Outbox, drain_outbox
+
+    raise_fd_limit()
+    probe_attempts = 0
+    probe_targets = runner.probe_targets
+
+    def counting_probe_targets(*args, **kwargs):
+        nonlocal probe_attempts
+        results = probe_targets(*args, **kwargs)
+        probe_attempts += sum(result.total_attempts for result in results)
+        return results
+
+    runner.probe_targets = counting_probe_targets
+
+    with FakeFleet() as fleet, FakeTelegram() as telegram:
+        targets = []
+        for index in range(size):
+            host = loopback_host(index + 1)
+            bucket = index % 20
+            if bucket in REFUSED_BUCKETS:
+                host, port = fleet.refused(host)
+            elif bucket in BLACKHOLED_BUCKETS:
+                host, port = fleet.blackholed(host)
+            else:
+                host, port = fleet.online(host)
+            targets.append(
+                {
+                    "id": f"target-{index}",
+                    "name": f"Об'єкт {index}",
+                    "host": host,
+                    "port": port,
+                    "chat_id": f"-100{index % 50}",
+                }
+            )
+
+        config = RuntimeConfig.model_validate(
+            {
+                "telegram_bot_token": "123456789:AABenchmarkToken",
+                "telegram_api_base_url": telegram.base_url,
+                "monitor_config": targets,
+                "check_timeout_seconds": timeout,
+                "check_attempts": 2,
+                "check_attempt_delay_seconds": 0.1,
+                "check_concurrency": concurrency,
+                "probe_engine": engine,
+                "offline_confirmation_cycles": 1,
+                "online_confirmation_cycles": 1,
+            }
+        )
+        now = datetime.now(timezone.utc)
+        state = {
+            target["id"]: {"status": "online", "changed_at": (now - timedelta(hours=1)).isoformat()}
+            for target in targets
+        }
+        outbox = Outbox()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            runner.run_cycle(config, state, now=now, outbox=outbox)
+            cycle_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            report = drain_outbox(outbox, runner.notifier_for(config), now=now)
+            drain_seconds = time.perf_counter() - started
+
+    return {
+        "targets": size,
+        "wall_seconds": round(cycle_seconds, 4),
+        "probes_per_second": round(probe_attempts / cycle_seconds, 1),
+        "messages": report.sent,
+        "messages_per_second": round(report.sent / drain_seconds, 1) if drain_seconds else 0.0,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _run_isolated(size: int, timeout: float, concurrency: int, engine: str) -> dict[str, float]:
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(run_size, (size, timeout, concurrency, engine))
+
+
+def _compare(results: list[dict[str, float]], baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for result in results:
+        reference = baseline.get("results", {}).get(str(result["targets"]))
+        if not reference:
+            continue
+        limit = reference["wall_seconds"] * (1 + tolerance)
+        if result["wall_seconds"] > limit:
+            regressions.append(
+                f"{result['targets']} цілей: {result['wall_seconds']:.3f} с > {limit:.3f} с "
+                f"(baseline {reference['wall_seconds']:.3f} с)"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="LUMENGUARD cycle benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--timeout", type=float, default=0.5, help="CHECK_TIMEOUT_SECONDS для стенду")
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--engine", choices=("asyncio", "selector", "blocking"), default="asyncio")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Допустиме сповільнення (0.5 = +50%)")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        result = _run_isolated(size, args.timeout, args.concurrency, args.engine)
+        results.append(result)
+        print(
+            f"{result['targets']:>6} цілей: {result['wall_seconds']:.3f} с, "
+            f"{result['probes_per_second']:.0f} перевірок/с, "
+            f"{result['messages_per_second']:.0f} повідомлень/с ({result['messages']}), "
+            f"RSS {result['peak_rss_mb']:.0f} МБ"
+        )
+
+    if args.update_baseline:
+        payload = {
+            "timeout_seconds": args.timeout,
+            "concurrency": args.concurrency,
+            "engine": args.engine,
+            "results": {str(result["targets"]): result for result in results},
+        }
+        args.baseline.write_text(json.dumps(payload, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"Baseline записано: {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    if baseline.get("engine", "asyncio") != args.engine:
+        print(f"Baseline записано для рушія {baseline.get('engine', 'asyncio')}, порівняння пропущено.")
+        return 0
+
+    regressions = _compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print(f"Регресія: {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Local stand-ins for monitored targets and the Telegram Bot API used by the benchmarks."""
+
+from __future__ import annotations
+
+import json
+import resource
+import selectors
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def raise_fd_limit() -> int:
+    """Lift the soft open-files limit to the hard limit; return the new soft limit."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+def loopback_host(index: int) -> str:
+    """Distinct 127.x.y.z address per index, so every fake target is its own endpoint."""
+    return f"127.{(index >> 16) & 0xFF}.{(index >> 8) & 0xFF}.{(index & 0xFF) or 1}"
+
+
+class FakeFleet:
+    """TCP endpoints that accept (online), refuse (offline) or black-hole (timeout) connects.
+
+    Black-holed endpoints are listeners with `listen(0)` whose single queue slot is already
+    taken, so the kernel drops further SYNs and connects run into the probe timeout.
+    """
+
+    def __init__(self) -> None:
+        self._selector = selectors.DefaultSelector()
+        self._sockets: list[socket.socket] = []
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._accept_loop, name="fake-fleet", daemon=True)
+
+    def __enter__(self) -> FakeFleet:
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._stopped.set()
+        self._thread.join()
+        self._selector.close()
+        for sock in self._sockets:
+            sock.close()
+
+    def online(self, host: str) -> tuple[str, int]:
+        listener = socket.socket()
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((host, 0))
+        listener.listen(1024)
+        listener.setblocking(False)
+        self._sockets.append(listener)
+        self._selector.register(listener, selectors.EVENT_READ)
+        return listener.getsockname()
+
+    def refused(self, host: str) -> tuple[str, int]:
+        with socket.socket() as sock:
+            sock.bind((host, 0))
+            return sock.getsockname()
+
+    def blackholed(self, host: str) -> tuple[str, int]:
+        listener = socket.socket()
+        listener.bind((host, 0))
+        listener.listen(0)
+        address = listener.getsockname()
+        filler = socket.create_connection(address, timeout=1.0)
+        self._sockets.extend([listener, filler])
+        return address
+
+    def _accept_loop(self) -> None:
+        while not self._stopped.is_set():
+            for key, _ in self._selector.select(timeout=0.1):
+                try:
+                    connection, _ = key.fileobj.accept()  # type: ignore[union-attr]
+                except OSError:
+                    continue
+                connection.close()
+
+
+class FakeTelegram:
+    """Minimal `sendMessage` endpoint on localhost that counts delivered messages."""
+
+    def __init__(self) -> None:
+        self.messages = 0
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self) -> None:  # noqa: N802 - http.server naming
+                length = int(self.headers.get("Content-Length", "0"))
+                self.rfile.read(length)
+                with fake._lock:
+                    fake.messages += 1
+                    message_id = fake.messages
+                body = json.dumps({"ok": True, "result": {"message_id": message_id}}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                return
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> FakeTelegram:
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._server.shutdown()
+        self._server.server_close()
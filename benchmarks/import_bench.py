@@ -0,0 +1,97 @@
+"""Import-time (cold start) benchmark for the entrypoints.
+
+Runs `python -X importtime -c "import <module>"` in fresh interpreters, reports the median
+cumulative import time per module and the heaviest dependencies, and fails when a module
+exceeds its budget.
+
+    python benchmarks/import_bench.py
+    python benchmarks/import_bench.py --runs 10 --top 15
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SRC_DIR = ROOT_DIR / "src"
+
+# Budgets in milliseconds; pydantic dominates everything that loads the config.
+BUDGETS_MS = {
+    "lumenguard": 20.0,
+    "lumenguard.logic": 120.0,
+    "lumenguard.runner": 400.0,
+}
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def import_times(module: str) -> dict[str, tuple[float, float, int]]:
+    """`{name: (self_ms, cumulative_ms, depth)}` for `module` and everything it imported.
+
+    Imports done by the interpreter itself (`site`, `encodings`, ...) are left out.
+    """
+    env = {**os.environ, "PYTHONPATH": str(SRC_DIR)}
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    times: dict[str, tuple[float, float, int]] = {}
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        depth = len(indent) // 2
+        times[name] = (int(self_us) / 1000, int(cumulative_us) / 1000, depth)
+        if depth == 0 and name != module:
+            times.clear()
+    return times
+
+
+def measure(module: str, runs: int) -> tuple[float, list[tuple[str, float]]]:
+    """Median cumulative time of `module` and median cumulative time of its direct-ish dependencies."""
+    samples = [import_times(module) for _ in range(runs)]
+    total = statistics.median(sample[module][1] for sample in samples)
+    names = {name for sample in samples for name, (_, _, depth) in sample.items() if depth <= 2}
+    names.discard(module)
+    heaviest = sorted(
+        ((name, statistics.median(sample.get(name, (0.0, 0.0, 0))[1] for sample in samples)) for name in names),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    return total, heaviest
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="LUMENGUARD import-time benchmark")
+    parser.add_argument("--modules", nargs="+", default=list(BUDGETS_MS))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="Скільки найважчих залежностей показати")
+    args = parser.parse_args()
+
+    over_budget = []
+    for module in args.modules:
+        total, heaviest = measure(module, args.runs)
+        budget = BUDGETS_MS.get(module)
+        budget_note = f" (бюджет {budget:.0f} мс)" if budget is not None else ""
+        print(f"{module}: {total:.1f} мс{budget_note}")
+        for name, milliseconds in heaviest[: args.top]:
+            print(f"    {name:<40} {milliseconds:8.1f} мс")
+        if budget is not None and total > budget:
+            over_budget.append(f"{module}: {total:.1f} мс > {budget:.0f} мс")
+
+    for line in over_budget:
+        print(f"Перевищено бюджет: {line}")
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
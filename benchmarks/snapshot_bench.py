@@ -0,0 +1,86 @@
+"""State persistence benchmark: `state.json` vs the binary snapshot.
+
+Measures save and full load of the whole state, the file size, and a single-target lookup
+through the memory-mapped `SnapshotReader` (no full parse).
+
+    python benchmarks/snapshot_bench.py
+    python benchmarks/snapshot_bench.py --targets 100000 --runs 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SRC_DIR = ROOT_DIR / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from state_bench import build_fleet  # noqa: E402
+
+from lumenguard.logic import load_state, save_state  # noqa: E402
+from lumenguard.snapshot import SnapshotReader, load_snapshot, write_snapshot  # noqa: E402
+from lumenguard.state_table import StateTable  # noqa: E402
+
+
+def _median_seconds(action, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        action()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def run(size: int, runs: int) -> None:
+    states, _ = build_fleet(size)
+    states = StateTable.from_states(states).to_states()
+    probe_id = f"target-{size // 2}"
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = Path(directory) / "state.json"
+        snapshot_path = Path(directory) / "state.lgs"
+
+        json_save = _median_seconds(lambda: save_state(json_path, states), runs)
+        json_load = _median_seconds(lambda: load_state(json_path), runs)
+        table = StateTable.from_states(states)
+        snapshot_save = _median_seconds(lambda: write_snapshot(snapshot_path, table), runs)
+        snapshot_load = _median_seconds(lambda: load_snapshot(snapshot_path), runs)
+
+        def lookup() -> None:
+            with SnapshotReader(snapshot_path) as reader:
+                reader.get(probe_id)
+
+        snapshot_lookup = _median_seconds(lookup, runs)
+        assert load_snapshot(snapshot_path).to_states() == load_state(json_path)
+
+        json_bytes = json_path.stat().st_size
+        snapshot_bytes = snapshot_path.stat().st_size
+
+    print(f"{size} цілей:")
+    print(f"  state.json: запис {json_save * 1000:8.1f} мс, читання {json_load * 1000:8.1f} мс, {json_bytes / 2**20:6.2f} МБ")
+    print(
+        f"  знімок:     запис {snapshot_save * 1000:8.1f} мс, читання {snapshot_load * 1000:8.1f} мс, "
+        f"{snapshot_bytes / 2**20:6.2f} МБ"
+    )
+    print(f"  одна ціль через mmap: {snapshot_lookup * 1_000_000:.0f} мкс")
+    print(f"  читання {json_load / snapshot_load:.1f}× швидше, файл {json_bytes / snapshot_bytes:.1f}× менший")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="LUMENGUARD state snapshot benchmark")
+    parser.add_argument("--targets", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    for size in args.targets:
+        run(size, args.runs)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""State representation benchmark: dict-of-dicts + `compare_states` vs `StateTable` batch.
+
+Builds a fleet where most targets are stable and a few have pending or confirmed
+transitions, then measures one comparison pass and the memory held by the state.
+
+    python benchmarks/state_bench.py
+    python benchmarks/state_bench.py --targets 100000 --runs 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SRC_DIR = ROOT_DIR / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from lumenguard.logic import compare_states  # noqa: E402
+from lumenguard.state_table import StateTable, compare_states_batch  # noqa: E402
+
+NOW = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def build_fleet(size: int, seed: int = 1) -> tuple[dict[str, dict], list[bool]]:
+    rng = random.Random(seed)
+    states: dict[str, dict] = {}
+    observations: list[bool] = []
+    for index in range(size):
+        online = rng.random() < 0.8
+        state = {
+            "status": "online" if online else "offline",
+            "changed_at": (NOW - timedelta(seconds=rng.randint(60, 10**6))).isoformat(),
+        }
+        if rng.random() < 0.02:
+            state["pending_status"] = "offline" if online else "online"
+            state["pending_count"] = 1
+            state["pending_since"] = (NOW - timedelta(minutes=5)).isoformat()
+        states[f"target-{index}"] = state
+        observations.append(online if rng.random() < 0.97 else not online)
+    return states, observations
+
+
+def _held_bytes(build) -> tuple[object, int]:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return value, held
+
+
+def run(size: int, runs: int) -> None:
+    source, observations = build_fleet(size)
+    dict_states, dict_bytes = _held_bytes(lambda: copy.deepcopy(source))
+    table, table_bytes = _held_bytes(lambda: StateTable.from_states(source))
+
+    dict_seconds = []
+    table_seconds = []
+    for _ in range(runs):
+        states = copy.deepcopy(source)
+        started = time.perf_counter()
+        for (target_id, state), is_online in zip(states.items(), observations):
+            comparison = compare_states(state, is_online, now=NOW, offline_confirmation_cycles=2)
+            if comparison.state_updated:
+                states[target_id] = comparison.new_state
+        dict_seconds.append(time.perf_counter() - started)
+
+        batch_table = StateTable.from_states(source)
+        rows = batch_table.rows(source)
+        started = time.perf_counter()
+        compare_states_batch(batch_table, rows, observations, now=NOW, offline_confirmation_cycles=2)
+        table_seconds.append(time.perf_counter() - started)
+
+    del dict_states, table
+    dict_median = statistics.median(dict_seconds)
+    table_median = statistics.median(table_seconds)
+    print(f"{size} цілей:")
+    print(f"  dict + compare_states:   {dict_median * 1000:8.1f} мс, стан {dict_bytes / 2**20:7.1f} МБ")
+    print(f"  StateTable + batch:      {table_median * 1000:8.1f} мс, стан {table_bytes / 2**20:7.1f} МБ")
+    print(f"  прискорення {dict_median / table_median:.1f}×, пам'ять {dict_bytes / table_bytes:.1f}× менше")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="LUMENGUARD state table benchmark")
+    parser.add_argument("--targets", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    for size in args.targets:
+        run(size, args.runs)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,9 @@
 from __future__ import annotations
 
+import time
+
+_STARTED = time.perf_counter()
+
 import argparse
 import sys
 from pathlib import Path
@@ -11,6 +15,8 @@ if str(SRC_DIR) not in sys.path:
 
 from lumenguard.runner import run_forever, run_once_file_state
 
+IMPORT_SECONDS = time.perf_counter() - _STARTED
+
 
 def _parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="LUMENGUARD monitor")
@@ -21,6 +27,6 @@ def _parse_args() -> argparse.Namespace:
 if __name__ == "__main__":
     args = _parse_args()
     if args.once:
-        run_once_file_state()
+        run_once_file_state(cold_start_seconds=IMPORT_SECONDS)
     else:
         run_forever()
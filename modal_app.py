@@ -1,13 +1,14 @@
 from __future__ import annotations
 
+import time
+
+_STARTED = time.perf_counter()
+
+import os
 import sys
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
-try:
-    import tomllib
-except ModuleNotFoundError:
-    tomllib = None
-
 import modal
 
 ROOT_DIR = Path(__file__).resolve().parent
@@ -16,7 +17,31 @@ if str(SRC_DIR) not in sys.path:
     sys.path.insert(0, str(SRC_DIR))
 
 from lumenguard.config import load_runtime_config
-from lumenguard.runner import coerce_state, run_cycle
+from lumenguard.history import MappingTransitionHistory, history_report, move_mapping_history
+from lumenguard.metrics import CycleMetrics, MetricsSummary
+from lumenguard.outbox import Outbox
+from lumenguard.runner import deliver_outbox, run_cycle
+from lumenguard.sharding import run_shard, run_sharded_cycle, shard_count_for
+from lumenguard.state_store import MappingStateStore, StateLease
+from lumenguard.vantage import Vantage, local_vantage, run_vantage_probe
+
+OUTBOX_DELIVERY_SECONDS = 240
+CRON_PERIOD_SECONDS = 300
+# A cycle is killed before the next cron tick, and its lease outlives the cycle but expires
+# before that tick too, so a run killed at the timeout never makes the next one skip.
+CYCLE_TIMEOUT_SECONDS = CRON_PERIOD_SECONDS - 30
+LEASE_TTL_SECONDS = CYCLE_TIMEOUT_SECONDS + 10
+
+# Deploy-time switches (read from the local environment by `modal deploy`):
+# a memory snapshot restores the container with lumenguard and pydantic already imported,
+# and warm containers skip the cold start altogether at the cost of idle billing.
+MEMORY_SNAPSHOT = os.getenv("LUMENGUARD_MEMORY_SNAPSHOT", "false").lower() in {"1", "true", "yes"}
+MIN_CONTAINERS = int(os.getenv("LUMENGUARD_MIN_CONTAINERS", "0"))
+# Extra probe regions, e.g. "eu-west-1,us-east-1": each gets its own probe function pinned there,
+# and every target's status is the consensus of the cron container and those regions.
+VANTAGE_REGIONS = [
+    region.strip() for region in os.getenv("LUMENGUARD_VANTAGE_REGIONS", "").split(",") if region.strip()
+]
 
 DEFAULT_DEPENDENCIES = [
     "httpx>=0.27,<1.0",
@@ -27,10 +52,13 @@ DEFAULT_DEPENDENCIES = [
 
 
 def _project_dependencies() -> list[str]:
+    """Dependencies for the image; only parsed locally, the container never rebuilds it."""
     pyproject_path = ROOT_DIR / "pyproject.toml"
-    if tomllib is None or not pyproject_path.exists():
+    if not modal.is_local() or not pyproject_path.exists():
         return DEFAULT_DEPENDENCIES
 
+    import tomllib
+
     with pyproject_path.open("rb") as fp:
         data = tomllib.load(fp)
     dependencies = data.get("project", {}).get("dependencies")
@@ -43,27 +71,167 @@ app = modal.App("lumenguard-modal")
 image = (
     modal.Image.debian_slim(python_version="3.12")
     .pip_install(*_project_dependencies())
+    .env({"LUMENGUARD_VANTAGE_REGIONS": ",".join(VANTAGE_REGIONS)})
     .add_local_dir("src", "/root/src", copy=True)
 )
+# Targets come from MONITOR_CONFIG or a catalog file (MONITOR_CONFIG_PATH); load_runtime_config checks that one is set.
 config_secret = modal.Secret.from_name(
     "lumenguard-config",
-    required_keys=["TELEGRAM_BOT_TOKEN", "MONITOR_CONFIG"],
+    required_keys=["TELEGRAM_BOT_TOKEN"],
 )
 state_dict = modal.Dict.from_name("lumenguard-state", create_if_missing=True)
+# History blobs grow without bound; kept apart so loading the state never downloads them.
+history_dict = modal.Dict.from_name("lumenguard-history", create_if_missing=True)
+HISTORY_MOVED_KEY = "history_moved"
+outbox_dict = modal.Dict.from_name("lumenguard-outbox", create_if_missing=True)
+# Large fleets: upload a catalog file here and set MONITOR_CONFIG_PATH=/catalog/<file>.
+catalog_volume = modal.Volume.from_name("lumenguard-catalog", create_if_missing=True)
+CATALOG_MOUNT = "/catalog"
+
+_cold_start_seconds: float | None = time.perf_counter() - _STARTED
+
+
+def _observe_cold_start(metrics: CycleMetrics) -> None:
+    """Record this container's import time on its first invocation only."""
+    global _cold_start_seconds
+    if _cold_start_seconds is not None:
+        metrics.cold_start.observe(_cold_start_seconds)
+        _cold_start_seconds = None
 
 
 @app.function(
     image=image,
     schedule=modal.Cron("*/5 * * * *"),
     secrets=[config_secret],
+    timeout=CYCLE_TIMEOUT_SECONDS,
+    enable_memory_snapshot=MEMORY_SNAPSHOT,
+    min_containers=MIN_CONTAINERS,
+    volumes={CATALOG_MOUNT: catalog_volume},
 )
-def monitor_with_modal() -> None:
-    """Modal cron entrypoint: every 5 minutes."""
+def monitor_with_modal() -> MetricsSummary:
+    """Modal cron entrypoint: every 5 minutes. Returns the invocation's metrics summary."""
+    catalog_volume.reload()
     config = load_runtime_config()
+    metrics = CycleMetrics()
+    _observe_cold_start(metrics)
+
+    lease = StateLease(state_dict, ttl_seconds=LEASE_TTL_SECONDS)
+    if not lease.acquire():
+        print("Інший запуск ще працює зі станом, цей цикл пропущено.")
+        return metrics.summary()
+
+    outbox = Outbox(outbox_dict)
+    try:
+        run_time = datetime.now(timezone.utc)
+        store = MappingStateStore(state_dict)
+        _move_legacy_history()
+        history = MappingTransitionHistory(history_dict)
+        with metrics.time_state_io("prune"):
+            store.prune(target.id for target in config.monitor_config)
+        shard_count = shard_count_for(config)
+        if shard_count > 1:
+            run_sharded_cycle(
+                config,
+                store,
+                now=run_time,
+                outbox=outbox,
+                shard_count=shard_count,
+                shard_map=_map_shards,
+                metrics=metrics,
+                history=history,
+            )
+        else:
+            run_cycle(
+                config,
+                store,
+                now=run_time,
+                outbox=outbox,
+                metrics=metrics,
+                history=history,
+                vantages=_vantages(),
+            )
+        with metrics.time_state_io("flush"):
+            store.flush()
+            history.flush()
+        for target_id in store.conflicts:
+            outbox.retract(target_id, since=run_time)
+    finally:
+        lease.release()
+
+    if len(outbox):
+        deliver_notifications.spawn()
+    return metrics.summary()
+
+
+def _move_legacy_history() -> None:
+    """One-off: move history written by older deployments out of the state dict."""
+    if state_dict.get(HISTORY_MOVED_KEY):
+        return
+    moved = move_mapping_history(state_dict, history_dict)
+    state_dict[HISTORY_MOVED_KEY] = True
+    if moved:
+        print(f"Історію {moved} цілей перенесено в окремий Dict lumenguard-history.")
+
+
+@app.function(image=image, timeout=CYCLE_TIMEOUT_SECONDS, enable_memory_snapshot=MEMORY_SNAPSHOT)
+def probe_shard(config_payload: dict, shard_state: dict, now_iso: str) -> dict:
+    """Probe one shard of targets in its own container and return the state delta."""
+    return run_shard(config_payload, shard_state, now_iso)
+
+
+def _map_shards(config_payloads, shard_states, now_isos):
+    """Fan out to `probe_shard`, returning a failed shard's exception instead of raising mid-merge."""
+    return probe_shard.map(config_payloads, shard_states, now_isos, return_exceptions=True)
+
+
+def _probe_vantage(config_payload: dict, request: dict) -> list[dict]:
+    """Probe the requested targets from the region this function is pinned to."""
+    return run_vantage_probe(config_payload, request)
+
+
+VANTAGE_FUNCTIONS = {
+    region: app.function(
+        image=image,
+        region=region,
+        name=f"probe_vantage_{region.replace('-', '_')}",
+        serialized=True,
+        timeout=CYCLE_TIMEOUT_SECONDS,
+        enable_memory_snapshot=MEMORY_SNAPSHOT,
+    )(_probe_vantage)
+    for region in VANTAGE_REGIONS
+}
+
+
+def _vantages() -> list[Vantage] | None:
+    """The cron container plus one vantage per configured region; `None` probes locally only."""
+    if not VANTAGE_FUNCTIONS:
+        return None
+    return [local_vantage("cron"), *(Vantage(region, fn.remote) for region, fn in VANTAGE_FUNCTIONS.items())]
+
+
+@app.function(
+    image=image,
+    secrets=[config_secret],
+    timeout=OUTBOX_DELIVERY_SECONDS + 60,
+    enable_memory_snapshot=MEMORY_SNAPSHOT,
+    volumes={CATALOG_MOUNT: catalog_volume},
+)
+def deliver_notifications() -> MetricsSummary:
+    """Drain the notification outbox, waiting out retries for a bounded time."""
+    config = load_runtime_config()
+    metrics = CycleMetrics()
+    _observe_cold_start(metrics)
+    outbox = Outbox(outbox_dict)
+    deadline = time.monotonic() + OUTBOX_DELIVERY_SECONDS
+
+    while len(outbox) and time.monotonic() < deadline:
+        deliver_outbox(config, outbox, metrics)
+        time.sleep(1)
+    return metrics.summary()
 
-    raw_state = state_dict.get("state")
-    state = coerce_state(raw_state)
 
-    state, has_state_update = run_cycle(config, state)
-    if has_state_update:
-        state_dict["state"] = state
+@app.function(image=image)
+def outage_report(days: float = 30.0) -> list[dict]:
+    """Uptime, outage count and longest outage per target over the last `days`."""
+    end = datetime.now(timezone.utc)
+    return history_report(MappingTransitionHistory(history_dict), end - timedelta(days=days), end)
@@ -1,16 +1,45 @@
-"""LUMENGUARD monitoring package."""
-
-from .config import MonitorTarget, RuntimeConfig, load_runtime_config
-from .logic import (
-    SavedState,
-    StateComparison,
-    check_ip,
-    compare_states,
-    format_ua_message,
-    load_state,
-    save_state,
-)
-from .runner import run_cycle, run_forever, run_once_file_state, send_telegram_message
+"""LUMENGUARD monitoring package.
+
+Public names are imported on first access, so `import lumenguard.logic` (or a Modal
+container that needs only part of the package) does not pay for pydantic and httpx.
+"""
+
+from __future__ import annotations
+
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .config import MonitorTarget, RuntimeConfig, load_runtime_config
+    from .logic import (
+        SavedState,
+        StateComparison,
+        check_ip,
+        compare_states,
+        format_ua_digest,
+        format_ua_message,
+        load_state,
+        save_state,
+    )
+    from .runner import run_cycle, run_forever, run_once_file_state, send_telegram_message
+
+_EXPORTS = {
+    "MonitorTarget": "config",
+    "RuntimeConfig": "config",
+    "load_runtime_config": "config",
+    "SavedState": "logic",
+    "StateComparison": "logic",
+    "check_ip": "logic",
+    "compare_states": "logic",
+    "format_ua_digest": "logic",
+    "format_ua_message": "logic",
+    "load_state": "logic",
+    "save_state": "logic",
+    "run_cycle": "runner",
+    "run_forever": "runner",
+    "run_once_file_state": "runner",
+    "send_telegram_message": "runner",
+}
 
 __all__ = [
     "MonitorTarget",
@@ -19,6 +48,7 @@ __all__ = [
     "StateComparison",
     "check_ip",
     "compare_states",
+    "format_ua_digest",
     "format_ua_message",
     "load_runtime_config",
     "load_state",
@@ -28,3 +58,16 @@ __all__ = [
     "run_once_file_state",
     "run_forever",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *__all__])
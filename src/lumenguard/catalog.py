@@ -0,0 +1,98 @@
+"""Target catalog loaded from a file instead of the `MONITOR_CONFIG` env var.
+
+Supported formats (by extension):
+
+- `.json`: array of targets, the same shape as `MONITOR_CONFIG`;
+- `.ndjson` / `.jsonl`: one target object per line, validated line by line;
+- `.csv`: header with `id,name,host,port,chat_id` and any optional `MonitorTarget` field;
+  `endpoints` is written as `host:port;host:port`.
+
+Validation goes through precompiled `TypeAdapter`s (pydantic-core parses the JSON itself),
+and the validated targets are handed to `RuntimeConfig` as model instances, which it does
+not re-validate. The result is cached per process, keyed by a hash of the file content,
+so the daemon, config reloads and warm Modal containers skip validation
+while the file is unchanged.
+"""
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import os
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+from pydantic import TypeAdapter, ValidationError
+
+from .config import MonitorTarget
+
+NDJSON_SUFFIXES = frozenset({".ndjson", ".jsonl"})
+
+_CATALOG_ADAPTER = TypeAdapter(list[MonitorTarget])
+_TARGET_ADAPTER = TypeAdapter(MonitorTarget)
+_CACHE: dict[str, tuple[str, list[MonitorTarget]]] = {}
+
+
+def load_catalog(path: str | os.PathLike[str]) -> list[MonitorTarget]:
+    """Load and validate the target catalog at `path`, reusing the cached result when unchanged."""
+    catalog_path = Path(path)
+    try:
+        content = catalog_path.read_bytes()
+    except OSError as exc:
+        raise RuntimeError(f"Не вдалося прочитати каталог цілей {catalog_path}: {exc}") from exc
+
+    digest = catalog_digest(content, catalog_path.suffix.lower())
+    cache_key = str(catalog_path.resolve())
+    cached = _CACHE.get(cache_key)
+    if cached is not None and cached[0] == digest:
+        return cached[1]
+
+    targets = parse_catalog(content, catalog_path.suffix.lower(), source=str(catalog_path))
+    _CACHE[cache_key] = (digest, targets)
+    return targets
+
+
+def parse_catalog(content: bytes, suffix: str, *, source: str = "каталог") -> list[MonitorTarget]:
+    """Validate raw catalog bytes in the format implied by `suffix`."""
+    try:
+        if suffix in NDJSON_SUFFIXES:
+            return [_validate_line(number, line, source) for number, line in _ndjson_lines(content)]
+        if suffix == ".csv":
+            return _CATALOG_ADAPTER.validate_python(list(_csv_rows(content)))
+        return _CATALOG_ADAPTER.validate_json(content)
+    except ValidationError as exc:
+        raise RuntimeError(f"Некоректний каталог цілей {source}: {exc}") from exc
+
+
+def catalog_digest(content: bytes, suffix: str) -> str:
+    """Cache key: the file content and the format it is parsed as."""
+    return hashlib.blake2b(suffix.encode("utf-8") + b"\0" + content, digest_size=16).hexdigest()
+
+
+def _ndjson_lines(content: bytes) -> Iterator[tuple[int, bytes]]:
+    for number, line in enumerate(content.splitlines(), start=1):
+        if line.strip():
+            yield number, line
+
+
+def _validate_line(number: int, line: bytes, source: str) -> MonitorTarget:
+    try:
+        return _TARGET_ADAPTER.validate_json(line)
+    except ValidationError as exc:
+        raise RuntimeError(f"Некоректна ціль у {source}, рядок {number}: {exc}") from exc
+
+
+def _csv_rows(content: bytes) -> Iterator[dict[str, Any]]:
+    reader = csv.DictReader(io.StringIO(content.decode("utf-8-sig")))
+    for row in reader:
+        item: dict[str, Any] = {key: value for key, value in row.items() if key and value not in (None, "")}
+        if "endpoints" in item:
+            item["endpoints"] = [_csv_endpoint(value) for value in item["endpoints"].split(";") if value.strip()]
+        yield item
+
+
+def _csv_endpoint(value: str) -> dict[str, str]:
+    host, _, port = value.strip().rpartition(":")
+    return {"host": host, "port": port}
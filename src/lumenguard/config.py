@@ -2,9 +2,27 @@ from __future__ import annotations
 
 import json
 import os
+from typing import Any, Literal
 
-from dotenv import load_dotenv
-from pydantic import BaseModel, Field, ValidationError
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
+
+from .logic import EndpointRule, ProbeEngine, ProbeMode, ProbePolicy
+from .state_store import StateBackend
+
+SentinelMode = Literal["abort", "freeze"]
+VantageConsensus = Literal["majority", "any", "all", "quorum"]
+
+# Fast-track re-probes wait inside one cron run (5 min; the Modal timeout and the state lease
+# end before the next run), so their pauses must leave room for the probes and the state flush.
+FAST_TRACK_BUDGET_SECONDS = 120.0
+
+# Workers (shards, vantages) never talk to Telegram, so they get this stand-in instead of the token.
+_WORKER_BOT_TOKEN = "worker:no-telegram"
+
+
+class Endpoint(BaseModel):
+    host: str = Field(min_length=1)
+    port: int = Field(ge=1, le=65535)
 
 
 class MonitorTarget(BaseModel):
@@ -13,43 +31,209 @@ class MonitorTarget(BaseModel):
     host: str = Field(min_length=1)
     port: int = Field(ge=1, le=65535)
     chat_id: str = Field(min_length=1)
+    probe_policy: ProbeMode | None = None
+    check_attempts: int | None = Field(default=None, ge=1, le=10)
+    check_quorum: int | None = Field(default=None, ge=1, le=10)
+    check_interval_seconds: int | None = Field(default=None, ge=10, le=86400)
+    endpoints: list[Endpoint] = Field(default_factory=list)
+    endpoint_rule: EndpointRule = "any"
+    endpoint_quorum: int = Field(default=1, ge=1, le=10)
+
+    @field_validator("id")
+    @classmethod
+    def _id_without_nul(cls, value: str) -> str:
+        # NUL separates ids in the binary state snapshot.
+        if "\0" in value:
+            raise ValueError("ID цілі не може містити символ NUL")
+        return value
+
+    @model_validator(mode="before")
+    @classmethod
+    def _host_from_endpoints(cls, data: object) -> object:
+        if isinstance(data, dict) and "host" not in data and data.get("endpoints"):
+            first = data["endpoints"][0]
+            if isinstance(first, dict):
+                data = {**data, "host": first.get("host"), "port": first.get("port")}
+        return data
+
+    @model_validator(mode="after")
+    def _check_endpoint_quorum(self) -> MonitorTarget:
+        if self.endpoint_rule == "quorum" and self.endpoint_quorum > len(self.probe_endpoints):
+            raise ValueError("endpoint_quorum не може перевищувати кількість адрес цілі")
+        return self
+
+    @property
+    def probe_endpoints(self) -> list[tuple[str, int]]:
+        """Main `host:port` followed by the extra `endpoints`, without duplicates."""
+        pairs = [(self.host, self.port), *((endpoint.host, endpoint.port) for endpoint in self.endpoints)]
+        return list(dict.fromkeys(pairs))
 
 
 class RuntimeConfig(BaseModel):
     telegram_bot_token: str = Field(min_length=10)
     monitor_config: list[MonitorTarget] = Field(min_length=1)
+    monitor_config_path: str | None = None
     check_interval_seconds: int = Field(default=300, ge=60)
+    check_jitter_ratio: float = Field(default=0.1, ge=0, le=0.5)
     check_timeout_seconds: float = Field(default=3.0, gt=0)
     check_attempts: int = Field(default=3, ge=1, le=10)
     check_attempt_delay_seconds: float = Field(default=2.0, ge=0, le=30)
+    check_concurrency: int = Field(default=100, ge=1, le=10000)
+    probe_engine: ProbeEngine = "asyncio"
+    probe_policy: ProbeMode = "first_success"
+    check_quorum: int = Field(default=2, ge=1, le=10)
+    check_backoff_factor: float = Field(default=2.0, ge=1, le=10)
+    dns_timeout_seconds: float = Field(default=5.0, gt=0, le=60)
+    dns_cache_ttl_seconds: float = Field(default=300.0, ge=0)
+    dns_negative_ttl_seconds: float = Field(default=30.0, ge=0)
     offline_confirmation_cycles: int = Field(default=2, ge=1, le=10)
     online_confirmation_cycles: int = Field(default=2, ge=1, le=10)
+    confirmation_probe_delay_seconds: float = Field(default=0.0, ge=0, le=60)
+    sentinel_endpoints: list[Endpoint] = Field(default_factory=list)
+    sentinel_quorum: int = Field(default=1, ge=1, le=10)
+    sentinel_mode: SentinelMode = "freeze"
+    vantage_consensus: VantageConsensus = "majority"
+    vantage_quorum: int = Field(default=1, ge=1, le=50)
     include_target_name_in_message: bool = False
+    telegram_api_base_url: str = Field(default="https://api.telegram.org", min_length=1)
+    telegram_http2: bool = False
+    telegram_max_connections: int = Field(default=8, ge=1, le=100)
+    notify_max_attempts: int = Field(default=20, ge=1, le=1000)
+    notify_digest_threshold: int = Field(default=3, ge=0, le=1000)
+    notify_digest_window_seconds: float = Field(default=0.0, ge=0, le=600)
+    notify_queue_limit: int = Field(default=1000, ge=1, le=100_000)
+    notify_max_wait_seconds: float = Field(default=30.0, ge=0, le=600)
+    telegram_global_rate: float = Field(default=30.0, gt=0, le=1000)
+    telegram_chat_rate: float = Field(default=1.0, gt=0, le=100)
+    shard_size: int = Field(default=0, ge=0)
+    max_shards: int = Field(default=50, ge=1, le=1000)
     state_path: str = Field(default="state.json", min_length=1)
+    state_backend: StateBackend = "json"
+    outbox_path: str = Field(default="outbox.json", min_length=1)
+    history_path: str | None = "history"
+    metrics_port: int = Field(default=0, ge=0, le=65535)
+    metrics_textfile_path: str | None = None
     timezone_name: str = Field(default="Europe/Kyiv", min_length=1)
 
+    @model_validator(mode="after")
+    def _check_quorum_fits_attempts(self) -> RuntimeConfig:
+        if self.probe_policy == "quorum" and self.check_quorum > self.check_attempts:
+            raise ValueError("check_quorum не може перевищувати check_attempts")
+        if self.sentinel_endpoints and self.sentinel_quorum > len(self.sentinel_endpoints):
+            raise ValueError("sentinel_quorum не може перевищувати кількість сторожових адрес")
+        if self.confirmation_probe_delay_seconds * self.fast_track_rounds > FAST_TRACK_BUDGET_SECONDS:
+            raise ValueError(
+                "confirmation_probe_delay_seconds × (confirmation_cycles - 1) не може перевищувати "
+                f"{FAST_TRACK_BUDGET_SECONDS:g} с"
+            )
+        return self
 
-def load_runtime_config() -> RuntimeConfig:
+    @property
+    def fast_track_rounds(self) -> int:
+        """Most re-probe rounds one cycle runs to confirm a pending transition."""
+        return max(self.offline_confirmation_cycles, self.online_confirmation_cycles) - 1
+
+    def worker_payload(self) -> dict[str, Any]:
+        """Plain-data copy for shard and vantage workers, without the bot token."""
+        return self.model_dump(mode="json", exclude={"telegram_bot_token"})
+
+    @classmethod
+    def from_worker_payload(cls, payload: dict[str, Any]) -> RuntimeConfig:
+        """Rebuild a config from `worker_payload` on the worker side."""
+        return cls.model_validate({**payload, "telegram_bot_token": _WORKER_BOT_TOKEN})
+
+    def interval_for(self, target: MonitorTarget) -> int:
+        """Probe interval for a target in the long-running mode."""
+        return target.check_interval_seconds or self.check_interval_seconds
+
+    def probe_policy_for(self, target: MonitorTarget) -> ProbePolicy:
+        """Resolve the probe policy for a target, applying its per-target overrides."""
+        return ProbePolicy(
+            mode=target.probe_policy or self.probe_policy,
+            attempts=target.check_attempts or self.check_attempts,
+            delay_seconds=self.check_attempt_delay_seconds,
+            quorum=target.check_quorum or self.check_quorum,
+            backoff_factor=self.check_backoff_factor,
+        )
+
+    def sentinel_policy(self) -> ProbePolicy:
+        """Sentinels stop at the first successful connect but get the usual retries."""
+        return ProbePolicy(
+            mode="first_success",
+            attempts=self.check_attempts,
+            delay_seconds=self.check_attempt_delay_seconds,
+        )
+
+
+def load_runtime_config(
+    *,
+    dotenv_path: str | os.PathLike[str] | None = None,
+    override: bool = False,
+) -> RuntimeConfig:
     """Load and validate runtime configuration from environment variables."""
-    load_dotenv()
+    from dotenv import load_dotenv
 
-    raw_monitor_config = os.getenv("MONITOR_CONFIG", "[]")
-    try:
-        monitor_config_data = json.loads(raw_monitor_config)
-    except json.JSONDecodeError as exc:
-        raise RuntimeError("MONITOR_CONFIG має бути валідним JSON-масивом.") from exc
+    load_dotenv(dotenv_path, override=override)
+
+    monitor_config_path = os.getenv("MONITOR_CONFIG_PATH") or None
+    monitor_config_data: list[Any]
+    if monitor_config_path:
+        from .catalog import load_catalog
+
+        monitor_config_data = list(load_catalog(monitor_config_path))
+    else:
+        raw_monitor_config = os.getenv("MONITOR_CONFIG")
+        if raw_monitor_config is None:
+            raise RuntimeError("Задай цілі через MONITOR_CONFIG або MONITOR_CONFIG_PATH.")
+        try:
+            monitor_config_data = json.loads(raw_monitor_config)
+        except json.JSONDecodeError as exc:
+            raise RuntimeError("MONITOR_CONFIG має бути валідним JSON-масивом.") from exc
 
     data = {
         "telegram_bot_token": os.getenv("TELEGRAM_BOT_TOKEN", ""),
         "monitor_config": monitor_config_data,
+        "monitor_config_path": monitor_config_path,
         "check_interval_seconds": os.getenv("CHECK_INTERVAL_SECONDS", "300"),
+        "check_jitter_ratio": os.getenv("CHECK_JITTER_RATIO", "0.1"),
         "check_timeout_seconds": os.getenv("CHECK_TIMEOUT_SECONDS", "3"),
         "check_attempts": os.getenv("CHECK_ATTEMPTS", "3"),
         "check_attempt_delay_seconds": os.getenv("CHECK_ATTEMPT_DELAY_SECONDS", "2"),
+        "check_concurrency": os.getenv("CHECK_CONCURRENCY", "100"),
+        "probe_engine": os.getenv("PROBE_ENGINE", "asyncio"),
+        "probe_policy": os.getenv("PROBE_POLICY", "first_success"),
+        "check_quorum": os.getenv("CHECK_QUORUM", "2"),
+        "check_backoff_factor": os.getenv("CHECK_BACKOFF_FACTOR", "2"),
+        "dns_timeout_seconds": os.getenv("DNS_TIMEOUT_SECONDS", "5"),
+        "dns_cache_ttl_seconds": os.getenv("DNS_CACHE_TTL_SECONDS", "300"),
+        "dns_negative_ttl_seconds": os.getenv("DNS_NEGATIVE_TTL_SECONDS", "30"),
         "offline_confirmation_cycles": os.getenv("OFFLINE_CONFIRMATION_CYCLES", "2"),
         "online_confirmation_cycles": os.getenv("ONLINE_CONFIRMATION_CYCLES", "2"),
+        "confirmation_probe_delay_seconds": os.getenv("CONFIRMATION_PROBE_DELAY_SECONDS", "0"),
+        "sentinel_endpoints": _parse_endpoints(os.getenv("SENTINEL_ENDPOINTS", "")),
+        "sentinel_quorum": os.getenv("SENTINEL_QUORUM", "1"),
+        "sentinel_mode": os.getenv("SENTINEL_MODE", "freeze"),
+        "vantage_consensus": os.getenv("VANTAGE_CONSENSUS", "majority"),
+        "vantage_quorum": os.getenv("VANTAGE_QUORUM", "1"),
         "include_target_name_in_message": os.getenv("INCLUDE_TARGET_NAME_IN_MESSAGE", "false"),
+        "telegram_api_base_url": os.getenv("TELEGRAM_API_BASE_URL", "https://api.telegram.org"),
+        "telegram_http2": os.getenv("TELEGRAM_HTTP2", "false"),
+        "telegram_max_connections": os.getenv("TELEGRAM_MAX_CONNECTIONS", "8"),
+        "notify_max_attempts": os.getenv("NOTIFY_MAX_ATTEMPTS", "20"),
+        "notify_digest_threshold": os.getenv("NOTIFY_DIGEST_THRESHOLD", "3"),
+        "notify_digest_window_seconds": os.getenv("NOTIFY_DIGEST_WINDOW_SECONDS", "0"),
+        "notify_queue_limit": os.getenv("NOTIFY_QUEUE_LIMIT", "1000"),
+        "notify_max_wait_seconds": os.getenv("NOTIFY_MAX_WAIT_SECONDS", "30"),
+        "telegram_global_rate": os.getenv("TELEGRAM_GLOBAL_RATE", "30"),
+        "telegram_chat_rate": os.getenv("TELEGRAM_CHAT_RATE", "1"),
+        "shard_size": os.getenv("SHARD_SIZE", "0"),
+        "max_shards": os.getenv("MAX_SHARDS", "50"),
         "state_path": os.getenv("STATE_PATH", "state.json"),
+        "state_backend": os.getenv("STATE_BACKEND", "json"),
+        "outbox_path": os.getenv("OUTBOX_PATH", "outbox.json"),
+        "history_path": os.getenv("HISTORY_PATH", "history") or None,
+        "metrics_port": os.getenv("METRICS_PORT", "0"),
+        "metrics_textfile_path": os.getenv("METRICS_TEXTFILE_PATH") or None,
         "timezone_name": os.getenv("TIMEZONE", "Europe/Kyiv"),
     }
 
@@ -57,3 +241,12 @@ def load_runtime_config() -> RuntimeConfig:
         return RuntimeConfig.model_validate(data)
     except ValidationError as exc:
         raise RuntimeError(f"Некоректна конфігурація: {exc}") from exc
+
+
+def _parse_endpoints(raw: str) -> list[dict[str, str]]:
+    """`host:port,host:port` -> endpoint dicts (validated later by `Endpoint`)."""
+    endpoints = []
+    for value in filter(None, (part.strip() for part in raw.split(","))):
+        host, _, port = value.rpartition(":")
+        endpoints.append({"host": host, "port": port})
+    return endpoints
@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Collection, Sequence
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+from .config import MonitorTarget, RuntimeConfig, load_runtime_config
+from .history import open_history
+from .metrics import CycleMetrics
+from .outbox import Outbox, load_outbox, save_outbox
+from .runner import SentinelCache, deliver_outbox, export_metrics, open_config_state_store, run_cycle
+from .scheduler import ProbeScheduler
+from .vantage import Vantage
+
+Fingerprint = tuple[tuple[str, int, int] | None, ...]
+
+
+class ConfigWatcher:
+    """Keep the validated config in memory and reload it only when a source file changes."""
+
+    def __init__(
+        self,
+        dotenv_path: str | Path = ".env",
+        *,
+        loader: Callable[..., RuntimeConfig] = load_runtime_config,
+    ) -> None:
+        self._dotenv_path = Path(dotenv_path)
+        self._loader = loader
+        self._fingerprint: Fingerprint | None = None
+        self._config: RuntimeConfig | None = None
+
+    def current(self) -> tuple[RuntimeConfig, bool]:
+        """Return the active config and whether it was (re)loaded by this call."""
+        fingerprint = self._current_fingerprint()
+        if self._config is not None and fingerprint == self._fingerprint:
+            return self._config, False
+
+        is_reload = self._config is not None
+        try:
+            config = self._loader(dotenv_path=self._dotenv_path, override=is_reload)
+        except RuntimeError as exc:
+            if self._config is None:
+                raise
+            print(f"Нова конфігурація некоректна, залишаю попередню: {exc}")
+            self._fingerprint = fingerprint
+            return self._config, False
+
+        if is_reload:
+            print("Конфігурацію перезавантажено.")
+        self._config = config
+        # The catalog file is known only once the config names it.
+        self._fingerprint = self._current_fingerprint() if config.monitor_config_path else fingerprint
+        return config, True
+
+    def _current_fingerprint(self) -> Fingerprint:
+        catalog_path = self._config.monitor_config_path if self._config is not None else None
+        return (
+            _stat_fingerprint(self._dotenv_path),
+            _stat_fingerprint(Path(catalog_path)) if catalog_path else None,
+        )
+
+
+class StateWriter:
+    """Flush the state store on a background thread, coalescing bursts into one write."""
+
+    def __init__(self, flush: Callable[[], object]) -> None:
+        self._flush = flush
+        self._requested = False
+        self._writing = False
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="lumenguard-state-writer", daemon=True)
+        self._thread.start()
+
+    def request(self) -> None:
+        with self._condition:
+            self._requested = True
+            self._condition.notify()
+
+    def wait(self) -> None:
+        """Block until every requested write has been performed."""
+        with self._condition:
+            self._condition.wait_for(lambda: not self._requested and not self._writing)
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._requested or self._closed)
+                if not self._requested:
+                    return
+                self._requested = False
+                self._writing = True
+
+            try:
+                self._flush()
+            except (OSError, sqlite3.Error, ValueError) as exc:  # ValueError: SnapshotError
+                print(f"Не вдалося зберегти стан: {exc}")
+
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class OutboxSender:
+    """Deliver outbox notifications on a background thread, independent of probe cycles."""
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        config_provider: Callable[[], RuntimeConfig],
+        *,
+        poll_seconds: float = 1.0,
+        metrics: CycleMetrics | None = None,
+    ) -> None:
+        self._outbox = outbox
+        self._config_provider = config_provider
+        self._metrics = metrics
+        self._poll_seconds = poll_seconds
+        self._saved_revision = outbox.revision
+        self._save_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lumenguard-sender", daemon=True)
+        self._thread.start()
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def close(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join()
+
+    def persist(self) -> bool:
+        """Write the outbox file if it changed since the last save; False when the write failed."""
+        with self._save_lock:
+            revision = self._outbox.revision
+            if revision == self._saved_revision:
+                return True
+            try:
+                save_outbox(self._config_provider().outbox_path, self._outbox)
+            except OSError as exc:
+                print(f"Не вдалося зберегти outbox: {exc}")
+                return False
+            self._saved_revision = revision
+            return True
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self._poll_seconds)
+            self._wakeup.clear()
+            stopping = self._stopped.is_set()
+
+            if not stopping and len(self._outbox):
+                deliver_outbox(self._config_provider(), self._outbox, self._metrics)
+            self.persist()
+
+            if stopping:
+                return
+
+
+class MonitorDaemon:
+    """Long-running monitor with in-memory config/state and per-target probe intervals."""
+
+    def __init__(
+        self,
+        watcher: ConfigWatcher | None = None,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        vantages: Sequence[Vantage] | None = None,
+    ) -> None:
+        self._watcher = watcher or ConfigWatcher()
+        self._vantages = vantages
+        self._clock = clock
+        self._sleep = sleep
+        self.config, _ = self._watcher.current()
+        self.metrics = CycleMetrics()
+        self._metrics_server = _serve_metrics(self.metrics, self.config.metrics_port)
+        self.store = open_config_state_store(self.config, self.metrics)
+        self.history = open_history(self.config.history_path)
+        self._writer = StateWriter(self._flush_state)
+        self._state_dirty = False
+        self.outbox = load_outbox(self.config.outbox_path)
+        self._sender = OutboxSender(self.outbox, lambda: self.config, metrics=self.metrics)
+        self.scheduler = ProbeScheduler(jitter_ratio=self.config.check_jitter_ratio)
+        self._sentinels = SentinelCache(0.0, clock=clock)
+        self._sync_schedule()
+
+    def run_tick(self, target_ids: Collection[str] | None = None) -> None:
+        """Run one cycle against in-memory state and hand persistence to the writers.
+
+        Only `target_ids` are probed when given; otherwise every configured target is.
+        """
+        previous_config = self.config
+        self.config, reloaded = self._watcher.current()
+        if reloaded:
+            self._apply_reload(previous_config)
+
+        targets = self.config.monitor_config
+        if target_ids is not None:
+            targets = [target for target in targets if target.id in target_ids]
+        if not targets:
+            return
+
+        _, has_state_update = run_cycle(
+            self.config,
+            self.store,
+            outbox=self.outbox,
+            metrics=self.metrics,
+            history=self.history,
+            targets=targets,
+            vantages=self._vantages,
+            on_pending=self._schedule_confirmation,
+            sentinels=self._sentinels,
+        )
+        # Queued alerts reach disk before the state that confirmed them, so a crash
+        # during delivery cannot leave a saved transition without its notification.
+        self._state_dirty = self._state_dirty or has_state_update
+        if self._state_dirty and self._sender.persist():
+            self._state_dirty = False
+            self._writer.request()
+        self._sender.wake()
+        export_metrics(self.config, self.metrics)
+
+    def _schedule_confirmation(self, targets: list[MonitorTarget]) -> None:
+        """Re-probe pending transitions after the confirmation delay via the scheduler, not a sleep."""
+        delay = self.config.confirmation_probe_delay_seconds
+        print(f"Швидке підтвердження через {delay:g} с: {len(targets)} цілей.")
+        self.scheduler.probe_once([target.id for target in targets], self._clock() + delay)
+
+    def run(self, *, max_ticks: int | None = None) -> None:
+        """Probe each target when the scheduler says it is due.
+
+        Due times follow each target's own interval and do not drift with cycle duration;
+        a tick probes only the targets that are due at that moment.
+        """
+        ticks = 0
+        try:
+            while max_ticks is None or ticks < max_ticks:
+                due = self.scheduler.pop_due(self._clock())
+                if self.scheduler.skipped:
+                    print(f"Цикл тривав довше за інтервал, пропущено тактів: {self.scheduler.skipped}.")
+                    self.scheduler.skipped = 0
+                if due:
+                    self.run_tick(due)
+                    ticks += 1
+
+                next_due = self.scheduler.next_due()
+                if next_due is not None and (max_ticks is None or ticks < max_ticks):
+                    self._sleep(max(0.0, next_due - self._clock()))
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self._writer.close()
+        self._sender.close()
+        self.store.close()
+        if self.history is not None:
+            self.history.flush()
+        if self._metrics_server is not None:
+            self._metrics_server.shutdown()
+            self._metrics_server.server_close()
+
+    def _sync_schedule(self) -> None:
+        intervals = [(target.id, self.config.interval_for(target)) for target in self.config.monitor_config]
+        self.scheduler.jitter_ratio = self.config.check_jitter_ratio
+        self.scheduler.sync(intervals, self._clock())
+        # Ticks within the shortest interval share one sentinel verdict.
+        self._sentinels.ttl_seconds = min(interval for _, interval in intervals)
+
+    def _apply_reload(self, previous_config: RuntimeConfig) -> None:
+        self._writer.wait()
+        self._sync_schedule()
+        if self.config.metrics_port != previous_config.metrics_port:
+            if self._metrics_server is not None:
+                self._metrics_server.shutdown()
+                self._metrics_server.server_close()
+            self._metrics_server = _serve_metrics(self.metrics, self.config.metrics_port)
+        if self.config.history_path != previous_config.history_path:
+            if self.history is not None:
+                self.history.flush()
+            self.history = open_history(self.config.history_path)
+
+        if (
+            self.config.state_path != previous_config.state_path
+            or self.config.state_backend != previous_config.state_backend
+        ):
+            self.store.close()
+            self.store = open_config_state_store(self.config, self.metrics)
+            return
+
+        if self.store.prune(target.id for target in self.config.monitor_config):
+            self._writer.request()
+
+    def _flush_state(self) -> None:
+        with self.metrics.time_state_io("flush"):
+            self.store.flush()
+            if self.history is not None:
+                self.history.flush()
+
+
+def _serve_metrics(metrics: CycleMetrics, port: int) -> ThreadingHTTPServer | None:
+    if not port:
+        return None
+    try:
+        server = metrics.serve(port)
+    except OSError as exc:
+        print(f"Не вдалося відкрити порт метрик {port}: {exc}")
+        return None
+    print(f"Метрики доступні на :{port}/metrics.")
+    return server
+
+
+def _stat_fingerprint(path: Path) -> tuple[str, int, int] | None:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return str(path), stat.st_mtime_ns, stat.st_size
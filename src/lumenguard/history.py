@@ -0,0 +1,436 @@
+"""Append-only outage history per target with window analytics.
+
+Every transition is one int64 `epoch_seconds << 1 | is_online`. Records are kept as
+`array('q')` columns together with running prefix sums (offline seconds and outage
+starts before each record), so a window query is two binary searches plus a range-max
+lookup instead of a scan over the whole history.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterable, MutableMapping, Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+from .logic import SavedState, Status
+
+RECORD_BYTES = array("q").itemsize
+
+
+def encode_record(epoch_seconds: int, is_online: bool) -> int:
+    return epoch_seconds << 1 | int(is_online)
+
+
+def decode_record(record: int) -> tuple[int, bool]:
+    return record >> 1, bool(record & 1)
+
+
+@dataclass(slots=True, frozen=True)
+class WindowStats:
+    start: int
+    end: int
+    known_seconds: int
+    offline_seconds: int
+    outage_count: int
+    longest_outage_seconds: int
+
+    @property
+    def online_seconds(self) -> int:
+        return self.known_seconds - self.offline_seconds
+
+    @property
+    def uptime_ratio(self) -> float | None:
+        """Share of the window with a known status that was online; None without data."""
+        if self.known_seconds <= 0:
+            return None
+        return self.online_seconds / self.known_seconds
+
+
+class TargetHistory:
+    """Transitions of one target; statuses alternate, timestamps never decrease."""
+
+    __slots__ = ("timestamps", "online", "_offline_before", "_outages_before", "_sparse")
+
+    def __init__(self, records: Iterable[int] = ()) -> None:
+        self.timestamps = array("q")
+        self.online = array("b")
+        self._offline_before = array("q")
+        self._outages_before = array("q")
+        self._sparse: list[array] | None = None
+        for record in records:
+            self.append(*decode_record(record))
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def last_status(self) -> Status | None:
+        if not self.timestamps:
+            return None
+        return "online" if self.online[-1] else "offline"
+
+    def records(self) -> array:
+        return array("q", (encode_record(ts, bool(on)) for ts, on in zip(self.timestamps, self.online)))
+
+    def append(self, epoch_seconds: int, is_online: bool) -> bool:
+        """Add a transition; repeated statuses are ignored, earlier timestamps are clamped."""
+        if self.timestamps:
+            if bool(self.online[-1]) == is_online:
+                return False
+            last = self.timestamps[-1]
+            epoch_seconds = max(epoch_seconds, last)
+            offline_before = self._offline_before[-1] + (0 if self.online[-1] else epoch_seconds - last)
+            outages_before = self._outages_before[-1] + (0 if self.online[-1] else 1)
+        else:
+            offline_before = outages_before = 0
+
+        self.timestamps.append(epoch_seconds)
+        self.online.append(int(is_online))
+        self._offline_before.append(offline_before)
+        self._outages_before.append(outages_before)
+        self._sparse = None
+        return True
+
+    def window(self, start: int, end: int) -> WindowStats:
+        """Stats for `[start, end)`; time before the first record counts as unknown."""
+        if not self.timestamps or end <= start or end <= self.timestamps[0]:
+            return WindowStats(start, end, 0, 0, 0, 0)
+
+        known_start = max(start, self.timestamps[0])
+        first = bisect_right(self.timestamps, known_start) - 1
+        last = bisect_right(self.timestamps, end - 1) - 1
+
+        offline_seconds = self._offline_until(end, last) - self._offline_until(known_start, first)
+        outage_count = self._outages_before[last] - self._outages_before[first]
+        if not self.online[last]:
+            outage_count += 1
+
+        if first == last:
+            longest = 0 if self.online[first] else end - known_start
+        else:
+            head = 0 if self.online[first] else self.timestamps[first + 1] - known_start
+            tail = 0 if self.online[last] else end - self.timestamps[last]
+            longest = max(head, tail, self._longest_closed(first + 1, last))
+
+        return WindowStats(
+            start=start,
+            end=end,
+            known_seconds=end - known_start,
+            offline_seconds=offline_seconds,
+            outage_count=outage_count,
+            longest_outage_seconds=longest,
+        )
+
+    def _offline_until(self, moment: int, index: int) -> int:
+        tail = 0 if self.online[index] else moment - self.timestamps[index]
+        return self._offline_before[index] + tail
+
+    def _longest_closed(self, low: int, high: int) -> int:
+        """Longest offline span that starts at an index in `[low, high)` (all are closed)."""
+        if low >= high:
+            return 0
+        sparse = self._sparse_table()
+        level = (high - low).bit_length() - 1
+        return max(sparse[level][low], sparse[level][high - (1 << level)])
+
+    def _sparse_table(self) -> list[array]:
+        if self._sparse is not None:
+            return self._sparse
+        count = len(self.timestamps)
+        spans = array(
+            "q",
+            (
+                0 if self.online[index] else self.timestamps[index + 1] - self.timestamps[index]
+                for index in range(count - 1)
+            ),
+        )
+        spans.append(0)
+        table = [spans]
+        width = 1
+        while width * 2 <= count:
+            previous = table[-1]
+            table.append(
+                array("q", (max(previous[i], previous[i + width]) for i in range(count - width * 2 + 1)))
+            )
+            width *= 2
+        self._sparse = table
+        return table
+
+
+class TransitionHistory:
+    """Histories of all targets, loaded lazily and persisted on `flush`."""
+
+    def __init__(self) -> None:
+        self._targets: dict[str, TargetHistory] = {}
+        self._pending: dict[str, array] = {}
+        self._lock = threading.Lock()
+
+    def get(self, target_id: str) -> TargetHistory:
+        with self._lock:
+            return self._get(target_id)
+
+    def observe(self, target_id: str, entry: SavedState) -> bool:
+        """Record the entry's status at its `changed_at` if it differs from the last record."""
+        status = entry.get("status")
+        changed_at = entry.get("changed_at")
+        if status not in {"online", "offline"} or not isinstance(changed_at, str):
+            return False
+        try:
+            moment = datetime.fromisoformat(changed_at)
+        except ValueError:
+            return False
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+
+        epoch_seconds = int(moment.timestamp())
+        is_online = status == "online"
+        with self._lock:
+            history = self._get(target_id)
+            if not history.append(epoch_seconds, is_online):
+                return False
+            pending = self._pending.setdefault(target_id, array("q"))
+            pending.append(encode_record(history.timestamps[-1], is_online))
+        return True
+
+    def stats(self, target_id: str, start: datetime, end: datetime) -> WindowStats:
+        return self.get(target_id).window(int(start.timestamp()), int(end.timestamp()))
+
+    def flush(self) -> int:
+        """Persist records appended since the last flush; return how many."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            for target_id, records in pending.items():
+                self._append_records(target_id, records)
+            return sum(len(records) for records in pending.values())
+
+    def target_ids(self) -> list[str]:
+        raise NotImplementedError
+
+    def _get(self, target_id: str) -> TargetHistory:
+        history = self._targets.get(target_id)
+        if history is None:
+            history = self._targets[target_id] = TargetHistory(self._read_records(target_id))
+        return history
+
+    def _read_records(self, target_id: str) -> array:
+        raise NotImplementedError
+
+    def _append_records(self, target_id: str, records: array) -> None:
+        raise NotImplementedError
+
+
+class FileTransitionHistory(TransitionHistory):
+    """One little-endian int64 file per target in `directory`, written by appending."""
+
+    def __init__(self, directory: str | Path) -> None:
+        super().__init__()
+        self.directory = Path(directory)
+
+    def target_ids(self) -> list[str]:
+        if not self.directory.exists():
+            return []
+        return sorted(_read_target_id(path) for path in self.directory.glob("*.bin"))
+
+    def _path(self, target_id: str) -> Path:
+        return self.directory / f"{_file_stem(target_id)}.bin"
+
+    def _read_records(self, target_id: str) -> array:
+        records = array("q")
+        try:
+            raw = self._path(target_id).read_bytes()
+        except OSError:
+            return records
+        header = _header(target_id)
+        if not raw.startswith(header):
+            return records
+        body = raw[len(header) :]
+        records.frombytes(body[: len(body) - len(body) % RECORD_BYTES])
+        if sys.byteorder != "little":
+            records.byteswap()
+        return records
+
+    def _append_records(self, target_id: str, records: array) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(target_id)
+        data = array("q", records)
+        if sys.byteorder != "little":
+            data.byteswap()
+        with path.open("ab") as fp:
+            if fp.tell() == 0:
+                fp.write(_header(target_id))
+            fp.write(data.tobytes())
+
+
+class MappingTransitionHistory(TransitionHistory):
+    """History blobs under `history:<id>` keys of a shared mapping such as `modal.Dict`."""
+
+    def __init__(self, mapping: MutableMapping[str, Any], *, prefix: str = "history:") -> None:
+        super().__init__()
+        self._mapping = mapping
+        self._prefix = prefix
+
+    def target_ids(self) -> list[str]:
+        return sorted(
+            key[len(self._prefix) :]
+            for key in self._mapping.keys()
+            if isinstance(key, str) and key.startswith(self._prefix)
+        )
+
+    def _read_records(self, target_id: str) -> array:
+        records = array("q")
+        raw = self._mapping.get(self._prefix + target_id)
+        if isinstance(raw, bytes):
+            records.frombytes(raw[: len(raw) - len(raw) % RECORD_BYTES])
+            if sys.byteorder != "little":
+                records.byteswap()
+        return records
+
+    def _append_records(self, target_id: str, records: array) -> None:
+        data = self._targets[target_id].records()
+        if sys.byteorder != "little":
+            data.byteswap()
+        self._mapping[self._prefix + target_id] = data.tobytes()
+
+
+def move_mapping_history(
+    source: MutableMapping[str, Any],
+    target: MutableMapping[str, Any],
+    *,
+    prefix: str = "history:",
+) -> int:
+    """Move history blobs from `source` to `target`; return how many were moved.
+
+    Older deployments kept history next to the per-target state, so every state load
+    downloaded every history blob as well.
+    """
+    keys = [key for key in source.keys() if isinstance(key, str) and key.startswith(prefix)]
+    for key in keys:
+        target[key] = source[key]
+        del source[key]
+    return len(keys)
+
+
+def open_history(path: str | Path | None) -> FileTransitionHistory | None:
+    """Open the local history directory, or None when history is disabled."""
+    return FileTransitionHistory(path) if path else None
+
+
+def record_history(
+    history: TransitionHistory,
+    state: MutableMapping[str, SavedState],
+    target_ids: Iterable[str],
+) -> int:
+    """Feed the current state of `target_ids` into the history; return how many were new."""
+    recorded = 0
+    for target_id in target_ids:
+        entry = state.get(target_id)
+        if entry and history.observe(target_id, entry):
+            recorded += 1
+    return recorded
+
+
+def _file_stem(target_id: str) -> str:
+    readable = re.sub(r"[^A-Za-z0-9_.-]+", "_", target_id)[:40]
+    digest = hashlib.blake2b(target_id.encode("utf-8"), digest_size=6).hexdigest()
+    return f"{readable}-{digest}"
+
+
+def _header(target_id: str) -> bytes:
+    """`LGH1`, id length and the id itself, padded so records stay 8-byte aligned."""
+    encoded = target_id.encode("utf-8")
+    header = b"LGH1" + len(encoded).to_bytes(4, "little") + encoded
+    return header + b"\0" * (-len(header) % RECORD_BYTES)
+
+
+def _read_target_id(path: Path) -> str:
+    with path.open("rb") as fp:
+        prefix = fp.read(8)
+        if len(prefix) < 8 or prefix[:4] != b"LGH1":
+            return path.stem
+        return fp.read(int.from_bytes(prefix[4:], "little")).decode("utf-8", errors="replace")
+
+
+def history_report(
+    history: TransitionHistory,
+    start: datetime,
+    end: datetime,
+    target_ids: Iterable[str] | None = None,
+) -> list[dict[str, Any]]:
+    """Window stats per target as plain data (for `--json` and the Modal report)."""
+    report = []
+    for target_id in target_ids if target_ids is not None else history.target_ids():
+        stats = history.stats(target_id, start, end)
+        report.append(
+            {
+                "target_id": target_id,
+                "known_seconds": stats.known_seconds,
+                "offline_seconds": stats.offline_seconds,
+                "uptime_ratio": stats.uptime_ratio,
+                "outage_count": stats.outage_count,
+                "longest_outage_seconds": stats.longest_outage_seconds,
+            }
+        )
+    return report
+
+
+def _format_hours(seconds: int) -> str:
+    return f"{seconds / 3600:.1f} год"
+
+
+def _parse_moment(value: str) -> datetime:
+    moment = datetime.fromisoformat(value)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Аналітика історії відключень LUMENGUARD")
+    parser.add_argument("--path", default=None, help="Каталог історії (default: HISTORY_PATH)")
+    parser.add_argument("--target", action="append", help="ID цілі (можна кілька разів)")
+    parser.add_argument("--days", type=float, default=30.0, help="Вікно в днях до --until")
+    parser.add_argument("--since", type=_parse_moment, help="Початок вікна (ISO 8601)")
+    parser.add_argument("--until", type=_parse_moment, help="Кінець вікна (ISO 8601, default: зараз)")
+    parser.add_argument("--json", action="store_true", help="Вивести результат як JSON")
+    args = parser.parse_args(argv)
+
+    path = args.path or os.getenv("HISTORY_PATH", "history")
+    history = FileTransitionHistory(path)
+
+    end = args.until or datetime.now(timezone.utc)
+    start = args.since or end - timedelta(days=args.days)
+    target_ids = args.target or history.target_ids()
+    if not target_ids:
+        print(f"Історія в {path} порожня.")
+        return 1
+
+    report = history_report(history, start, end, target_ids)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"Вікно: {start.isoformat()} — {end.isoformat()}")
+    for row in report:
+        if row["uptime_ratio"] is None:
+            print(f"{row['target_id']}: немає даних")
+            continue
+        print(
+            f"{row['target_id']}: світло {row['uptime_ratio']:.2%}, "
+            f"без світла {_format_hours(row['offline_seconds'])}, "
+            f"відключень {row['outage_count']}, найдовше {_format_hours(row['longest_outage_seconds'])}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,28 @@
 from __future__ import annotations
 
+import asyncio
+import errno
+import heapq
 import json
+import os
+import selectors
 import socket
 import time
-from dataclasses import dataclass
+from collections.abc import Awaitable, Callable, Iterable, Iterator, MutableMapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Literal, TypedDict
+from typing import Any, Literal, TypedDict
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
+from .resolver import HostResolver, Resolution
+
 Status = Literal["online", "offline"]
+InconclusiveReason = Literal["dns", "undecided", "no_consensus", "local_resources"]
+ProbeMode = Literal["all", "first_success", "quorum", "backoff"]
+ProbeEngine = Literal["asyncio", "selector", "blocking"]
+EndpointRule = Literal["any", "all", "quorum"]
 
 
 class SavedState(TypedDict, total=False):
@@ -37,6 +50,145 @@ class ProbeResult:
     successful_attempts: int
     total_attempts: int
     errors: tuple[str, ...]
+    rtt_seconds: tuple[float, ...] = ()
+    slept_seconds: float = 0.0
+    resolve_seconds: float = 0.0
+    dns_error: str | None = None
+    inconclusive_reason: InconclusiveReason | None = None
+
+    @property
+    def is_conclusive(self) -> bool:
+        """False when the status is unknown; `dns_error` then says why.
+
+        `inconclusive_reason` classifies it: `dns` (no connect was tried), `undecided`
+        (an endpoint group's rule could not be decided), `no_consensus` (vantages split) or
+        `local_resources` (the monitor itself ran out of file descriptors).
+        """
+        return self.dns_error is None
+
+
+@dataclass(slots=True, frozen=True)
+class ProbePolicy:
+    """Decide how many attempts a probe spends and how long it waits between them.
+
+    - `all`: run every attempt, online when any attempt succeeded (legacy behaviour).
+    - `first_success`: stop on the first successful connect.
+    - `quorum`: stop once `quorum` attempts agree; online when successes reach it.
+    - `backoff`: like `first_success`, but the delay grows by `backoff_factor`.
+    """
+
+    mode: ProbeMode = "all"
+    attempts: int = 1
+    delay_seconds: float = 0.0
+    quorum: int = 1
+    backoff_factor: float = 2.0
+    max_delay_seconds: float = 30.0
+
+    @property
+    def total_attempts(self) -> int:
+        return max(1, self.attempts)
+
+    @property
+    def required_agreement(self) -> int:
+        return min(max(1, self.quorum), self.total_attempts)
+
+    def is_decided(self, successes: int, failures: int) -> bool:
+        if self.mode in {"first_success", "backoff"}:
+            return successes > 0
+        if self.mode == "quorum":
+            return max(successes, failures) >= self.required_agreement
+        return False
+
+    def delay_after(self, attempt_index: int) -> float:
+        if self.mode != "backoff":
+            return self.delay_seconds
+        return min(self.max_delay_seconds, self.delay_seconds * self.backoff_factor**attempt_index)
+
+    def build_result(
+        self,
+        successes: int,
+        used_attempts: int,
+        errors: list[str],
+        *,
+        rtt_seconds: Sequence[float] = (),
+        slept_seconds: float = 0.0,
+    ) -> ProbeResult:
+        failures = used_attempts - successes
+        if self.mode == "quorum":
+            is_online = successes >= self.required_agreement or (
+                failures < self.required_agreement and successes > failures
+            )
+        else:
+            is_online = successes > 0
+
+        return ProbeResult(
+            is_online=is_online,
+            successful_attempts=successes,
+            total_attempts=used_attempts,
+            errors=tuple(errors),
+            rtt_seconds=tuple(rtt_seconds),
+            slept_seconds=slept_seconds,
+        )
+
+
+@dataclass(slots=True, frozen=True)
+class EndpointGroup:
+    """Endpoints of one target, probed concurrently and merged into one result by `rule`.
+
+    - `any`: online when at least one endpoint is online.
+    - `all`: online only when every endpoint is online.
+    - `quorum`: online when at least `quorum` endpoints are online.
+    """
+
+    endpoints: tuple[tuple[str, int], ...]
+    rule: EndpointRule = "any"
+    quorum: int = 1
+
+    @property
+    def required_online(self) -> int:
+        if self.rule == "all":
+            return len(self.endpoints)
+        if self.rule == "quorum":
+            return min(max(1, self.quorum), len(self.endpoints))
+        return 1
+
+    def is_decided(self, online: int, offline: int) -> bool:
+        """True once the outcome cannot change whatever the remaining endpoints return."""
+        return online >= self.required_online or offline > len(self.endpoints) - self.required_online
+
+    def combine(self, results: Sequence[ProbeResult | None]) -> ProbeResult:
+        """Merge per-endpoint results; `None` marks an endpoint cancelled after the decision."""
+        conclusive = [result for result in results if result is not None and result.is_conclusive]
+        online = sum(1 for result in conclusive if result.is_online)
+        offline = len(conclusive) - online
+        errors = tuple(
+            f"{host}:{port}: {error}"
+            for (host, port), result in zip(self.endpoints, results)
+            if result is not None
+            for error in result.errors
+        )
+        finished = [result for result in results if result is not None]
+        dns_error = None
+        reason: InconclusiveReason | None = None
+        if not self.is_decided(online, offline):
+            inconclusive = [result for result in finished if result.dns_error is not None]
+            dns_error = "; ".join(result.dns_error or "" for result in inconclusive) or "undecided"
+            reason = inconclusive[0].inconclusive_reason if inconclusive else "undecided"
+
+        return ProbeResult(
+            is_online=online >= self.required_online,
+            successful_attempts=sum(result.successful_attempts for result in finished),
+            total_attempts=sum(result.total_attempts for result in finished),
+            errors=errors,
+            rtt_seconds=tuple(rtt for result in finished for rtt in result.rtt_seconds),
+            slept_seconds=sum(result.slept_seconds for result in finished),
+            resolve_seconds=max((result.resolve_seconds for result in finished), default=0.0),
+            dns_error=dns_error,
+            inconclusive_reason=reason,
+        )
+
+
+ProbeItem = tuple[str, int] | EndpointGroup
 
 
 def check_ip(host: str, port: int, timeout: float = 3.0) -> bool:
@@ -54,6 +206,22 @@ def check_ip_once(host: str, port: int, timeout: float = 3.0) -> tuple[bool, str
         return False, str(exc)
 
 
+def check_addresses_once(
+    addresses: Sequence[str], port: int, timeout: float = 3.0
+) -> tuple[bool, str | None]:
+    """One TCP check trying `addresses` in order, like `socket.create_connection` does.
+
+    Online as soon as one address accepts; otherwise the first address's error is returned.
+    """
+    first_error: str | None = None
+    for address in addresses:
+        is_online, error = check_ip_once(address, port, timeout=timeout)
+        if is_online:
+            return True, None
+        first_error = first_error or error
+    return False, first_error
+
+
 def probe_target(
     host: str,
     port: int,
@@ -61,27 +229,686 @@ def probe_target(
     timeout: float = 3.0,
     attempts: int = 1,
     delay_seconds: float = 0.0,
+    policy: ProbePolicy | None = None,
+    addresses: Sequence[str] = (),
 ) -> ProbeResult:
-    """Run multiple TCP checks to reduce transient false negatives."""
-    total_attempts = max(1, attempts)
+    """Run multiple TCP checks to reduce transient false negatives.
+
+    `addresses` are the already resolved addresses of `host`, tried in order within
+    each attempt; without them the check connects to `host` itself.
+    """
+    probe_policy = policy or ProbePolicy(attempts=attempts, delay_seconds=delay_seconds)
     successful_attempts = 0
+    used_attempts = 0
     errors: list[str] = []
+    rtt_seconds: list[float] = []
+    slept_seconds = 0.0
 
-    for attempt_index in range(total_attempts):
-        is_online, error = check_ip_once(host, port, timeout=timeout)
+    for attempt_index in range(probe_policy.total_attempts):
+        started = time.perf_counter()
+        is_online, error = check_addresses_once(addresses or (host,), port, timeout=timeout)
+        used_attempts += 1
         if is_online:
             successful_attempts += 1
+            rtt_seconds.append(time.perf_counter() - started)
         elif error:
             errors.append(error)
 
-        if attempt_index + 1 < total_attempts and delay_seconds > 0:
-            time.sleep(delay_seconds)
+        if probe_policy.is_decided(successful_attempts, used_attempts - successful_attempts):
+            break
+
+        delay = probe_policy.delay_after(attempt_index)
+        if attempt_index + 1 < probe_policy.total_attempts and delay > 0:
+            time.sleep(delay)
+            slept_seconds += delay
+
+    return probe_policy.build_result(
+        successful_attempts,
+        used_attempts,
+        errors,
+        rtt_seconds=rtt_seconds,
+        slept_seconds=slept_seconds,
+    )
+
+
+async def check_ip_once_async(
+    host: str,
+    port: int,
+    timeout: float = 3.0,
+) -> tuple[bool, str | None]:
+    """Async counterpart of `check_ip_once` that does not block the event loop."""
+    loop = asyncio.get_running_loop()
+    try:
+        transport, _ = await asyncio.wait_for(
+            loop.create_connection(asyncio.Protocol, host, port),
+            timeout=timeout,
+        )
+    except TimeoutError:
+        return False, "timed out"
+    except OSError as exc:
+        return False, str(exc)
 
+    transport.close()
+    return True, None
+
+
+async def check_addresses_once_async(
+    addresses: Sequence[str], port: int, timeout: float = 3.0
+) -> tuple[bool, str | None]:
+    """Async counterpart of `check_addresses_once`."""
+    first_error: str | None = None
+    for address in addresses:
+        is_online, error = await check_ip_once_async(address, port, timeout=timeout)
+        if is_online:
+            return True, None
+        first_error = first_error or error
+    return False, first_error
+
+
+async def probe_target_async(
+    host: str,
+    port: int,
+    *,
+    timeout: float = 3.0,
+    attempts: int = 1,
+    delay_seconds: float = 0.0,
+    policy: ProbePolicy | None = None,
+    limiter: asyncio.Semaphore | None = None,
+    addresses: Sequence[str] = (),
+) -> ProbeResult:
+    """Async counterpart of `probe_target`; `limiter` bounds concurrent connects."""
+    targets = addresses or (host,)
+    probe_policy = policy or ProbePolicy(attempts=attempts, delay_seconds=delay_seconds)
+    successful_attempts = 0
+    used_attempts = 0
+    errors: list[str] = []
+    rtt_seconds: list[float] = []
+    slept_seconds = 0.0
+
+    for attempt_index in range(probe_policy.total_attempts):
+        if limiter is None:
+            started = time.perf_counter()
+            is_online, error = await check_addresses_once_async(targets, port, timeout=timeout)
+        else:
+            async with limiter:
+                started = time.perf_counter()
+                is_online, error = await check_addresses_once_async(targets, port, timeout=timeout)
+        used_attempts += 1
+        if is_online:
+            successful_attempts += 1
+            rtt_seconds.append(time.perf_counter() - started)
+        elif error:
+            errors.append(error)
+
+        if probe_policy.is_decided(successful_attempts, used_attempts - successful_attempts):
+            break
+
+        delay = probe_policy.delay_after(attempt_index)
+        if attempt_index + 1 < probe_policy.total_attempts and delay > 0:
+            await asyncio.sleep(delay)
+            slept_seconds += delay
+
+    return probe_policy.build_result(
+        successful_attempts,
+        used_attempts,
+        errors,
+        rtt_seconds=rtt_seconds,
+        slept_seconds=slept_seconds,
+    )
+
+
+async def probe_targets_async(
+    endpoints: Sequence[ProbeItem],
+    *,
+    timeout: float = 3.0,
+    attempts: int = 1,
+    delay_seconds: float = 0.0,
+    concurrency: int = 100,
+    policies: Sequence[ProbePolicy] | None = None,
+    resolver: HostResolver | None = None,
+) -> list[ProbeResult]:
+    """Probe all endpoints concurrently, keeping at most `concurrency` connects in flight.
+
+    With a `resolver`, every unique host is resolved once up front and probes connect to
+    the resolved addresses (in order, like `create_connection`), so DNS time and failures are reported apart from TCP ones.
+    An `EndpointGroup` item yields one merged result; its remaining endpoints are
+    cancelled as soon as the group's rule is decided.
+    """
+    limiter = asyncio.Semaphore(max(1, concurrency))
+    endpoint_policies = _endpoint_policies(endpoints, attempts, delay_seconds, policies)
+    resolutions = await resolver.resolve_many(_item_hosts(endpoints)) if resolver else {}
+
+    async def probe(host: str, port: int, policy: ProbePolicy) -> ProbeResult:
+        resolution = resolutions.get(host)
+        if resolution is None:
+            return await probe_target_async(host, port, timeout=timeout, policy=policy, limiter=limiter)
+        return await _probe_resolved(resolution, port, timeout=timeout, policy=policy, limiter=limiter)
+
+    async def probe_item(item: ProbeItem, policy: ProbePolicy) -> ProbeResult:
+        if isinstance(item, EndpointGroup):
+            return await _probe_group_async(item, policy, probe)
+        host, port = item
+        return await probe(host, port, policy)
+
+    return list(
+        await asyncio.gather(
+            *(probe_item(item, policy) for item, policy in zip(endpoints, endpoint_policies))
+        )
+    )
+
+
+async def _probe_group_async(
+    group: EndpointGroup,
+    policy: ProbePolicy,
+    probe: Callable[[str, int, ProbePolicy], Awaitable[ProbeResult]],
+) -> ProbeResult:
+    tasks = [asyncio.ensure_future(probe(host, port, policy)) for host, port in group.endpoints]
+    slots = {task: index for index, task in enumerate(tasks)}
+    results: list[ProbeResult | None] = [None] * len(tasks)
+    online = offline = 0
+    pending = set(tasks)
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            result = results[slots[task]] = task.result()
+            if result.is_conclusive:
+                online += result.is_online
+                offline += not result.is_online
+        if group.is_decided(online, offline):
+            break
+
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    return group.combine(results)
+
+
+async def _probe_resolved(
+    resolution: Resolution,
+    port: int,
+    *,
+    timeout: float,
+    policy: ProbePolicy,
+    limiter: asyncio.Semaphore,
+) -> ProbeResult:
+    if resolution.address is None:
+        return _unresolved_result(resolution)
+
+    result = await probe_target_async(
+        resolution.host,
+        port,
+        timeout=timeout,
+        policy=policy,
+        limiter=limiter,
+        addresses=resolution.addresses,
+    )
+    return replace(result, resolve_seconds=resolution.seconds)
+
+
+def probe_targets(
+    endpoints: Sequence[ProbeItem],
+    *,
+    timeout: float = 3.0,
+    attempts: int = 1,
+    delay_seconds: float = 0.0,
+    concurrency: int = 100,
+    policies: Sequence[ProbePolicy] | None = None,
+    resolver: HostResolver | None = None,
+    engine: ProbeEngine = "asyncio",
+) -> list[ProbeResult]:
+    """Probe endpoints from synchronous code with the chosen engine; results keep input order.
+
+    - `asyncio`: one coroutine per probe (`probe_targets_async`).
+    - `selector`: non-blocking connects multiplexed in this thread (`probe_targets_selector`).
+    - `blocking`: `check_ip_once` on a thread pool (`probe_targets_blocking`); endpoint
+      groups wait for every endpoint there, as blocking connects cannot be cancelled.
+    """
+    if not endpoints:
+        return []
+
+    options = {
+        "timeout": timeout,
+        "attempts": attempts,
+        "delay_seconds": delay_seconds,
+        "concurrency": concurrency,
+        "policies": policies,
+        "resolver": resolver,
+    }
+    if engine == "selector":
+        return probe_targets_selector(endpoints, **options)
+    if engine == "blocking":
+        return probe_targets_blocking(endpoints, **options)
+    return asyncio.run(probe_targets_async(endpoints, **options))
+
+
+def probe_targets_selector(
+    endpoints: Sequence[ProbeItem],
+    *,
+    timeout: float = 3.0,
+    attempts: int = 1,
+    delay_seconds: float = 0.0,
+    concurrency: int = 100,
+    policies: Sequence[ProbePolicy] | None = None,
+    resolver: HostResolver | None = None,
+) -> list[ProbeResult]:
+    """Probe endpoints from one thread: non-blocking `connect()`s multiplexed by `selectors`.
+
+    At most `concurrency` sockets are open at once; per-socket deadlines and retry delays
+    live in heaps, so the loop only wakes for I/O or the next deadline. Hostnames are
+    resolved up front. Sockets of an `EndpointGroup` are closed as soon as its rule is
+    decided. Falls back to `probe_targets_blocking` when no selector is available; callers
+    that want to report it check `effective_engine` first.
+    """
+    endpoint_policies = _endpoint_policies(endpoints, attempts, delay_seconds, policies)
+    try:
+        selector = selectors.DefaultSelector()
+    except OSError:
+        return probe_targets_blocking(
+            endpoints,
+            timeout=timeout,
+            concurrency=concurrency,
+            policies=endpoint_policies,
+            resolver=resolver,
+        )
+
+    resolutions = _resolve_endpoints(endpoints, resolver or HostResolver())
+    results: list[ProbeResult | None] = [None] * len(endpoints)
+    groups: dict[int, _GroupProgress] = {}
+    probes: list[_BulkProbe] = []
+    for index, (item, policy) in enumerate(zip(endpoints, endpoint_policies)):
+        progress = _GroupProgress(item) if isinstance(item, EndpointGroup) else None
+        members = item.endpoints if isinstance(item, EndpointGroup) else (item,)
+        for slot, (host, port) in enumerate(members):
+            resolution = resolutions[host]
+            if resolution.address is None:
+                if progress is None:
+                    results[index] = _unresolved_result(resolution)
+                else:
+                    progress.record(slot, _unresolved_result(resolution))
+                continue
+            probe = _BulkProbe(index, resolution.addresses, port, policy, resolution.seconds)
+            if progress is not None:
+                probe.group, probe.slot = progress, slot
+                progress.probes.append(probe)
+            probes.append(probe)
+        if progress is not None:
+            groups[index] = progress
+
+    probes = [probe for probe in probes if probe.group is None or not probe.group.finished]
+    with selector:
+        engine = _SelectorEngine(selector, timeout=timeout, max_open=concurrency)
+        for probe in engine.run(probes):
+            progress = probe.group
+            if progress is None:
+                results[probe.index] = probe.result()
+            elif not progress.finished:
+                progress.record(probe.slot, probe.result())
+                if progress.finished:
+                    engine.cancel(progress.probes)
+
+    for index, progress in groups.items():
+        results[index] = progress.result()
+    finished: list[ProbeResult] = []
+    for index, result in enumerate(results):
+        if result is None:
+            raise RuntimeError(f"Рушій selector не повернув результат для позиції {index}.")
+        finished.append(result)
+    return finished
+
+
+def effective_engine(engine: ProbeEngine) -> ProbeEngine:
+    """Engine `probe_targets` will actually use: `selector` degrades to `blocking` without a selector."""
+    if engine != "selector":
+        return engine
+    try:
+        selectors.DefaultSelector().close()
+    except OSError:
+        return "blocking"
+    return engine
+
+
+def probe_targets_blocking(
+    endpoints: Sequence[ProbeItem],
+    *,
+    timeout: float = 3.0,
+    attempts: int = 1,
+    delay_seconds: float = 0.0,
+    concurrency: int = 100,
+    policies: Sequence[ProbePolicy] | None = None,
+    resolver: HostResolver | None = None,
+) -> list[ProbeResult]:
+    """Run `probe_target` (blocking `check_ip_once`) for every endpoint on a thread pool."""
+    endpoint_policies = _endpoint_policies(endpoints, attempts, delay_seconds, policies)
+    resolutions = _resolve_endpoints(endpoints, resolver) if resolver else {}
+
+    def probe(endpoint: tuple[str, int], policy: ProbePolicy) -> ProbeResult:
+        host, port = endpoint
+        resolution = resolutions.get(host)
+        if resolution is None:
+            return probe_target(host, port, timeout=timeout, policy=policy)
+        if resolution.address is None:
+            return _unresolved_result(resolution)
+        result = probe_target(host, port, timeout=timeout, policy=policy, addresses=resolution.addresses)
+        return replace(result, resolve_seconds=resolution.seconds)
+
+    flat_endpoints: list[tuple[str, int]] = []
+    flat_policies: list[ProbePolicy] = []
+    for item, policy in zip(endpoints, endpoint_policies):
+        members = item.endpoints if isinstance(item, EndpointGroup) else (item,)
+        flat_endpoints.extend(members)
+        flat_policies.extend([policy] * len(members))
+
+    workers = max(1, min(concurrency, len(flat_endpoints), 256))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        flat_results = iter(list(executor.map(probe, flat_endpoints, flat_policies)))
+
+    results: list[ProbeResult] = []
+    for item in endpoints:
+        if isinstance(item, EndpointGroup):
+            results.append(item.combine([next(flat_results) for _ in item.endpoints]))
+        else:
+            results.append(next(flat_results))
+    return results
+
+
+class _GroupProgress:
+    """Per-endpoint results of one `EndpointGroup` inside the selector engine."""
+
+    __slots__ = ("group", "results", "probes", "online", "offline", "pending", "finished")
+
+    def __init__(self, group: EndpointGroup) -> None:
+        self.group = group
+        self.results: list[ProbeResult | None] = [None] * len(group.endpoints)
+        self.probes: list[_BulkProbe] = []
+        self.online = 0
+        self.offline = 0
+        self.pending = len(group.endpoints)
+        self.finished = False
+
+    def record(self, slot: int, result: ProbeResult) -> None:
+        self.results[slot] = result
+        self.pending -= 1
+        if result.is_conclusive:
+            self.online += result.is_online
+            self.offline += not result.is_online
+        self.finished = self.pending == 0 or self.group.is_decided(self.online, self.offline)
+
+    def result(self) -> ProbeResult:
+        return self.group.combine(self.results)
+
+
+class _BulkProbe:
+    __slots__ = (
+        "index",
+        "addresses",
+        "address_index",
+        "attempt_error",
+        "port",
+        "policy",
+        "resolve_seconds",
+        "successes",
+        "used",
+        "errors",
+        "rtt_seconds",
+        "slept_seconds",
+        "group",
+        "slot",
+        "token",
+        "cancelled",
+        "local_error",
+    )
+
+    def __init__(
+        self,
+        index: int,
+        addresses: tuple[str, ...],
+        port: int,
+        policy: ProbePolicy,
+        resolve_seconds: float,
+    ) -> None:
+        self.index = index
+        self.addresses = addresses
+        self.address_index = 0
+        self.attempt_error: str | None = None
+        self.port = port
+        self.policy = policy
+        self.resolve_seconds = resolve_seconds
+        self.successes = 0
+        self.used = 0
+        self.errors: list[str] = []
+        self.rtt_seconds: list[float] = []
+        self.slept_seconds = 0.0
+        self.group: _GroupProgress | None = None
+        self.slot = 0
+        self.token: int | None = None
+        self.cancelled = False
+        self.local_error: str | None = None
+
+    @property
+    def address(self) -> str:
+        return self.addresses[self.address_index]
+
+    @property
+    def family(self) -> socket.AddressFamily:
+        return socket.AF_INET6 if ":" in self.address else socket.AF_INET
+
+    def next_address(self, error: str) -> bool:
+        """Move on to the next resolved address within this attempt; False when none is left."""
+        if self.address_index + 1 >= len(self.addresses):
+            return False
+        self.attempt_error = self.attempt_error or error
+        self.address_index += 1
+        return True
+
+    def record(self, error: str | None, rtt: float) -> bool:
+        """Count one attempt; return True when the policy needs no more attempts."""
+        if error is not None and self.attempt_error is not None:
+            error = self.attempt_error
+        self.address_index = 0
+        self.attempt_error = None
+        self.used += 1
+        if error is None:
+            self.successes += 1
+            self.rtt_seconds.append(rtt)
+        else:
+            self.errors.append(error)
+        return self.used >= self.policy.total_attempts or self.policy.is_decided(
+            self.successes, self.used - self.successes
+        )
+
+    def result(self) -> ProbeResult:
+        if self.local_error is not None and not self.successes:
+            return ProbeResult(
+                is_online=False,
+                successful_attempts=0,
+                total_attempts=self.used,
+                errors=(*self.errors, f"local: {self.local_error}"),
+                slept_seconds=self.slept_seconds,
+                resolve_seconds=self.resolve_seconds,
+                dns_error=self.local_error,
+                inconclusive_reason="local_resources",
+            )
+        result = self.policy.build_result(
+            self.successes,
+            self.used,
+            self.errors,
+            rtt_seconds=self.rtt_seconds,
+            slept_seconds=self.slept_seconds,
+        )
+        return replace(result, resolve_seconds=self.resolve_seconds)
+
+
+class _SelectorEngine:
+    """Event loop for `probe_targets_selector`; yields probes as they finish."""
+
+    def __init__(self, selector: selectors.BaseSelector, *, timeout: float, max_open: int) -> None:
+        self._selector = selector
+        self._timeout = timeout
+        self._max_open = max(1, max_open)
+        self._waiting: list[tuple[float, int, _BulkProbe]] = []
+        self._deadlines: list[tuple[float, int]] = []
+        self._in_flight: dict[int, tuple[_BulkProbe, socket.socket, float]] = {}
+        self._finished: list[_BulkProbe] = []
+        self._sequence = 0
+
+    def run(self, probes: Sequence[_BulkProbe]) -> Iterator[_BulkProbe]:
+        now = time.monotonic()
+        for probe in probes:
+            self._schedule(probe, now)
+
+        while self._waiting or self._in_flight:
+            now = time.monotonic()
+            while self._waiting and self._waiting[0][0] <= now and len(self._in_flight) < self._max_open:
+                probe = heapq.heappop(self._waiting)[2]
+                if not probe.cancelled:
+                    self._start(probe, now)
+            yield from self._drain_finished()
+
+            wait = self._next_wakeup(now)
+            if self._in_flight:
+                events = self._selector.select(wait)
+            else:
+                events = []
+                if wait is not None and wait > 0:
+                    time.sleep(wait)
+
+            now = time.monotonic()
+            finished_at = time.perf_counter()
+            for key, _ in events:
+                probe, sock, started = self._release(key.data)
+                code = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                sock.close()
+                error = None if code == 0 else f"[Errno {code}] {os.strerror(code)}"
+                self._complete(probe, error, finished_at - started, now)
+
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, token = heapq.heappop(self._deadlines)
+                if token in self._in_flight:
+                    probe, sock, _ = self._release(token)
+                    sock.close()
+                    self._complete(probe, "timed out", self._timeout, now)
+            yield from self._drain_finished()
+
+    def _start(self, probe: _BulkProbe, now: float) -> None:
+        try:
+            sock = socket.socket(probe.family, socket.SOCK_STREAM)
+        except OSError as exc:
+            if exc.errno in {errno.EMFILE, errno.ENFILE}:
+                if self._in_flight:
+                    self._max_open = len(self._in_flight)
+                    self._schedule(probe, now)
+                    return
+                # Out of descriptors with nothing to wait for: the monitor is short of
+                # resources, which says nothing about the target.
+                if not probe.cancelled:
+                    probe.local_error = str(exc)
+                    self._finished.append(probe)
+                return
+            self._complete(probe, str(exc), 0.0, now)
+            return
+
+        sock.setblocking(False)
+        started = time.perf_counter()
+        code = sock.connect_ex((probe.address, probe.port))
+        if code in _CONNECT_IN_PROGRESS:
+            self._sequence += 1
+            token = self._sequence
+            self._in_flight[token] = (probe, sock, started)
+            probe.token = token
+            self._selector.register(sock, selectors.EVENT_WRITE, token)
+            heapq.heappush(self._deadlines, (now + self._timeout, token))
+            return
+
+        sock.close()
+        error = None if code == 0 else f"[Errno {code}] {os.strerror(code)}"
+        self._complete(probe, error, time.perf_counter() - started, now)
+
+    def cancel(self, probes: Iterable[_BulkProbe]) -> None:
+        """Stop probes whose result is no longer needed, closing their open sockets."""
+        for probe in probes:
+            probe.cancelled = True
+            if probe.token in self._in_flight:
+                _, sock, _ = self._release(probe.token)
+                sock.close()
+
+    def _release(self, token: int) -> tuple[_BulkProbe, socket.socket, float]:
+        probe, sock, started = self._in_flight.pop(token)
+        probe.token = None
+        self._selector.unregister(sock)
+        return probe, sock, started
+
+    def _complete(self, probe: _BulkProbe, error: str | None, rtt: float, now: float) -> None:
+        if probe.cancelled:
+            return
+        if error is not None and probe.next_address(error):
+            self._schedule(probe, now)
+            return
+        if probe.record(error, rtt):
+            self._finished.append(probe)
+            return
+        delay = probe.policy.delay_after(probe.used - 1)
+        probe.slept_seconds += delay
+        self._schedule(probe, now + delay)
+
+    def _schedule(self, probe: _BulkProbe, start_at: float) -> None:
+        self._sequence += 1
+        heapq.heappush(self._waiting, (start_at, self._sequence, probe))
+
+    def _next_wakeup(self, now: float) -> float | None:
+        candidates = []
+        if self._deadlines:
+            candidates.append(self._deadlines[0][0])
+        if self._waiting and len(self._in_flight) < self._max_open:
+            candidates.append(self._waiting[0][0])
+        if not candidates:
+            return None
+        return max(0.0, min(candidates) - now)
+
+    def _drain_finished(self) -> Iterator[_BulkProbe]:
+        finished, self._finished = self._finished, []
+        yield from finished
+
+
+_CONNECT_IN_PROGRESS = frozenset({errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY, errno.EAGAIN})
+
+
+def _endpoint_policies(
+    endpoints: Sequence[ProbeItem],
+    attempts: int,
+    delay_seconds: float,
+    policies: Sequence[ProbePolicy] | None,
+) -> Sequence[ProbePolicy]:
+    if policies is not None:
+        return policies
+    return [ProbePolicy(attempts=attempts, delay_seconds=delay_seconds)] * len(endpoints)
+
+
+def _resolve_endpoints(
+    endpoints: Sequence[ProbeItem],
+    resolver: HostResolver,
+) -> dict[str, Resolution]:
+    return asyncio.run(resolver.resolve_many(_item_hosts(endpoints)))
+
+
+def _item_hosts(endpoints: Sequence[ProbeItem]) -> Iterator[str]:
+    for item in endpoints:
+        if isinstance(item, EndpointGroup):
+            yield from (host for host, _ in item.endpoints)
+        else:
+            yield item[0]
+
+
+def _unresolved_result(resolution: Resolution) -> ProbeResult:
+    error = resolution.error or "unresolved"
     return ProbeResult(
-        is_online=successful_attempts > 0,
-        successful_attempts=successful_attempts,
-        total_attempts=total_attempts,
-        errors=tuple(errors),
+        is_online=False,
+        successful_attempts=0,
+        total_attempts=0,
+        errors=(f"DNS: {error}",),
+        resolve_seconds=resolution.seconds,
+        dns_error=error,
+        inconclusive_reason="dns",
     )
 
 
@@ -231,6 +1058,11 @@ def format_ua_message(
     return "\n".join(lines)
 
 
+def format_ua_digest(messages: Sequence[str]) -> str:
+    """Combine several `format_ua_message` texts for one chat into a single message."""
+    return "\n\n".join([f"⚡ <b>Зміни світла: {len(messages)}</b>", *messages])
+
+
 def load_state(path: str | Path) -> dict[str, SavedState]:
     """Load JSON state file, return empty dict when file is missing or invalid."""
     state_path = Path(path)
@@ -242,11 +1074,28 @@ def load_state(path: str | Path) -> dict[str, SavedState]:
     except (OSError, json.JSONDecodeError):
         return {}
 
-    if not isinstance(raw, dict):
+    return coerce_state(raw)
+
+
+def coerce_state(raw_state: object) -> dict[str, SavedState]:
+    """Normalize external state to SavedState entries, dropping anything malformed.
+
+    Accepts a parsed JSON object (`state.json`, legacy `modal.Dict` blob) or the bytes of
+    a binary snapshot.
+    """
+    if isinstance(raw_state, (bytes, bytearray, memoryview)):
+        from .snapshot import SnapshotError, decode_snapshot  # snapshot builds on this module
+
+        try:
+            return decode_snapshot(raw_state).to_states()
+        except SnapshotError:
+            return {}
+
+    if not isinstance(raw_state, dict):
         return {}
 
     state: dict[str, SavedState] = {}
-    for target_id, item in raw.items():
+    for target_id, item in raw_state.items():
         if not isinstance(target_id, str):
             continue
 
@@ -268,6 +1117,14 @@ def save_state(path: str | Path, state: dict[str, SavedState]) -> None:
     temp_path.replace(state_path)
 
 
+def discard_key(mapping: MutableMapping[str, Any], key: str) -> None:
+    """Delete `key` if present; `modal.Dict.pop` takes no default in older modal releases."""
+    try:
+        del mapping[key]
+    except KeyError:
+        pass
+
+
 def _normalize_datetime(value: datetime) -> datetime:
     if value.tzinfo is None:
         return value.replace(tzinfo=timezone.utc)
@@ -0,0 +1,403 @@
+from __future__ import annotations
+
+import math
+import os
+import re
+import threading
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import AbstractContextManager, contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from .logic import ProbeResult
+from .notifier import SendResult
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CYCLE_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+ATTEMPT_BUCKETS = (1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 8.0, 10.0)
+
+Labels = tuple[tuple[str, str], ...]
+MetricsSummary = dict[str, dict[str, list[dict[str, Any]]]]
+
+_ERROR_CLASSES = (
+    ("timeout", re.compile(r"timed out|timeout", re.IGNORECASE)),
+    ("refused", re.compile(r"Errno 111\]|refused|Connect call failed", re.IGNORECASE)),
+    ("unreachable", re.compile(r"Errno (101|113)\]|unreachable", re.IGNORECASE)),
+    ("reset", re.compile(r"Errno 104\]|reset by peer", re.IGNORECASE)),
+    (
+        "dns",
+        re.compile(r"Errno -\d+\]|getaddrinfo|name or service|name resolution|nodename", re.IGNORECASE),
+    ),
+)
+
+
+def classify_probe_error(error: str) -> str:
+    """Map a probe error string from `ProbeResult.errors` to a small label set."""
+    for error_class, pattern in _ERROR_CLASSES:
+        if pattern.search(error):
+            return error_class
+    return "other"
+
+
+def _labels(values: dict[str, str]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in values.items()))
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    rendered = ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in pairs)
+    return "{" + rendered + "}"
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, lock: threading.Lock) -> None:
+        self.name = name
+        self.help_text = help_text
+        self._lock = lock
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(_labels(labels), 0.0)
+
+    def render(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+            for labels, value in sorted(self._values.items())
+        ]
+
+    def summary(self) -> list[dict[str, Any]]:
+        return [
+            {"labels": dict(labels), "value": value} for labels, value in sorted(self._values.items())
+        ]
+
+    def merge(self, series: list[dict[str, Any]]) -> None:
+        for item in series:
+            self.inc(float(item["value"]), **item["labels"])
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "total", "count", "maximum")
+
+    def __init__(self, bucket_count: int) -> None:
+        self.counts = [0] * (bucket_count + 1)
+        self.total = 0.0
+        self.count = 0
+        self.maximum = 0.0
+
+
+class Histogram:
+    """Fixed-bucket histogram; bucket counts are stored per bucket, not cumulatively."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        lock: threading.Lock,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._lock = lock
+        self._series: dict[Labels, _HistogramSeries] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _labels(labels)
+        index = next(
+            (position for position, bound in enumerate(self.buckets) if value <= bound),
+            len(self.buckets),
+        )
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(len(self.buckets))
+            series.counts[index] += 1
+            series.total += value
+            series.count += 1
+            series.maximum = max(series.maximum, value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            series = self._series.get(_labels(labels))
+            return series.count if series else 0
+
+    def render(self) -> list[str]:
+        lines = []
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), series.counts):
+                cumulative += bucket_count
+                le = (("le", _format_value(bound)),)
+                lines.append(f"{self.name}_bucket{_format_labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(series.total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {series.count}")
+        return lines
+
+    def summary(self) -> list[dict[str, Any]]:
+        return [
+            {
+                "labels": dict(labels),
+                "count": series.count,
+                "sum": series.total,
+                "max": series.maximum,
+                "p50": self._quantile(series, 0.5),
+                "p95": self._quantile(series, 0.95),
+                "buckets": list(series.counts),
+            }
+            for labels, series in sorted(self._series.items())
+        ]
+
+    def merge(self, series_list: list[dict[str, Any]]) -> None:
+        for item in series_list:
+            counts = item.get("buckets")
+            if not isinstance(counts, list) or len(counts) != len(self.buckets) + 1:
+                continue
+            key = _labels(item["labels"])
+            with self._lock:
+                series = self._series.get(key)
+                if series is None:
+                    series = self._series[key] = _HistogramSeries(len(self.buckets))
+                series.counts = [left + int(right) for left, right in zip(series.counts, counts)]
+                series.total += float(item["sum"])
+                series.count += int(item["count"])
+                series.maximum = max(series.maximum, float(item["max"]))
+
+    def _quantile(self, series: _HistogramSeries, quantile: float) -> float:
+        """Upper bound of the bucket holding the quantile (the observed max for the last one)."""
+        if not series.count:
+            return 0.0
+        rank = quantile * series.count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, series.counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return min(bound, series.maximum)
+        return series.maximum
+
+
+class MetricsRegistry:
+    """Counters and histograms rendered as Prometheus text or a JSON-friendly summary."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: dict[str, Counter | Histogram] = {}
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        metric = self._metrics.setdefault(name, Counter(name, help_text, self._lock))
+        if not isinstance(metric, Counter):
+            raise ValueError(f"{name} вже зареєстровано як {metric.kind}")
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        metric = self._metrics.setdefault(name, Histogram(name, help_text, self._lock, buckets))
+        if not isinstance(metric, Histogram):
+            raise ValueError(f"{name} вже зареєстровано як {metric.kind}")
+        return metric
+
+    def render_prometheus(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            for name, metric in sorted(self._metrics.items()):
+                lines.append(f"# HELP {name} {metric.help_text}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> MetricsSummary:
+        """Plain-data view of every series; it can be returned from a Modal call and merged."""
+        with self._lock:
+            return {
+                "counters": {
+                    name: metric.summary()
+                    for name, metric in sorted(self._metrics.items())
+                    if isinstance(metric, Counter)
+                },
+                "histograms": {
+                    name: metric.summary()
+                    for name, metric in sorted(self._metrics.items())
+                    if isinstance(metric, Histogram)
+                },
+            }
+
+    def merge(self, summary: MetricsSummary) -> None:
+        """Add a `summary()` from another process (e.g. a shard) into this registry."""
+        for name, series in summary.get("counters", {}).items():
+            metric = self._metrics.get(name)
+            if isinstance(metric, Counter):
+                metric.merge(series)
+        for name, series in summary.get("histograms", {}).items():
+            metric = self._metrics.get(name)
+            if isinstance(metric, Histogram):
+                metric.merge(series)
+
+    def write_textfile(self, path: str | Path) -> None:
+        """Write Prometheus text atomically, for node_exporter's textfile collector."""
+        textfile_path = Path(path)
+        textfile_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = textfile_path.with_name(f"{textfile_path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(self.render_prometheus(), encoding="utf-8")
+        tmp_path.replace(textfile_path)
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Expose `GET /metrics` on a background thread; call `shutdown()` on the result to stop."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802 - http.server naming
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                return
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="lumenguard-metrics", daemon=True).start()
+        return server
+
+
+class CycleMetrics(MetricsRegistry):
+    """The registry used by the monitor: probes, cycles, state-store I/O and Telegram sends."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.probe_rtt = self.histogram(
+            "lumenguard_probe_rtt_seconds",
+            "TCP connect time of successful probe attempts.",
+        )
+        self.probe_attempts = self.histogram(
+            "lumenguard_probe_attempts",
+            "Connect attempts a probe used before its policy decided.",
+            ATTEMPT_BUCKETS,
+        )
+        self.probe_errors = self.counter(
+            "lumenguard_probe_errors_total",
+            "Failed probe attempts by error class.",
+        )
+        self.probe_sleep = self.counter(
+            "lumenguard_probe_sleep_seconds_total",
+            "Time probes spent waiting between attempts.",
+        )
+        self.dns_resolve = self.histogram(
+            "lumenguard_dns_resolve_seconds",
+            "Hostname resolution time (cache hits and IP literals excluded).",
+        )
+        self.probes = self.counter(
+            "lumenguard_probes_total",
+            "Probe results by observed status.",
+        )
+        self.probes_saved = self.counter(
+            "lumenguard_probes_saved_total",
+            "Probes skipped because targets shared an endpoint and policy.",
+        )
+        self.cycle_duration = self.histogram(
+            "lumenguard_cycle_duration_seconds",
+            "Wall time of a monitoring cycle.",
+            CYCLE_BUCKETS,
+        )
+        self.transitions = self.counter(
+            "lumenguard_transitions_total",
+            "Confirmed status changes by new status.",
+        )
+        self.state_io = self.histogram(
+            "lumenguard_state_io_seconds",
+            "State store I/O time by operation.",
+        )
+        self.notify_latency = self.histogram(
+            "lumenguard_notify_latency_seconds",
+            "Telegram sendMessage latency by outcome.",
+        )
+        self.sentinel_checks = self.counter(
+            "lumenguard_sentinel_checks_total",
+            "Self-connectivity checks against the sentinel endpoints by result.",
+        )
+        self.sentinel_suppressed = self.counter(
+            "lumenguard_sentinel_suppressed_total",
+            "Target observations not applied because the sentinels were unreachable, by action.",
+        )
+        self.vantage_votes = self.counter(
+            "lumenguard_vantage_votes_total",
+            "Per-target probe votes received from each vantage by result.",
+        )
+        self.notifications_coalesced = self.counter(
+            "lumenguard_notifications_coalesced_total",
+            "Notifications delivered inside a per-chat digest instead of their own message.",
+        )
+        self.cold_start = self.histogram(
+            "lumenguard_cold_start_seconds",
+            "Entrypoint import time of a fresh process, observed on its first cycle.",
+        )
+
+    def observe_probe(self, probe: ProbeResult) -> None:
+        if probe.resolve_seconds:
+            self.dns_resolve.observe(probe.resolve_seconds)
+        if not probe.is_conclusive:
+            self.probes.inc(status="unknown")
+            self.probe_errors.inc(error_class=probe.inconclusive_reason or "dns")
+            return
+        self.probes.inc(status="online" if probe.is_online else "offline")
+        self.probe_attempts.observe(probe.total_attempts)
+        for rtt in probe.rtt_seconds:
+            self.probe_rtt.observe(rtt)
+        for error in probe.errors:
+            self.probe_errors.inc(error_class=classify_probe_error(error))
+        if probe.slept_seconds:
+            self.probe_sleep.inc(probe.slept_seconds)
+
+    def observe_send(self, result: SendResult) -> None:
+        self.notify_latency.observe(result.latency_seconds, outcome="ok" if result.ok else "error")
+
+    def time_state_io(self, operation: str) -> AbstractContextManager[None]:
+        return self.state_io.time(operation=operation)
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import importlib.util
+import time
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import httpx
+
+TELEGRAM_API_BASE_URL = "https://api.telegram.org"
+
+
+@dataclass(slots=True, frozen=True)
+class SendResult:
+    chat_id: str
+    ok: bool
+    latency_seconds: float
+    status_code: int | None = None
+    error: str | None = None
+    retry_after: float | None = None
+
+
+class TelegramNotifier:
+    """Long-lived Telegram client that reuses one connection pool for every send."""
+
+    def __init__(
+        self,
+        bot_token: str,
+        *,
+        api_base_url: str = TELEGRAM_API_BASE_URL,
+        http2: bool = False,
+        max_connections: int = 8,
+        timeout: float = 10.0,
+        client: httpx.Client | None = None,
+    ) -> None:
+        import httpx  # deferred: only processes that actually send pay for the import
+
+        self._url = f"{api_base_url.rstrip('/')}/bot{bot_token}/sendMessage"
+        self._max_connections = max(1, max_connections)
+        self._client = client or httpx.Client(
+            timeout=timeout,
+            http2=http2 and _http2_available(),
+            limits=httpx.Limits(
+                max_connections=self._max_connections,
+                max_keepalive_connections=self._max_connections,
+            ),
+        )
+        self._executor: ThreadPoolExecutor | None = None
+
+    def send(self, chat_id: str, text: str) -> SendResult:
+        """Send one message and report how long the round trip took."""
+        import httpx
+
+        payload = {
+            "chat_id": chat_id,
+            "text": text,
+            "parse_mode": "HTML",
+        }
+
+        started = time.perf_counter()
+        try:
+            response = self._client.post(self._url, json=payload)
+            response.raise_for_status()
+        except httpx.HTTPStatusError as exc:
+            details = exc.response.text.strip()
+            print(
+                "Помилка Telegram API "
+                f"для chat_id={chat_id}: status={exc.response.status_code}, body={details}"
+            )
+            return SendResult(
+                chat_id=chat_id,
+                ok=False,
+                latency_seconds=time.perf_counter() - started,
+                status_code=exc.response.status_code,
+                error=details,
+                retry_after=_retry_after(exc.response),
+            )
+        except httpx.HTTPError as exc:
+            print(f"Помилка Telegram API для chat_id={chat_id}: {exc}")
+            return SendResult(
+                chat_id=chat_id,
+                ok=False,
+                latency_seconds=time.perf_counter() - started,
+                error=str(exc),
+            )
+
+        return SendResult(
+            chat_id=chat_id,
+            ok=True,
+            latency_seconds=time.perf_counter() - started,
+            status_code=response.status_code,
+        )
+
+    def send_many(self, messages: Sequence[tuple[str, str]]) -> list[SendResult]:
+        """Send `(chat_id, text)` pairs concurrently; results keep input order."""
+        if len(messages) <= 1:
+            return [self.send(chat_id, text) for chat_id, text in messages]
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_connections,
+                thread_name_prefix="lumenguard-telegram",
+            )
+        return list(self._executor.map(lambda message: self.send(*message), messages))
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._client.close()
+
+    def __enter__(self) -> TelegramNotifier:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+_NOTIFIERS: dict[tuple[str, str, bool, int], TelegramNotifier] = {}
+
+
+def get_notifier(
+    bot_token: str,
+    *,
+    api_base_url: str = TELEGRAM_API_BASE_URL,
+    http2: bool = False,
+    max_connections: int = 8,
+) -> TelegramNotifier:
+    """Return the process-wide notifier for these settings, creating it on first use."""
+    key = (bot_token, api_base_url, http2, max_connections)
+    notifier = _NOTIFIERS.get(key)
+    if notifier is None:
+        notifier = TelegramNotifier(
+            bot_token,
+            api_base_url=api_base_url,
+            http2=http2,
+            max_connections=max_connections,
+        )
+        _NOTIFIERS[key] = notifier
+    return notifier
+
+
+def _retry_after(response: httpx.Response) -> float | None:
+    if response.status_code != 429:
+        return None
+
+    try:
+        parameters = response.json().get("parameters") or {}
+        retry_after = parameters.get("retry_after")
+    except (ValueError, AttributeError):
+        retry_after = None
+    if retry_after is None:
+        retry_after = response.headers.get("Retry-After")
+
+    try:
+        return max(0.0, float(retry_after)) if retry_after is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _http2_available() -> bool:
+    if importlib.util.find_spec("h2") is not None:
+        return True
+
+    print("HTTP/2 для Telegram недоступний (немає пакета h2), використовується HTTP/1.1.")
+    return False
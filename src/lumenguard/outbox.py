@@ -0,0 +1,354 @@
+from __future__ import annotations
+
+import json
+import threading
+from collections.abc import MutableMapping
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, TypedDict
+
+from .logic import discard_key, format_ua_digest
+from .notifier import SendResult, TelegramNotifier
+
+if TYPE_CHECKING:
+    from .metrics import CycleMetrics
+    from .ratelimit import SendScheduler
+
+PERMANENT_STATUS_CODES = frozenset({400, 401, 403, 404})
+RETRY_BASE_SECONDS = 5.0
+RETRY_MAX_SECONDS = 300.0
+TELEGRAM_MESSAGE_LIMIT = 4096
+PRIORITY_OUTAGE = 0
+PRIORITY_DEFAULT = 1
+
+
+class PendingNotification(TypedDict):
+    id: str
+    target_id: str
+    chat_id: str
+    text: str
+    created_at: str
+    attempts: int
+    next_attempt_at: str
+    priority: int
+
+
+@dataclass(slots=True, frozen=True)
+class DrainReport:
+    sent: int
+    retried: int
+    dropped: int
+    remaining: int
+    deferred: int = 0
+
+
+class Outbox:
+    """Pending Telegram notifications keyed by id.
+
+    `items` may be a plain dict (persisted with `save_outbox`) or any mapping with
+    per-key writes such as `modal.Dict`, so producers and the sender never rewrite
+    each other's entries.
+    """
+
+    def __init__(self, items: MutableMapping[str, PendingNotification] | None = None) -> None:
+        self._items: MutableMapping[str, PendingNotification] = {} if items is None else items
+        self._lock = threading.Lock()
+        self.revision = 0
+
+    def enqueue(
+        self,
+        target_id: str,
+        chat_id: str,
+        text: str,
+        *,
+        now: datetime,
+        priority: int = PRIORITY_DEFAULT,
+    ) -> PendingNotification:
+        """Queue a message; lower `priority` goes first when sends are rate-limited."""
+        current_iso = now.astimezone(timezone.utc).isoformat()
+        notification: PendingNotification = {
+            "id": notification_id(target_id, now),
+            "target_id": target_id,
+            "chat_id": chat_id,
+            "text": text,
+            "created_at": current_iso,
+            "attempts": 0,
+            "next_attempt_at": current_iso,
+            "priority": priority,
+        }
+        self.put(notification)
+        return notification
+
+    def put(self, notification: PendingNotification) -> None:
+        """Store an already built notification, e.g. one produced by another worker."""
+        with self._lock:
+            self._items[notification["id"]] = notification
+            self.revision += 1
+
+    def pending(self) -> list[PendingNotification]:
+        with self._lock:
+            items = [item for _, item in self._items.items()]
+        return sorted(items, key=lambda item: item["created_at"])
+
+    def due(self, now: datetime) -> list[PendingNotification]:
+        return [item for item in self.pending() if _next_attempt_at(item) <= now]
+
+    def mark_sent(self, notification_id: str) -> None:
+        with self._lock:
+            discard_key(self._items, notification_id)
+            self.revision += 1
+
+    def retract(self, target_id: str, *, since: datetime) -> int:
+        """Drop notifications queued for `target_id` at or after `since`; returns how many.
+
+        A cycle that started at `since` may queue several (its fast-track re-probe rounds
+        are stamped with their own time), and older unsent alerts must survive.
+        """
+        retracted = [
+            item["id"]
+            for item in self.pending()
+            if item["target_id"] == target_id and _parse_time(item["created_at"]) >= since
+        ]
+        for item_id in retracted:
+            self.mark_sent(item_id)
+        return len(retracted)
+
+    def mark_failed(
+        self,
+        notification: PendingNotification,
+        *,
+        now: datetime,
+        retry_after: float | None = None,
+    ) -> PendingNotification:
+        attempts = notification["attempts"] + 1
+        backoff = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+        delay = max(backoff, retry_after or 0.0)
+        updated: PendingNotification = {
+            **notification,
+            "attempts": attempts,
+            "next_attempt_at": (now + timedelta(seconds=delay)).astimezone(timezone.utc).isoformat(),
+        }
+        with self._lock:
+            self._items[notification["id"]] = updated
+            self.revision += 1
+        return updated
+
+    def snapshot(self) -> dict[str, PendingNotification]:
+        return {item["id"]: item for item in self.pending()}
+
+    def __len__(self) -> int:
+        return len(self.pending())
+
+
+def notification_id(target_id: str, now: datetime) -> str:
+    """Stable id of the notification a cycle at `now` queues for `target_id`."""
+    return f"{target_id}:{now.astimezone(timezone.utc).isoformat()}"
+
+
+def drain_outbox(
+    outbox: Outbox,
+    notifier: TelegramNotifier,
+    *,
+    now: datetime | None = None,
+    max_attempts: int = 20,
+    metrics: CycleMetrics | None = None,
+    digest_threshold: int = 0,
+    digest_window_seconds: float = 0.0,
+    scheduler: SendScheduler | None = None,
+    max_queue: int | None = None,
+    max_wait_seconds: float = 30.0,
+) -> DrainReport:
+    """Send every due notification once and reschedule or drop the failed ones.
+
+    A chat with at least `digest_threshold` due notifications gets them as one digest
+    (split at Telegram's message limit) instead of one message each. With
+    `digest_window_seconds`, first attempts for a chat wait until its oldest one is that
+    old, so transitions spread over a few probes still end up in one digest.
+
+    With a `scheduler`, sends are paced under the Telegram rate limits, outage alerts
+    first; at most `max_queue` notifications are taken per drain, and those the scheduler
+    cannot send within `max_wait_seconds` stay due without counting as an attempt.
+    """
+    current_time = now.astimezone(timezone.utc) if now else datetime.now(timezone.utc)
+    due = outbox.due(current_time)
+    if digest_window_seconds > 0:
+        due = _release_windows(due, current_time, digest_window_seconds)
+    due.sort(key=lambda item: item["priority"])
+    deferred = 0
+    if max_queue is not None and len(due) > max_queue:
+        deferred = len(due) - max_queue
+        due = due[:max_queue]
+    if not due:
+        return DrainReport(sent=0, retried=0, dropped=0, remaining=len(outbox), deferred=deferred)
+
+    sent = retried = dropped = 0
+    batches = group_digests(due, threshold=digest_threshold)
+    messages = [(batch[0]["chat_id"], digest_text(batch)) for batch in batches]
+    if scheduler is None:
+        results: list[SendResult | None] = list(notifier.send_many(messages))
+    else:
+        results = scheduler.send(
+            notifier,
+            messages,
+            priorities=[min(item["priority"] for item in batch) for batch in batches],
+            max_wait_seconds=max_wait_seconds,
+        )
+    for batch, result in zip(batches, results):
+        if result is None:
+            deferred += len(batch)
+            continue
+        if metrics is not None:
+            metrics.observe_send(result)
+            if result.ok and len(batch) > 1:
+                metrics.notifications_coalesced.inc(len(batch) - 1)
+        via = f" у зведенні з {len(batch)}" if len(batch) > 1 else ""
+        for item in batch:
+            if result.ok:
+                outbox.mark_sent(item["id"])
+                sent += 1
+                print(
+                    f"[{item['target_id']}] Повідомлення надіслано{via} за {result.latency_seconds:.2f} с."
+                )
+                continue
+
+            if result.status_code in PERMANENT_STATUS_CODES or item["attempts"] + 1 >= max_attempts:
+                outbox.mark_sent(item["id"])
+                dropped += 1
+                print(f"[{item['target_id']}] Повідомлення відкинуто після {item['attempts'] + 1} спроб.")
+                continue
+
+            updated = outbox.mark_failed(item, now=current_time, retry_after=result.retry_after)
+            retried += 1
+            print(
+                f"[{item['target_id']}] Повідомлення не надіслано, повтор о {updated['next_attempt_at']}."
+            )
+
+    return DrainReport(sent=sent, retried=retried, dropped=dropped, remaining=len(outbox), deferred=deferred)
+
+
+def group_digests(
+    items: list[PendingNotification],
+    *,
+    threshold: int,
+    max_length: int = TELEGRAM_MESSAGE_LIMIT,
+) -> list[list[PendingNotification]]:
+    """Split due notifications into send batches: one item each, or per-chat digests.
+
+    Chats with fewer than `threshold` items (or any chat when `threshold` is 0) keep one
+    message per notification; larger groups are packed, in order, into digests whose
+    text stays within `max_length`.
+    """
+    by_chat: dict[str, list[PendingNotification]] = {}
+    for item in items:
+        by_chat.setdefault(item["chat_id"], []).append(item)
+
+    batches: list[list[PendingNotification]] = []
+    for chat_items in by_chat.values():
+        if not threshold or len(chat_items) < max(2, threshold):
+            batches.extend([item] for item in chat_items)
+            continue
+
+        batch: list[PendingNotification] = []
+        for item in chat_items:
+            if batch and len(digest_text([*batch, item])) > max_length:
+                batches.append(batch)
+                batch = []
+            batch.append(item)
+        batches.append(batch)
+    return batches
+
+
+def digest_text(batch: list[PendingNotification]) -> str:
+    """Text of one send: the notification itself, or a digest of the whole batch."""
+    if len(batch) == 1:
+        return batch[0]["text"]
+    return format_ua_digest([item["text"] for item in batch])
+
+
+def _release_windows(
+    due: list[PendingNotification],
+    now: datetime,
+    window_seconds: float,
+) -> list[PendingNotification]:
+    """Hold back first attempts of chats whose oldest first attempt is younger than the window."""
+    window_opened: dict[str, datetime] = {}
+    for item in due:
+        if item["attempts"] == 0:
+            created_at = _parse_time(item["created_at"])
+            opened = window_opened.get(item["chat_id"])
+            window_opened[item["chat_id"]] = created_at if opened is None else min(opened, created_at)
+
+    window = timedelta(seconds=window_seconds)
+    return [
+        item
+        for item in due
+        if item["attempts"] or window_opened[item["chat_id"]] + window <= now
+    ]
+
+
+def load_outbox(path: str | Path) -> Outbox:
+    """Load outbox JSON file, return empty outbox when file is missing or invalid."""
+    outbox_path = Path(path)
+    if not outbox_path.exists():
+        return Outbox()
+
+    try:
+        raw = json.loads(outbox_path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return Outbox()
+
+    if not isinstance(raw, dict):
+        return Outbox()
+
+    items: dict[str, PendingNotification] = {}
+    for notification_id, item in raw.items():
+        normalized = _normalize_notification(item)
+        if normalized and normalized["id"] == notification_id:
+            items[notification_id] = normalized
+    return Outbox(items)
+
+
+def save_outbox(path: str | Path, outbox: Outbox) -> None:
+    """Persist outbox to JSON atomically."""
+    outbox_path = Path(path)
+    outbox_path.parent.mkdir(parents=True, exist_ok=True)
+
+    payload = json.dumps(outbox.snapshot(), ensure_ascii=False, indent=2, sort_keys=True)
+    temp_path = outbox_path.with_suffix(f"{outbox_path.suffix}.tmp")
+    temp_path.write_text(payload, encoding="utf-8")
+    temp_path.replace(outbox_path)
+
+
+def _next_attempt_at(item: PendingNotification) -> datetime:
+    return _parse_time(item["next_attempt_at"])
+
+
+def _parse_time(value: str) -> datetime:
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return datetime.min.replace(tzinfo=timezone.utc)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _normalize_notification(item: object) -> PendingNotification | None:
+    if not isinstance(item, dict):
+        return None
+
+    string_fields = ("id", "target_id", "chat_id", "text", "created_at", "next_attempt_at")
+    if not all(isinstance(item.get(field), str) for field in string_fields):
+        return None
+    if not isinstance(item.get("attempts"), int):
+        return None
+
+    return {
+        "id": item["id"],
+        "target_id": item["target_id"],
+        "chat_id": item["chat_id"],
+        "text": item["text"],
+        "created_at": item["created_at"],
+        "attempts": item["attempts"],
+        "next_attempt_at": item["next_attempt_at"],
+        "priority": item["priority"] if isinstance(item.get("priority"), int) else PRIORITY_DEFAULT,
+    }
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import math
+import time
+from collections import deque
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Protocol
+
+if TYPE_CHECKING:
+    from .notifier import SendResult
+
+TELEGRAM_GLOBAL_RATE = 30.0
+TELEGRAM_CHAT_RATE = 1.0
+
+
+class _Sender(Protocol):
+    def send_many(self, messages: Sequence[tuple[str, str]]) -> list[SendResult]: ...
+
+
+@dataclass(slots=True)
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `capacity` saved up."""
+
+    rate: float
+    capacity: float
+    tokens: float
+    updated: float
+    blocked_until: float = 0.0
+
+    @classmethod
+    def full(cls, rate: float, capacity: float, now: float) -> TokenBucket:
+        return cls(rate=rate, capacity=capacity, tokens=capacity, updated=now)
+
+    def available(self, now: float) -> int:
+        """Whole tokens that can be taken at `now` (0 while blocked by a `retry_after`)."""
+        if now < self.blocked_until:
+            return 0
+        self._refill(now)
+        return math.floor(self.tokens + 1e-9)
+
+    def ready_at(self, now: float) -> float:
+        """Earliest time at which one token can be taken."""
+        self._refill(now)
+        missing = max(0.0, 1.0 - self.tokens)
+        return max(self.blocked_until, max(self.updated, now) + missing / self.rate)
+
+    def take(self, now: float, count: int = 1) -> None:
+        self._refill(now)
+        self.tokens -= count
+
+    def block(self, until: float) -> None:
+        """Honor a server `retry_after`: no tokens before `until`, exactly one at `until`."""
+        self.blocked_until = max(self.blocked_until, until)
+        self.tokens = 1.0
+        self.updated = self.blocked_until
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+
+class SendScheduler:
+    """Pace Telegram sends under the bot limits instead of letting them fail with 429.
+
+    One global bucket (~30 msg/s) and one bucket per chat (~1 msg/s) live as long as the
+    scheduler, so consecutive drains share the budget. Each `send` call dispatches waves of
+    messages, lower priority value first; a wave holds at most one message per ready chat
+    and no more than the global bucket allows, and goes out through `send_many`. A 429
+    blocks that chat for `retry_after` and the message is queued again. Whatever cannot
+    be sent within `max_wait_seconds` is returned as `None` so the caller can keep it.
+    """
+
+    def __init__(
+        self,
+        *,
+        global_rate: float = TELEGRAM_GLOBAL_RATE,
+        chat_rate: float = TELEGRAM_CHAT_RATE,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self._clock = clock
+        self._sleep = sleep
+        self._global = TokenBucket.full(global_rate, max(1.0, global_rate), clock())
+        self._chats: dict[str, TokenBucket] = {}
+
+    def send(
+        self,
+        sender: _Sender,
+        messages: Sequence[tuple[str, str]],
+        *,
+        priorities: Sequence[int] | None = None,
+        max_wait_seconds: float = 30.0,
+    ) -> list[SendResult | None]:
+        """Send `(chat_id, text)` pairs; results keep input order, `None` means not sent."""
+        results: list[SendResult | None] = [None] * len(messages)
+        order = sorted(range(len(messages)), key=lambda index: priorities[index] if priorities else 0)
+        queues: dict[str, deque[int]] = {}
+        for index in order:
+            queues.setdefault(messages[index][0], deque()).append(index)
+        rank = {index: position for position, index in enumerate(order)}
+        deadline = self._clock() + max_wait_seconds
+
+        while queues:
+            now = self._clock()
+            wave = self._next_wave(queues, rank, now)
+            if wave:
+                self._global.take(now, len(wave))
+                for index, result in zip(wave, sender.send_many([messages[index] for index in wave])):
+                    chat_id = messages[index][0]
+                    if result.status_code == 429 and result.retry_after is not None:
+                        retry_at = self._clock() + result.retry_after
+                        self._bucket(chat_id, now).block(retry_at)
+                        if retry_at <= deadline:
+                            queues.setdefault(chat_id, deque()).appendleft(index)
+                            continue
+                    results[index] = result
+
+            now = self._clock()
+            ready_at = min(self._bucket(chat_id, now).ready_at(now) for chat_id in queues) if queues else now
+            ready_at = max(ready_at, self._global.ready_at(now))
+            if not queues or ready_at > deadline:
+                break
+            if ready_at > now:
+                self._sleep(ready_at - now)
+
+        self._forget_idle_chats(self._clock())
+        return results
+
+    def _next_wave(self, queues: dict[str, deque[int]], rank: dict[int, int], now: float) -> list[int]:
+        budget = self._global.available(now)
+        wave: list[int] = []
+        for chat_id in sorted(queues, key=lambda chat_id: rank[queues[chat_id][0]]):
+            if len(wave) >= budget:
+                break
+            bucket = self._bucket(chat_id, now)
+            if bucket.available(now) < 1:
+                continue
+            bucket.take(now)
+            queue = queues[chat_id]
+            wave.append(queue.popleft())
+            if not queue:
+                del queues[chat_id]
+        return wave
+
+    def _bucket(self, chat_id: str, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket.full(self.chat_rate, 1.0, now)
+        return bucket
+
+    def _forget_idle_chats(self, now: float) -> None:
+        """Drop buckets that are full again; a fresh bucket behaves the same."""
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.available(now) >= 1]:
+            del self._chats[chat_id]
+
+
+_SCHEDULERS: dict[tuple[str, float, float], SendScheduler] = {}
+
+
+def get_scheduler(
+    bot_token: str,
+    *,
+    global_rate: float = TELEGRAM_GLOBAL_RATE,
+    chat_rate: float = TELEGRAM_CHAT_RATE,
+) -> SendScheduler:
+    """Return the process-wide send scheduler of a bot, creating it on first use."""
+    key = (bot_token, global_rate, chat_rate)
+    scheduler = _SCHEDULERS.get(key)
+    if scheduler is None:
+        scheduler = _SCHEDULERS[key] = SendScheduler(global_rate=global_rate, chat_rate=chat_rate)
+    return scheduler
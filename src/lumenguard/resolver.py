@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import socket
+import time
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass
+
+Lookup = Callable[[str], Awaitable[tuple[str, ...]]]
+
+
+@dataclass(slots=True, frozen=True)
+class Resolution:
+    host: str
+    addresses: tuple[str, ...]
+    error: str | None
+    seconds: float
+    from_cache: bool = False
+    stale: bool = False
+
+    @property
+    def address(self) -> str | None:
+        return self.addresses[0] if self.addresses else None
+
+
+@dataclass(slots=True)
+class _CacheEntry:
+    addresses: tuple[str, ...]
+    error: str | None
+    expires_at: float
+    stale_until: float
+
+
+class HostResolver:
+    """Resolve hostnames once per cycle with a TTL cache, negative caching and serve-stale.
+
+    `getaddrinfo` does not expose record TTLs, so positive answers live `ttl_seconds` and
+    failures `negative_ttl_seconds`. When a refresh fails, the last good answer is served
+    for up to `stale_seconds` more, so a flaky resolver does not look like an outage.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl_seconds: float = 300.0,
+        negative_ttl_seconds: float = 30.0,
+        stale_seconds: float = 3600.0,
+        timeout: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+        lookup: Lookup | None = None,
+    ) -> None:
+        self._ttl_seconds = ttl_seconds
+        self._negative_ttl_seconds = negative_ttl_seconds
+        self._stale_seconds = stale_seconds
+        self._timeout = timeout
+        self._clock = clock
+        self._lookup = lookup or _getaddrinfo
+        self._cache: dict[str, _CacheEntry] = {}
+
+    async def resolve_many(self, hosts: Iterable[str]) -> dict[str, Resolution]:
+        """Resolve every unique host concurrently; cached and literal hosts cost no lookup."""
+        unique_hosts = list(dict.fromkeys(hosts))
+        resolutions = await asyncio.gather(*(self.resolve(host) for host in unique_hosts))
+        return dict(zip(unique_hosts, resolutions))
+
+    async def resolve(self, host: str) -> Resolution:
+        if _is_ip_literal(host):
+            return Resolution(host, (host,), None, 0.0, from_cache=True)
+
+        now = self._clock()
+        cached = self._cache.get(host)
+        if cached is not None and cached.expires_at > now:
+            return Resolution(host, cached.addresses, cached.error, 0.0, from_cache=True)
+
+        started = time.perf_counter()
+        try:
+            addresses = await asyncio.wait_for(self._lookup(host), timeout=self._timeout)
+            error = None if addresses else "no addresses"
+        except TimeoutError:
+            addresses, error = (), "DNS timed out"
+        except OSError as exc:
+            addresses, error = (), str(exc)
+        seconds = time.perf_counter() - started
+
+        now = self._clock()
+        if addresses:
+            self._cache[host] = _CacheEntry(
+                addresses, None, now + self._ttl_seconds, now + self._ttl_seconds + self._stale_seconds
+            )
+            return Resolution(host, addresses, None, seconds)
+
+        if cached is not None and cached.addresses and cached.stale_until > now:
+            print(f"DNS для {host} недоступний ({error}), використовую попередню адресу.")
+            return Resolution(host, cached.addresses, None, seconds, stale=True)
+
+        self._cache[host] = _CacheEntry((), error, now + self._negative_ttl_seconds, now)
+        return Resolution(host, (), error, seconds)
+
+
+async def _getaddrinfo(host: str) -> tuple[str, ...]:
+    loop = asyncio.get_running_loop()
+    infos = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    return tuple(dict.fromkeys(str(info[4][0]) for info in infos))
+
+
+def _is_ip_literal(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+_RESOLVERS: dict[tuple[float, float, float], HostResolver] = {}
+
+
+def get_resolver(
+    *,
+    ttl_seconds: float = 300.0,
+    negative_ttl_seconds: float = 30.0,
+    timeout: float = 5.0,
+) -> HostResolver:
+    """Return the process-wide resolver for these settings so the cache outlives a cycle."""
+    key = (ttl_seconds, negative_ttl_seconds, timeout)
+    resolver = _RESOLVERS.get(key)
+    if resolver is None:
+        resolver = HostResolver(
+            ttl_seconds=ttl_seconds,
+            negative_ttl_seconds=negative_ttl_seconds,
+            timeout=timeout,
+        )
+        _RESOLVERS[key] = resolver
+    return resolver
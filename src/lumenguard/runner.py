@@ -1,104 +1,283 @@
 from __future__ import annotations
 
 import time
-from datetime import datetime, timezone
-from typing import Any
+from collections.abc import Callable, MutableMapping, Sequence
+from contextlib import AbstractContextManager, nullcontext
+from datetime import datetime, timedelta, timezone
 
-import httpx
-
-from .config import RuntimeConfig, load_runtime_config
+from .config import FAST_TRACK_BUDGET_SECONDS, MonitorTarget, RuntimeConfig, load_runtime_config
 from .logic import (
+    EndpointGroup,
+    ProbeItem,
+    ProbePolicy,
+    ProbeResult,
     SavedState,
-    compare_states,
+    coerce_state,
+    effective_engine,
     format_ua_message,
-    load_state,
-    probe_target,
-    save_state,
+    probe_targets,
 )
+from .history import TransitionHistory, open_history
+from .metrics import CycleMetrics
+from .notifier import TelegramNotifier, get_notifier
+from .outbox import PRIORITY_DEFAULT, PRIORITY_OUTAGE, Outbox, drain_outbox, load_outbox, save_outbox
+from .ratelimit import SendScheduler, get_scheduler
+from .resolver import HostResolver, get_resolver
+from .state_store import StateStore, compare_and_store, open_state_store
+from .vantage import Vantage, probe_with_consensus
 
 
 def send_telegram_message(bot_token: str, chat_id: str, text: str) -> bool:
-    """Send message to Telegram channel/chat."""
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    payload = {
-        "chat_id": chat_id,
-        "text": text,
-        "parse_mode": "HTML",
-    }
+    """Send message to Telegram channel/chat, waiting out the bot's rate limits."""
+    result = get_scheduler(bot_token).send(get_notifier(bot_token), [(chat_id, text)])[0]
+    return result is not None and result.ok
 
-    try:
-        with httpx.Client(timeout=10.0) as client:
-            response = client.post(url, json=payload)
-            response.raise_for_status()
-        return True
-    except httpx.HTTPStatusError as exc:
-        details = exc.response.text.strip()
-        print(
-            "Помилка Telegram API "
-            f"для chat_id={chat_id}: status={exc.response.status_code}, body={details}"
-        )
-        return False
-    except httpx.HTTPError as exc:
-        print(f"Помилка Telegram API для chat_id={chat_id}: {exc}")
-        return False
+
+def notifier_for(config: RuntimeConfig) -> TelegramNotifier:
+    """Return the shared notifier configured for this runtime config."""
+    return get_notifier(
+        config.telegram_bot_token,
+        api_base_url=config.telegram_api_base_url,
+        http2=config.telegram_http2,
+        max_connections=config.telegram_max_connections,
+    )
+
+
+def scheduler_for(config: RuntimeConfig) -> SendScheduler:
+    """Return the shared send scheduler (Telegram rate limits) for this runtime config."""
+    return get_scheduler(
+        config.telegram_bot_token,
+        global_rate=config.telegram_global_rate,
+        chat_rate=config.telegram_chat_rate,
+    )
+
+
+def resolver_for(config: RuntimeConfig) -> HostResolver:
+    """Return the shared DNS resolver configured for this runtime config."""
+    return get_resolver(
+        ttl_seconds=config.dns_cache_ttl_seconds,
+        negative_ttl_seconds=config.dns_negative_ttl_seconds,
+        timeout=config.dns_timeout_seconds,
+    )
 
 
 def run_cycle(
     config: RuntimeConfig,
-    state: dict[str, SavedState],
+    state: MutableMapping[str, SavedState],
     *,
     now: datetime | None = None,
-) -> tuple[dict[str, SavedState], bool]:
-    """Run one full monitoring cycle for all targets."""
+    notifier: TelegramNotifier | None = None,
+    outbox: Outbox | None = None,
+    metrics: CycleMetrics | None = None,
+    history: TransitionHistory | None = None,
+    targets: Sequence[MonitorTarget] | None = None,
+    vantages: Sequence[Vantage] | None = None,
+    on_pending: Callable[[list[MonitorTarget]], object] | None = None,
+    sentinels: SentinelCache | None = None,
+) -> tuple[MutableMapping[str, SavedState], bool]:
+    """Run one monitoring cycle for `targets` (all configured targets by default).
+
+    Confirmed transitions are committed to `state` right away and their messages are
+    queued in `outbox`. Without an outbox the cycle delivers the queue itself before
+    returning (without a digest window, since nothing would keep held messages); with one,
+    delivery is left to `drain_outbox`. First observations and
+    confirmed transitions are also appended to `history` when one is given.
+
+    With `confirmation_probe_delay_seconds` set, targets left with a pending transition
+    are re-probed after that delay within the same cycle until it is confirmed or
+    dropped, so confirmation is counted in probes rather than cron runs. Re-probes are
+    stamped with the time they actually ran; rounds stop once `FAST_TRACK_BUDGET_SECONDS`
+    of the cycle are used up, leaving the rest to the next cycle. A caller with its own scheduler passes
+    `on_pending` instead: it receives those targets and the cycle returns without waiting.
+
+    With `vantages` the probes run from each of them in parallel and every target's
+    status is their consensus (`vantage_consensus`); see `probe_with_consensus`.
+    `sentinels` lets passes that follow each other closely share one sentinel verdict.
+    """
+    started = time.perf_counter()
+    started_monotonic = time.monotonic()
     run_time = now.astimezone(timezone.utc) if now else datetime.now(timezone.utc)
+    cycle_outbox = outbox if outbox is not None else Outbox()
+    if targets is None:
+        targets = config.monitor_config
+    if not vantages and effective_engine(config.probe_engine) != config.probe_engine:
+        print("Selector недоступний, перевірки виконуються через check_ip_once.")
+
+    pending, has_state_update = _probe_and_apply(
+        config,
+        state,
+        targets,
+        run_time=run_time,
+        outbox=cycle_outbox,
+        metrics=metrics,
+        history=history,
+        vantages=vantages,
+        sentinels=sentinels,
+    )
+    probe_time = run_time
+    delay = config.confirmation_probe_delay_seconds
+    rounds = config.fast_track_rounds
+    if on_pending is not None:
+        if pending and delay:
+            on_pending(pending)
+        rounds = 0
+    for _ in range(rounds):
+        if not pending or not delay:
+            break
+        if time.monotonic() - started_monotonic + delay > FAST_TRACK_BUDGET_SECONDS:
+            print(f"Швидке підтвердження зупинено: {len(pending)} цілей чекатимуть наступного циклу.")
+            break
+        print(f"Швидке підтвердження через {delay:g} с: {len(pending)} цілей.")
+        time.sleep(delay)
+        probe_time = run_time + timedelta(seconds=time.monotonic() - started_monotonic)
+        pending, round_updated = _probe_and_apply(
+            config,
+            state,
+            pending,
+            run_time=probe_time,
+            outbox=cycle_outbox,
+            metrics=metrics,
+            history=history,
+            vantages=vantages,
+            sentinels=sentinels,
+        )
+        has_state_update = has_state_update or round_updated
+
+    if outbox is None and len(cycle_outbox):
+        drain_outbox(
+            cycle_outbox,
+            notifier or notifier_for(config),
+            now=probe_time,
+            max_attempts=config.notify_max_attempts,
+            metrics=metrics,
+            digest_threshold=config.notify_digest_threshold,
+            scheduler=scheduler_for(config),
+            max_wait_seconds=config.notify_max_wait_seconds,
+        )
+
+    if metrics is not None:
+        metrics.cycle_duration.observe(time.perf_counter() - started)
+    return state, has_state_update
+
+
+def _probe_and_apply(
+    config: RuntimeConfig,
+    state: MutableMapping[str, SavedState],
+    targets: Sequence[MonitorTarget],
+    *,
+    run_time: datetime,
+    outbox: Outbox,
+    metrics: CycleMetrics | None,
+    history: TransitionHistory | None,
+    vantages: Sequence[Vantage] | None = None,
+    sentinels: SentinelCache | None = None,
+) -> tuple[list[MonitorTarget], bool]:
+    """Probe `targets` once and apply the results; return targets still pending and the update flag.
+
+    With sentinels configured they are checked before and after the target probes; see
+    `check_sentinels` for what happens when they are unreachable.
+    """
     has_state_update = False
+    pending: list[MonitorTarget] = []
+    if not check_sentinels(config, metrics, sentinels):
+        print(f"Сторожові адреси недоступні, перевірку {len(targets)} цілей пропущено.")
+        if metrics is not None:
+            metrics.sentinel_suppressed.inc(len(targets), action="skipped")
+        return pending, has_state_update
 
-    for target in config.monitor_config:
-        probe = probe_target(
-            target.host,
-            target.port,
+    probe_keys = [_probe_key(config, target) for target in targets]
+    unique_keys = list(dict.fromkeys(probe_keys))
+    items = [item for item, _ in unique_keys]
+    policies = [policy for _, policy in unique_keys]
+    if vantages:
+        unique_probes = probe_with_consensus(vantages, config, items, policies, metrics=metrics)
+    else:
+        unique_probes = probe_targets(
+            items,
             timeout=config.check_timeout_seconds,
-            attempts=config.check_attempts,
-            delay_seconds=config.check_attempt_delay_seconds,
+            concurrency=config.check_concurrency,
+            policies=policies,
+            resolver=resolver_for(config),
+            engine=config.probe_engine,
         )
-        comparison = compare_states(
-            state.get(target.id),
-            probe.is_online,
-            now=run_time,
-            offline_confirmation_cycles=config.offline_confirmation_cycles,
-            online_confirmation_cycles=config.online_confirmation_cycles,
+    probe_by_key = dict(zip(unique_keys, unique_probes))
+
+    saved_probes = len(targets) - len(unique_keys)
+    if saved_probes:
+        print(
+            f"Спільні адреси: {len(unique_keys)} перевірок для {len(targets)} цілей, "
+            f"заощаджено {saved_probes}."
         )
+    if metrics is not None:
+        for probe in unique_probes:
+            metrics.observe_probe(probe)
+        metrics.probes_saved.inc(saved_probes)
+
+    freeze_offline = False
+    if config.sentinel_endpoints and not check_sentinels(config, metrics, sentinels):
+        if config.sentinel_mode == "abort":
+            print(f"Сторожові адреси зникли під час перевірки, результати {len(targets)} цілей відкинуто.")
+            if metrics is not None:
+                metrics.sentinel_suppressed.inc(len(targets), action="discarded")
+            return pending, has_state_update
+        print("Сторожові адреси зникли під час перевірки, переходи в офлайн заморожено.")
+        freeze_offline = True
 
+    observed: list[tuple[MonitorTarget, ProbeResult]] = []
+    for target, probe_key in zip(targets, probe_keys):
+        probe = probe_by_key[probe_key]
+        if not probe.is_conclusive:
+            print(f"[{target.id}] Не вдалося визначити стан {target.host} ({probe.dns_error}), стан не змінено.")
+            continue
+        if freeze_offline and not probe.is_online:
+            print(f"[{target.id}] Офлайн не враховано: монітор сам без зв'язку, стан не змінено.")
+            if metrics is not None:
+                metrics.sentinel_suppressed.inc(action="frozen")
+            continue
+        observed.append((target, probe))
+
+    comparisons = compare_and_store(
+        state,
+        [target.id for target, _ in observed],
+        [probe.is_online for _, probe in observed],
+        now=run_time,
+        offline_confirmation_cycles=config.offline_confirmation_cycles,
+        online_confirmation_cycles=config.online_confirmation_cycles,
+    )
+
+    for (target, probe), comparison in zip(observed, comparisons):
         status_ua = "онлайн" if probe.is_online else "офлайн"
+        if comparison is None:
+            print(
+                f"[{target.id}] Без змін: {status_ua} "
+                f"({probe.successful_attempts}/{probe.total_attempts} успішних перевірок)."
+            )
+            continue
+
+        has_state_update = True
         if comparison.is_first_observation:
             print(
                 f"[{target.id}] Перше спостереження: {status_ua} "
                 f"({probe.successful_attempts}/{probe.total_attempts} успішних перевірок)."
             )
-            state[target.id] = comparison.new_state
-            has_state_update = True
+            if history is not None:
+                history.observe(target.id, comparison.new_state)
             continue
 
         if not comparison.changed:
-            if comparison.state_updated:
-                state[target.id] = comparison.new_state
-                has_state_update = True
-                required_cycles = (
-                    config.offline_confirmation_cycles
-                    if comparison.current_status == "offline"
-                    else config.online_confirmation_cycles
-                )
-                pending_count = comparison.new_state.get("pending_count", 0)
-                print(
-                    f"[{target.id}] Кандидат на зміну: {status_ua} "
-                    f"({pending_count}/{required_cycles} циклів, "
-                    f"{probe.successful_attempts}/{probe.total_attempts} успішних перевірок)."
-                )
-            else:
-                print(
-                    f"[{target.id}] Без змін: {status_ua} "
-                    f"({probe.successful_attempts}/{probe.total_attempts} успішних перевірок)."
-                )
+            required_cycles = (
+                config.offline_confirmation_cycles
+                if comparison.current_status == "offline"
+                else config.online_confirmation_cycles
+            )
+            pending_count = comparison.new_state.get("pending_count", 0)
+            if pending_count:
+                pending.append(target)
+            print(
+                f"[{target.id}] Кандидат на зміну: {status_ua} "
+                f"({pending_count}/{required_cycles} циклів, "
+                f"{probe.successful_attempts}/{probe.total_attempts} успішних перевірок)."
+            )
             continue
 
         message = format_ua_message(
@@ -109,69 +288,178 @@ def run_cycle(
             timezone_name=config.timezone_name,
             include_target_name=config.include_target_name_in_message,
         )
-        sent = send_telegram_message(config.telegram_bot_token, target.chat_id, message)
-        if not sent:
-            continue
-
-        state[target.id] = comparison.new_state
-        has_state_update = True
+        priority = PRIORITY_DEFAULT if probe.is_online else PRIORITY_OUTAGE
+        outbox.enqueue(target.id, target.chat_id, message, now=run_time, priority=priority)
+        if metrics is not None:
+            metrics.transitions.inc(status=comparison.current_status)
+        if history is not None:
+            history.observe(target.id, comparison.new_state)
         print(
-            f"[{target.id}] Статус підтверджено як {status_ua}, повідомлення надіслано "
+            f"[{target.id}] Статус підтверджено як {status_ua}, повідомлення додано в чергу "
             f"({probe.successful_attempts}/{probe.total_attempts} успішних перевірок)."
         )
 
-    return state, has_state_update
+    return pending, has_state_update
+
+
+class SentinelCache:
+    """Sentinel verdict reused for `ttl_seconds` across passes.
+
+    The daemon runs a pass per tick and per confirmation probe; without the cache the
+    sentinels would be probed twice for each of them. A changed sentinel setup (config
+    reload) is never served from the cache.
+    """
+
+    def __init__(self, ttl_seconds: float, *, clock: Callable[[], float] = time.monotonic) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._group: EndpointGroup | None = None
+        self._online = False
+        self._expires_at = 0.0
+
+    def get(self, group: EndpointGroup) -> bool | None:
+        if group != self._group or self._clock() >= self._expires_at:
+            return None
+        return self._online
+
+    def put(self, group: EndpointGroup, online: bool) -> None:
+        self._group = group
+        self._online = online
+        self._expires_at = self._clock() + self.ttl_seconds
+
+
+def check_sentinels(
+    config: RuntimeConfig,
+    metrics: CycleMetrics | None = None,
+    cache: SentinelCache | None = None,
+) -> bool:
+    """Check the monitor's own connectivity; True when it looks fine or no sentinels are set.
+
+    The sentinels are probed as one `EndpointGroup` that needs `sentinel_quorum` of them.
+    When the check fails before the target probes, they are skipped. When it fails right
+    after them, `sentinel_mode` decides: `abort` discards every result of the pass and
+    `freeze` applies only online observations, so a dying uplink cannot confirm a
+    fleet-wide outage. With a `cache` a recent verdict is reused instead of probing again.
+    """
+    if not config.sentinel_endpoints:
+        return True
+
+    endpoints = tuple(dict.fromkeys((endpoint.host.lower(), endpoint.port) for endpoint in config.sentinel_endpoints))
+    group = EndpointGroup(endpoints, rule="quorum", quorum=config.sentinel_quorum)
+    if cache is not None and (cached := cache.get(group)) is not None:
+        return cached
+    [probe] = probe_targets(
+        [group],
+        timeout=config.check_timeout_seconds,
+        policies=[config.sentinel_policy()],
+        resolver=resolver_for(config),
+        engine=config.probe_engine,
+    )
+    online = probe.is_conclusive and probe.is_online
+    if cache is not None:
+        cache.put(group, online)
+    if metrics is not None:
+        metrics.sentinel_checks.inc(result="online" if online else "offline")
+    return online
+
+
+def _probe_key(config: RuntimeConfig, target: MonitorTarget) -> tuple[ProbeItem, ProbePolicy]:
+    """Targets with the same endpoints, rule and probe policy share one probe per cycle."""
+    endpoints = tuple(dict.fromkeys((host.lower(), port) for host, port in target.probe_endpoints))
+    if len(endpoints) == 1:
+        return endpoints[0], config.probe_policy_for(target)
+    group = EndpointGroup(endpoints, rule=target.endpoint_rule, quorum=target.endpoint_quorum)
+    return group, config.probe_policy_for(target)
+
+
+def deliver_outbox(
+    config: RuntimeConfig,
+    outbox: Outbox,
+    metrics: CycleMetrics | None = None,
+) -> None:
+    """Send due notifications from the outbox with the shared notifier."""
+    report = drain_outbox(
+        outbox,
+        notifier_for(config),
+        max_attempts=config.notify_max_attempts,
+        metrics=metrics,
+        digest_threshold=config.notify_digest_threshold,
+        digest_window_seconds=config.notify_digest_window_seconds,
+        scheduler=scheduler_for(config),
+        max_queue=config.notify_queue_limit,
+        max_wait_seconds=config.notify_max_wait_seconds,
+    )
+    if report.retried or report.dropped or report.deferred:
+        print(
+            f"Черга повідомлень: надіслано {report.sent}, до повтору {report.retried}, "
+            f"відкинуто {report.dropped}, відкладено через ліміти {report.deferred}, "
+            f"залишилось {report.remaining}."
+        )
 
 
-def run_once_file_state() -> None:
-    """Run one cycle with local JSON persistence."""
+def open_config_state_store(
+    config: RuntimeConfig,
+    metrics: CycleMetrics | None = None,
+) -> StateStore:
+    """Open the local state store and drop entries of targets removed from the config."""
+    with _time_state_io(metrics, "open"):
+        store = open_state_store(config.state_path, config.state_backend)
+    pruned = store.prune(target.id for target in config.monitor_config)
+    if pruned:
+        with _time_state_io(metrics, "compact"):
+            store.flush()
+            store.compact()
+        print(f"Видалено стан {pruned} цілей, яких більше немає в MONITOR_CONFIG.")
+    return store
+
+
+def run_once_file_state(*, cold_start_seconds: float | None = None) -> None:
+    """Run one cycle with local file persistence (JSON or SQLite).
+
+    `cold_start_seconds` is the entrypoint's import time; it is recorded in the metrics.
+    """
     config = load_runtime_config()
-    state = load_state(config.state_path)
-    state, has_state_update = run_cycle(config, state)
-    if has_state_update:
-        save_state(config.state_path, state)
+    metrics = CycleMetrics()
+    if cold_start_seconds is not None:
+        metrics.cold_start.observe(cold_start_seconds)
+    store = open_config_state_store(config, metrics)
+    outbox = load_outbox(config.outbox_path)
+    history = open_history(config.history_path)
+    try:
+        run_cycle(config, store, outbox=outbox, metrics=metrics, history=history)
+    finally:
+        # Queued messages reach disk before the state that confirmed them, also when the
+        # cycle fails midway; if the outbox cannot be saved, the state is not saved either.
+        save_outbox(config.outbox_path, outbox)
+        with metrics.time_state_io("flush"):
+            store.close()
+            if history is not None:
+                history.flush()
 
+    deliver_outbox(config, outbox, metrics)
+    save_outbox(config.outbox_path, outbox)
+    export_metrics(config, metrics)
 
-def run_forever() -> None:
-    """Run cycles every N seconds (default 5 minutes)."""
-    while True:
-        config = load_runtime_config()
-        state = load_state(config.state_path)
 
-        state, has_state_update = run_cycle(config, state)
-        if has_state_update:
-            save_state(config.state_path, state)
+def export_metrics(config: RuntimeConfig, metrics: CycleMetrics) -> None:
+    """Write the Prometheus textfile when `METRICS_TEXTFILE_PATH` is configured."""
+    if not config.metrics_textfile_path:
+        return
+    try:
+        metrics.write_textfile(config.metrics_textfile_path)
+    except OSError as exc:
+        print(f"Не вдалося записати метрики: {exc}")
 
-        time.sleep(config.check_interval_seconds)
 
+def _time_state_io(
+    metrics: CycleMetrics | None,
+    operation: str,
+) -> AbstractContextManager[None]:
+    return nullcontext() if metrics is None else metrics.time_state_io(operation)
 
-def coerce_state(raw_state: Any) -> dict[str, SavedState]:
-    """Normalize external state object to SavedState dictionary."""
-    if not isinstance(raw_state, dict):
-        return {}
 
-    cleaned: dict[str, SavedState] = {}
-    for target_id, value in raw_state.items():
-        if not isinstance(target_id, str) or not isinstance(value, dict):
-            continue
+def run_forever() -> None:
+    """Run cycles every N seconds (default 5 minutes) as a long-lived daemon."""
+    from .daemon import MonitorDaemon  # daemon builds on this module
 
-        status = value.get("status")
-        changed_at = value.get("changed_at")
-        if status in {"online", "offline"} and isinstance(changed_at, str):
-            cleaned_state: SavedState = {"status": status, "changed_at": changed_at}
-            pending_status = value.get("pending_status")
-            pending_count = value.get("pending_count")
-            pending_since = value.get("pending_since")
-            if (
-                pending_status in {"online", "offline"}
-                and isinstance(pending_count, int)
-                and pending_count > 0
-                and isinstance(pending_since, str)
-            ):
-                cleaned_state["pending_status"] = pending_status
-                cleaned_state["pending_count"] = pending_count
-                cleaned_state["pending_since"] = pending_since
-
-            cleaned[target_id] = cleaned_state
-
-    return cleaned
+    MonitorDaemon().run()
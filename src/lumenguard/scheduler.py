@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import heapq
+import random
+from collections import defaultdict
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class _Slot:
+    interval: float
+    base_due: float
+    generation: int
+
+
+class ProbeScheduler:
+    """Min-heap of per-target due times for the long-running daemon.
+
+    Targets that share an interval are phase-shifted evenly across it, so probes are
+    spread over the period instead of bursting on one tick. Every firing is delayed by
+    a random jitter of up to `jitter_ratio * interval`; the jitter never accumulates,
+    because the next due time is computed from the un-jittered base.
+    """
+
+    def __init__(self, *, jitter_ratio: float = 0.0, rng: random.Random | None = None) -> None:
+        self.jitter_ratio = jitter_ratio
+        self._rng = rng or random.Random()
+        self._slots: dict[str, _Slot] = {}
+        self._heap: list[tuple[float, int, str]] = []
+        self._generation = 0
+        self._one_off: set[int] = set()
+        self.skipped = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def sync(self, intervals: Sequence[tuple[str, float]], now: float) -> None:
+        """Match the schedule to `(target_id, interval)` pairs from the current config.
+
+        Known targets keep their phase (a changed interval applies from the next firing),
+        removed targets are dropped, and new targets are spread across their interval.
+        """
+        wanted = dict(intervals)
+        for target_id in list(self._slots):
+            if target_id not in wanted:
+                del self._slots[target_id]
+            else:
+                self._slots[target_id].interval = wanted[target_id]
+
+        new_by_interval: dict[float, list[str]] = defaultdict(list)
+        for target_id, interval in wanted.items():
+            if target_id not in self._slots:
+                new_by_interval[interval].append(target_id)
+        for interval, target_ids in new_by_interval.items():
+            for rank, target_id in enumerate(target_ids):
+                self._push(target_id, interval, now + interval * rank / len(target_ids))
+
+    def probe_once(self, target_ids: Sequence[str], at: float) -> None:
+        """Add an extra firing at `at` (e.g. a confirmation probe) without moving the regular ones."""
+        for target_id in target_ids:
+            if target_id in self._slots:
+                self._generation += 1
+                self._one_off.add(self._generation)
+                heapq.heappush(self._heap, (at, self._generation, target_id))
+
+    def pop_due(self, now: float) -> list[str]:
+        """Return targets due at `now` and schedule their next firing.
+
+        Firings missed because the previous cycle overran are skipped, not replayed;
+        their count is added to `skipped`.
+        """
+        due: list[str] = []
+        while self._heap and self._heap[0][0] <= now:
+            _, generation, target_id = heapq.heappop(self._heap)
+            if generation in self._one_off:
+                self._one_off.discard(generation)
+                if target_id in self._slots and target_id not in due:
+                    due.append(target_id)
+                continue
+            slot = self._slots.get(target_id)
+            if slot is None or slot.generation != generation:
+                continue
+            if target_id not in due:
+                due.append(target_id)
+            next_due = slot.base_due + slot.interval
+            if next_due <= now:
+                missed = int((now - next_due) // slot.interval) + 1
+                self.skipped += missed
+                next_due += missed * slot.interval
+            self._push(target_id, slot.interval, next_due)
+        return due
+
+    def next_due(self) -> float | None:
+        """Moment of the earliest pending firing, or None when nothing is scheduled."""
+        while self._heap:
+            _, generation, target_id = self._heap[0]
+            slot = self._slots.get(target_id)
+            if slot is not None and (slot.generation == generation or generation in self._one_off):
+                return self._heap[0][0]
+            self._one_off.discard(generation)
+            heapq.heappop(self._heap)
+        return None
+
+    def _push(self, target_id: str, interval: float, base_due: float) -> None:
+        self._generation += 1
+        self._slots[target_id] = _Slot(interval, base_due, self._generation)
+        jitter = self._rng.uniform(0.0, self.jitter_ratio * interval) if self.jitter_ratio else 0.0
+        heapq.heappush(self._heap, (base_due + jitter, self._generation, target_id))
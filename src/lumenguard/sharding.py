@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import hashlib
+import math
+from collections.abc import Callable, Iterable, MutableMapping, Sequence
+from concurrent.futures import Executor
+from datetime import datetime
+from typing import Any, TypedDict
+
+from .config import MonitorTarget, RuntimeConfig
+from .history import TransitionHistory, record_history
+from .logic import SavedState
+from .metrics import CycleMetrics, MetricsSummary
+from .outbox import Outbox, PendingNotification
+from .runner import run_cycle
+
+
+class ShardResult(TypedDict):
+    state: dict[str, SavedState]
+    notifications: list[PendingNotification]
+    metrics: MetricsSummary
+
+
+# Like Modal's `.map(..., return_exceptions=True)`: a failed shard may come back as its exception.
+ShardMap = Callable[
+    [Sequence[dict[str, Any]], Sequence[dict[str, SavedState]], Sequence[str]],
+    Iterable[ShardResult | BaseException],
+]
+
+
+def shard_index(key: str, shard_count: int) -> int:
+    """Stable shard for a key: independent of process, config order and hash seed."""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % max(1, shard_count)
+
+
+def shard_targets(targets: Sequence[MonitorTarget], shard_count: int) -> list[list[MonitorTarget]]:
+    """Split targets into `shard_count` buckets by stable hash, keeping config order inside each.
+
+    The hash is taken over the endpoint, so targets sharing `host:port` land in the same
+    shard and `run_cycle` can still probe that endpoint once.
+    """
+    shards: list[list[MonitorTarget]] = [[] for _ in range(max(1, shard_count))]
+    for target in targets:
+        shards[shard_index(f"{target.host.lower()}:{target.port}", len(shards))].append(target)
+    return shards
+
+
+def shard_count_for(config: RuntimeConfig) -> int:
+    if config.shard_size <= 0:
+        return 1
+    return min(config.max_shards, math.ceil(len(config.monitor_config) / config.shard_size))
+
+
+def run_shard(
+    config_payload: dict[str, Any],
+    shard_state: dict[str, SavedState],
+    now_iso: str,
+) -> ShardResult:
+    """Probe one shard and return its state delta plus queued notifications.
+
+    Arguments and result are plain data so the call can run in another container.
+    """
+    config = RuntimeConfig.from_worker_payload(config_payload)
+    state = dict(shard_state)
+    outbox = Outbox()
+    metrics = CycleMetrics()
+
+    run_cycle(config, state, now=datetime.fromisoformat(now_iso), outbox=outbox, metrics=metrics)
+
+    delta = {
+        target_id: entry for target_id, entry in state.items() if shard_state.get(target_id) != entry
+    }
+    return {"state": delta, "notifications": outbox.pending(), "metrics": metrics.summary()}
+
+
+def local_shard_map(
+    config_payloads: Sequence[dict[str, Any]],
+    shard_states: Sequence[dict[str, SavedState]],
+    now_isos: Sequence[str],
+) -> Iterable[ShardResult]:
+    """Run shards one after another in this process."""
+    return map(run_shard, config_payloads, shard_states, now_isos)
+
+
+def executor_shard_map(executor: Executor) -> ShardMap:
+    """Run shards in parallel on a local executor, standing in for Modal's `.map`."""
+
+    def shard_map(
+        config_payloads: Sequence[dict[str, Any]],
+        shard_states: Sequence[dict[str, SavedState]],
+        now_isos: Sequence[str],
+    ) -> Iterable[ShardResult]:
+        return executor.map(run_shard, config_payloads, shard_states, now_isos)
+
+    return shard_map
+
+
+def run_sharded_cycle(
+    config: RuntimeConfig,
+    state: MutableMapping[str, SavedState],
+    *,
+    now: datetime,
+    outbox: Outbox,
+    shard_count: int,
+    shard_map: ShardMap = local_shard_map,
+    metrics: CycleMetrics | None = None,
+    history: TransitionHistory | None = None,
+) -> tuple[MutableMapping[str, SavedState], bool]:
+    """Fan targets out to shards, then merge their state deltas and notifications back.
+
+    Every shard result is collected before anything is merged, so a map that raises leaves
+    `state` and `outbox` untouched. A shard returned as an exception abstains: its targets
+    keep their state and are probed again next cycle, while the other shards still apply.
+    """
+    shards = [shard for shard in shard_targets(config.monitor_config, shard_count) if shard]
+    base_payload = config.worker_payload()
+    config_payloads = [
+        {**base_payload, "monitor_config": [target.model_dump(mode="json") for target in shard]}
+        for shard in shards
+    ]
+    shard_states = [
+        {target.id: entry for target in shard if (entry := state.get(target.id)) is not None}
+        for shard in shards
+    ]
+    now_iso = now.isoformat()
+
+    results = list(shard_map(config_payloads, shard_states, [now_iso] * len(shards)))
+    failed = [result for result in results if isinstance(result, BaseException)]
+    for error in failed:
+        print(f"Шард не виконано, його цілі перевіряться наступним циклом: {error}")
+
+    has_state_update = False
+    for result in results:
+        if isinstance(result, BaseException):
+            continue
+        for target_id, entry in result["state"].items():
+            state[target_id] = entry
+            has_state_update = True
+        for notification in result["notifications"]:
+            outbox.put(notification)
+        if metrics is not None:
+            metrics.merge(result.get("metrics", {}))
+        if history is not None:
+            record_history(history, state, result["state"])
+
+    print(
+        f"Цикл виконано в {len(shards) - len(failed)} з {len(shards)} шардів ({len(config.monitor_config)} цілей)."
+    )
+    return state, has_state_update
@@ -0,0 +1,212 @@
+"""Versioned binary snapshot of the fleet state.
+
+Layout (little-endian), one column after another so each loads with a single `frombytes`:
+
+- header: `LGS1`, format version, target count `n`, string-table length, CRC32 of the body;
+- `changed_at`, `pending_since`, `pending_count`: `n` int64 each (timestamps in
+  microseconds since the epoch, see `state_table`);
+- `id_end`: `n` uint32, end offset of each target id in the string table;
+- `status`, `pending_status`: `n` int8 each;
+- string table: the UTF-8 target ids, sorted, separated by NUL.
+
+Targets are sorted by id, so `SnapshotReader` can memory-map the file and answer
+`get(target_id)` by binary search, decoding only the entries it touches.
+"""
+
+from __future__ import annotations
+
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import Iterator, Mapping
+from itertools import accumulate
+from pathlib import Path
+from types import TracebackType
+
+from .logic import SavedState
+from .state_table import UNKNOWN, StateTable
+
+MAGIC = b"LGS1"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHIII")
+_ROW_BYTES = 3 * 8 + 4 + 2
+_INT64 = struct.Struct("<q")
+_UINT32 = struct.Struct("<I")
+_INT8 = struct.Struct("<b")
+
+
+class SnapshotError(ValueError):
+    """The bytes are not a readable snapshot (wrong magic, version, size or checksum)."""
+
+
+def encode_snapshot(states: StateTable | Mapping[str, SavedState]) -> bytes:
+    table = states if isinstance(states, StateTable) else StateTable.from_states(states)
+    encoded = sorted(
+        (target_id.encode("utf-8"), row) for row, target_id in enumerate(table.ids) if table.status[row] != UNKNOWN
+    )
+    if any(b"\0" in encoded_id for encoded_id, _ in encoded):
+        raise SnapshotError("ID цілі не може містити символ NUL")
+
+    order = [row for _, row in encoded]
+    strings = b"\0".join(encoded_id for encoded_id, _ in encoded)
+    id_end = array("I", accumulate(len(encoded_id) + (position > 0) for position, (encoded_id, _) in enumerate(encoded)))
+    columns = (
+        array("q", [table.changed_at[row] for row in order]),
+        array("q", [table.pending_since[row] for row in order]),
+        array("q", [table.pending_count[row] for row in order]),
+        id_end,
+        array("b", [table.status[row] for row in order]),
+        array("b", [table.pending_status[row] for row in order]),
+    )
+    body = b"".join(_little_endian_bytes(column) for column in columns) + strings
+    return HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(order), len(strings), zlib.crc32(body)) + body
+
+
+def decode_snapshot(data: bytes | bytearray | memoryview, *, verify: bool = True) -> StateTable:
+    """Decode a whole snapshot into a `StateTable`."""
+    view = memoryview(data).cast("B")
+    count, strings_length = _check_header(view, verify=verify)
+    offset = HEADER.size
+    columns = []
+    for typecode in ("q", "q", "q", "I", "b", "b"):
+        column = array(typecode)
+        size = column.itemsize * count
+        column.frombytes(view[offset : offset + size])
+        if sys.byteorder == "big":
+            column.byteswap()
+        columns.append(column)
+        offset += size
+
+    changed_at, pending_since, pending_count, _, status, pending_status = columns
+    try:
+        ids = str(view[offset : offset + strings_length], "utf-8").split("\0") if count else []
+    except UnicodeDecodeError as exc:
+        raise SnapshotError(f"таблиця ID не є UTF-8: {exc}") from exc
+    if len(ids) != count:
+        raise SnapshotError("таблиця ID не збігається з кількістю цілей")
+    return StateTable.from_columns(ids, status, changed_at, pending_status, pending_count, pending_since)
+
+
+def write_snapshot(path: str | Path, states: StateTable | Mapping[str, SavedState]) -> None:
+    """Write a snapshot atomically (temp file + rename)."""
+    snapshot_path = Path(path)
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = snapshot_path.with_name(f"{snapshot_path.name}.tmp")
+    temp_path.write_bytes(encode_snapshot(states))
+    temp_path.replace(snapshot_path)
+
+
+def load_snapshot(path: str | Path) -> StateTable:
+    return decode_snapshot(Path(path).read_bytes())
+
+
+class SnapshotReader:
+    """Read-only, memory-mapped view of a snapshot file.
+
+    Opening checks only the header; `to_table` also verifies the body checksum.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        with self.path.open("rb") as file:
+            try:
+                self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as exc:  # empty file
+                raise SnapshotError(f"{self.path}: {exc}") from exc
+        self._view = memoryview(self._mmap)
+        try:
+            self._count, _ = _check_header(self._view, verify=False)
+        except SnapshotError:
+            self.close()
+            raise
+
+    def __enter__(self) -> SnapshotReader:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, target_id: object) -> bool:
+        return isinstance(target_id, str) and self._find(target_id.encode("utf-8")) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for position in range(self._count):
+            yield str(self._id_at(position), "utf-8")
+
+    def get(self, target_id: str) -> SavedState | None:
+        position = self._find(target_id.encode("utf-8"))
+        if position is None:
+            return None
+        row = StateTable.from_columns(
+            [target_id],
+            status=array("b", [self._int8(0, position)]),
+            changed_at=array("q", [self._int64(0, position)]),
+            pending_status=array("b", [self._int8(1, position)]),
+            pending_count=array("q", [self._int64(2, position)]),
+            pending_since=array("q", [self._int64(1, position)]),
+        )
+        return row.get(target_id)
+
+    def to_table(self) -> StateTable:
+        return decode_snapshot(self._view, verify=True)
+
+    def close(self) -> None:
+        self._view.release()
+        self._mmap.close()
+
+    def _int64(self, column: int, position: int) -> int:
+        return _INT64.unpack_from(self._view, HEADER.size + (column * self._count + position) * 8)[0]
+
+    def _int8(self, column: int, position: int) -> int:
+        return _INT8.unpack_from(self._view, HEADER.size + self._count * 28 + column * self._count + position)[0]
+
+    def _id_at(self, position: int) -> memoryview:
+        id_end = HEADER.size + self._count * 24
+        strings = HEADER.size + self._count * _ROW_BYTES
+        end = _UINT32.unpack_from(self._view, id_end + position * 4)[0]
+        start = _UINT32.unpack_from(self._view, id_end + (position - 1) * 4)[0] + 1 if position else 0
+        return self._view[strings + start : strings + end]
+
+    def _find(self, encoded_id: bytes) -> int | None:
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._id_at(middle).tobytes() < encoded_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count and self._id_at(low) == encoded_id:
+            return low
+        return None
+
+
+def _little_endian_bytes(column: array) -> bytes:
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _check_header(view: memoryview, *, verify: bool) -> tuple[int, int]:
+    if len(view) < HEADER.size:
+        raise SnapshotError("знімок коротший за заголовок")
+    magic, version, _, count, strings_length, checksum = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise SnapshotError("це не знімок стану LUMENGUARD")
+    if version != FORMAT_VERSION:
+        raise SnapshotError(f"непідтримувана версія знімка: {version}")
+    if len(view) != HEADER.size + count * _ROW_BYTES + strings_length:
+        raise SnapshotError("розмір знімка не збігається із заголовком")
+    if verify and zlib.crc32(view[HEADER.size :]) != checksum:
+        raise SnapshotError("контрольна сума знімка не збігається")
+    return count, strings_length
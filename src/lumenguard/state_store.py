@@ -0,0 +1,614 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterable, Iterator, MutableMapping, Sequence
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Literal
+
+from .logic import (
+    SavedState,
+    StateComparison,
+    Status,
+    _normalize_saved_state_entry,
+    coerce_state,
+    compare_states,
+    discard_key,
+    load_state,
+    save_state,
+)
+from .snapshot import SnapshotError, load_snapshot, write_snapshot
+from .state_table import ONLINE, UNKNOWN, StateTable, compare_states_batch
+
+StateBackend = Literal["json", "sqlite", "snapshot"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS target_state (
+    target_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    changed_at TEXT NOT NULL,
+    pending_status TEXT,
+    pending_count INTEGER,
+    pending_since TEXT
+) WITHOUT ROWID
+"""
+_COLUMNS = "target_id, status, changed_at, pending_status, pending_count, pending_since"
+# Lease generations older than this are deleted; a scan that far behind is not realistic.
+_KEPT_LEASE_GENERATIONS = 8
+
+
+class StateStore(MutableMapping[str, SavedState]):
+    """Mapping of target id to `SavedState` that remembers which entries changed.
+
+    `run_cycle` reads and writes it like a dict; `flush` persists only the changes.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._dirty: set[str] = set()
+        self._deleted: set[str] = set()
+
+    def __setitem__(self, target_id: str, value: SavedState) -> None:
+        with self._lock:
+            self._store(target_id, value)
+            self._dirty.add(target_id)
+            self._deleted.discard(target_id)
+
+    def __delitem__(self, target_id: str) -> None:
+        with self._lock:
+            if target_id not in self:
+                raise KeyError(target_id)
+            self._forget(target_id)
+            self._dirty.discard(target_id)
+            self._deleted.add(target_id)
+
+    def prune(self, keep_ids: Iterable[str]) -> int:
+        """Drop entries for targets that are no longer configured; return how many."""
+        keep = set(keep_ids)
+        with self._lock:
+            orphaned = [target_id for target_id in self if target_id not in keep]
+            for target_id in orphaned:
+                del self[target_id]
+        return len(orphaned)
+
+    def flush(self) -> int:
+        """Persist pending changes and return the number of entries written or deleted."""
+        with self._lock:
+            if not self._dirty and not self._deleted:
+                return 0
+            changed = {target_id: self[target_id] for target_id in self._dirty}
+            deleted = set(self._deleted)
+            self._persist(changed, deleted)
+            self._dirty.clear()
+            self._deleted.clear()
+            return len(changed) + len(deleted)
+
+    def compact(self) -> None:
+        """Reclaim space after pruning; a no-op for stores that rewrite everything."""
+
+    def close(self) -> None:
+        self.flush()
+
+    def _store(self, target_id: str, value: SavedState) -> None:
+        raise NotImplementedError
+
+    def _forget(self, target_id: str) -> None:
+        raise NotImplementedError
+
+    def _persist(self, changed: dict[str, SavedState], deleted: set[str]) -> None:
+        raise NotImplementedError
+
+
+class JsonStateStore(StateStore):
+    """State kept in memory and written back as the whole `state.json` file."""
+
+    def __init__(self, path: str | Path) -> None:
+        super().__init__()
+        self.path = Path(path)
+        self._state = load_state(self.path)
+
+    def __getitem__(self, target_id: str) -> SavedState:
+        return self._state[target_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._state))
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def _store(self, target_id: str, value: SavedState) -> None:
+        self._state[target_id] = value
+
+    def _forget(self, target_id: str) -> None:
+        del self._state[target_id]
+
+    def _persist(self, changed: dict[str, SavedState], deleted: set[str]) -> None:
+        save_state(self.path, self._state)
+
+
+class SqliteStateStore(StateStore):
+    """SQLite (WAL) store that loads entries by target id and upserts only changed rows.
+
+    When the database is empty and `legacy_json_path` exists, its entries are imported.
+    """
+
+    def __init__(self, path: str | Path, *, legacy_json_path: str | Path | None = None) -> None:
+        super().__init__()
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(_SCHEMA)
+        self._cache: dict[str, SavedState] = {}
+        if legacy_json_path is not None:
+            self._migrate_from_json(Path(legacy_json_path))
+
+    def __getitem__(self, target_id: str) -> SavedState:
+        with self._lock:
+            cached = self._cache.get(target_id)
+            if cached is not None:
+                return cached
+            if target_id in self._deleted:
+                raise KeyError(target_id)
+
+            row = self._connection.execute(
+                f"SELECT {_COLUMNS} FROM target_state WHERE target_id = ?",
+                (target_id,),
+            ).fetchone()
+            entry = _row_to_state(row) if row else None
+            if entry is None:
+                raise KeyError(target_id)
+            self._cache[target_id] = entry
+            return entry
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            stored = [row[0] for row in self._connection.execute("SELECT target_id FROM target_state")]
+            ids = {target_id for target_id in stored if target_id not in self._deleted}
+            ids.update(self._cache)
+        return iter(sorted(ids))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def compact(self) -> None:
+        """Checkpoint the WAL and reclaim pages freed by pruning."""
+        with self._lock:
+            self._connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._connection.execute("VACUUM")
+
+    def close(self) -> None:
+        with self._lock:
+            super().close()
+            self._connection.close()
+
+    def _store(self, target_id: str, value: SavedState) -> None:
+        self._cache[target_id] = value
+
+    def _forget(self, target_id: str) -> None:
+        self._cache.pop(target_id, None)
+
+    def _persist(self, changed: dict[str, SavedState], deleted: set[str]) -> None:
+        with self._connection:
+            self._connection.executemany(
+                f"INSERT INTO target_state ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(target_id) DO UPDATE SET "
+                "status = excluded.status, changed_at = excluded.changed_at, "
+                "pending_status = excluded.pending_status, "
+                "pending_count = excluded.pending_count, "
+                "pending_since = excluded.pending_since",
+                [_state_to_row(target_id, entry) for target_id, entry in changed.items()],
+            )
+            self._connection.executemany(
+                "DELETE FROM target_state WHERE target_id = ?",
+                [(target_id,) for target_id in deleted],
+            )
+
+    def _migrate_from_json(self, legacy_json_path: Path) -> None:
+        has_rows = self._connection.execute("SELECT 1 FROM target_state LIMIT 1").fetchone()
+        if has_rows or not legacy_json_path.exists():
+            return
+
+        legacy_state = load_state(legacy_json_path)
+        if not legacy_state:
+            return
+        self._persist(legacy_state, set())
+        print(f"Стан перенесено з {legacy_json_path} у {self.path} ({len(legacy_state)} цілей).")
+
+
+class SnapshotStateStore(StateStore):
+    """State held in a `StateTable` and written back as one binary snapshot (see `snapshot`).
+
+    When the snapshot does not exist yet, or is unreadable, the entries of
+    `legacy_json_path` are loaded instead; the JSON file itself is left in place.
+    """
+
+    def __init__(self, path: str | Path, *, legacy_json_path: str | Path | None = None) -> None:
+        super().__init__()
+        self.path = Path(path)
+        self._table = StateTable()
+        if self.path.exists():
+            try:
+                self._table = load_snapshot(self.path)
+            except (OSError, SnapshotError) as exc:
+                print(f"Не вдалося прочитати знімок стану {self.path}: {exc}")
+        if not len(self._table) and legacy_json_path is not None:
+            self._migrate_from_json(Path(legacy_json_path))
+
+    def __getitem__(self, target_id: str) -> SavedState:
+        entry = self._table.get(target_id)
+        if entry is None:
+            raise KeyError(target_id)
+        return entry
+
+    def __iter__(self) -> Iterator[str]:
+        table = self._table
+        return iter([target_id for target_id, status in zip(table.ids, table.status) if status != UNKNOWN])
+
+    def __len__(self) -> int:
+        return len(self._table) - self._table.status.count(UNKNOWN)
+
+    def compact(self) -> None:
+        """Drop the rows of forgotten targets from the in-memory table."""
+        with self._lock:
+            self._table = StateTable.from_states(self._table.to_states())
+
+    def compare_and_store(
+        self,
+        target_ids: Sequence[str],
+        observations: Sequence[bool],
+        *,
+        now: datetime,
+        offline_confirmation_cycles: int,
+        online_confirmation_cycles: int,
+    ) -> list[StateComparison | None]:
+        """`compare_and_store` as one `compare_states_batch` pass over the table's columns.
+
+        Only updated rows are turned back into `SavedState` dicts.
+        """
+        with self._lock:
+            table = self._table
+            rows = table.rows(target_ids)
+            previous = [table.status[row] for row in rows]
+            batch = compare_states_batch(
+                table,
+                rows,
+                observations,
+                now=now,
+                offline_confirmation_cycles=offline_confirmation_cycles,
+                online_confirmation_cycles=online_confirmation_cycles,
+            )
+            results: list[StateComparison | None] = []
+            for position, target_id in enumerate(target_ids):
+                if not batch.state_updated[position]:
+                    results.append(None)
+                    continue
+                self._dirty.add(target_id)
+                self._deleted.discard(target_id)
+                previous_status: Status | None = None
+                if previous[position] != UNKNOWN:
+                    previous_status = "online" if previous[position] == ONLINE else "offline"
+                results.append(
+                    StateComparison(
+                        changed=bool(batch.changed[position]),
+                        state_updated=True,
+                        is_first_observation=bool(batch.first_observation[position]),
+                        current_status="online" if observations[position] else "offline",
+                        previous_status=previous_status,
+                        duration_seconds=batch.duration_seconds[position],
+                        new_state=table.get(target_id),
+                    )
+                )
+            return results
+
+    def _store(self, target_id: str, value: SavedState) -> None:
+        self._table.set(target_id, value)
+
+    def _forget(self, target_id: str) -> None:
+        self._table.clear(target_id)
+
+    def _persist(self, changed: dict[str, SavedState], deleted: set[str]) -> None:
+        write_snapshot(self.path, self._table)
+
+    def _migrate_from_json(self, legacy_json_path: Path) -> None:
+        if not legacy_json_path.exists():
+            return
+        legacy_state = load_state(legacy_json_path)
+        if not legacy_state:
+            return
+        self._table = StateTable.from_states(legacy_state)
+        write_snapshot(self.path, self._table)
+        print(f"Стан перенесено з {legacy_json_path} у {self.path} ({len(legacy_state)} цілей).")
+
+
+_BATCHED_VERSION_READ = 16
+
+
+class MappingStateStore(StateStore):
+    """One key per target in a shared mapping such as `modal.Dict`, with versioned writes.
+
+    Every record is `{"version": n, "state": SavedState}`. `flush` re-reads the version of
+    each changed key (in one scan when many changed) and skips entries another writer has moved on (they end up in
+    `conflicts`). The re-read and the write are not one atomic compare-and-swap, so this
+    only catches writers that outlived their lease; mutual exclusion comes from holding a
+    `StateLease` for the whole cycle.
+    A legacy single-blob state under `legacy_key` is split into per-target keys.
+    """
+
+    def __init__(
+        self,
+        mapping: MutableMapping[str, Any],
+        *,
+        prefix: str = "target:",
+        legacy_key: str | None = "state",
+    ) -> None:
+        super().__init__()
+        self._mapping = mapping
+        self._prefix = prefix
+        self._legacy_key = legacy_key
+        self._entries: dict[str, SavedState] | None = None
+        self._versions: dict[str, int] = {}
+        self.conflicts: set[str] = set()
+
+    def __getitem__(self, target_id: str) -> SavedState:
+        return self._load()[target_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._load()))
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def _load(self) -> dict[str, SavedState]:
+        with self._lock:
+            if self._entries is not None:
+                return self._entries
+
+            entries: dict[str, SavedState] = {}
+            for key, record in self._mapping.items():
+                if not isinstance(key, str) or not key.startswith(self._prefix):
+                    continue
+                version, entry = _unpack_record(record)
+                if entry is not None:
+                    target_id = key[len(self._prefix) :]
+                    entries[target_id] = entry
+                    self._versions[target_id] = version
+
+            self._entries = entries
+            if not entries:
+                self._migrate_legacy_blob()
+            return self._entries
+
+    def _store(self, target_id: str, value: SavedState) -> None:
+        self._load()[target_id] = value
+
+    def _forget(self, target_id: str) -> None:
+        self._load().pop(target_id, None)
+
+    def _persist(self, changed: dict[str, SavedState], deleted: set[str]) -> None:
+        current_versions = self._current_versions(changed)
+        updates: dict[str, dict[str, Any]] = {}
+        for target_id, entry in changed.items():
+            key = self._prefix + target_id
+            expected = self._versions.get(target_id, 0)
+            current = current_versions.get(target_id, 0)
+            if current != expected:
+                self.conflicts.add(target_id)
+                print(f"[{target_id}] Стан змінено іншим запуском (версія {current}), запис пропущено.")
+                continue
+            updates[key] = {"version": expected + 1, "state": entry}
+            self._versions[target_id] = expected + 1
+
+        if updates:
+            self._mapping.update(updates)
+        for target_id in deleted:
+            discard_key(self._mapping, self._prefix + target_id)
+            self._versions.pop(target_id, None)
+
+    def _current_versions(self, changed: dict[str, SavedState]) -> dict[str, int]:
+        """Stored versions of the changed targets (missing keys are version 0).
+
+        Each `get` on a `modal.Dict` is a round-trip, so past `_BATCHED_VERSION_READ`
+        changes the versions come from one `items()` scan instead.
+        """
+        if len(changed) <= _BATCHED_VERSION_READ:
+            return {
+                target_id: _unpack_record(self._mapping.get(self._prefix + target_id))[0]
+                for target_id in changed
+            }
+        versions: dict[str, int] = {}
+        for key, record in self._mapping.items():
+            if isinstance(key, str) and key.startswith(self._prefix):
+                target_id = key[len(self._prefix) :]
+                if target_id in changed:
+                    versions[target_id] = _unpack_record(record)[0]
+        return versions
+
+    def _migrate_legacy_blob(self) -> None:
+        if self._legacy_key is None:
+            return
+        legacy_state = coerce_state(self._mapping.get(self._legacy_key))
+        if not legacy_state:
+            return
+
+        for target_id, entry in legacy_state.items():
+            self[target_id] = entry
+        self.flush()
+        discard_key(self._mapping, self._legacy_key)
+        print(f"Стан перенесено з ключа '{self._legacy_key}' у {len(legacy_state)} ключів цілей.")
+
+
+class StateLease:
+    """Exclusive, expiring lease stored in a shared mapping.
+
+    Each taking of the lease is a new generation under its own key `<key>:<n>`, created
+    with `put(..., skip_if_exists=True)` when the mapping offers it (`modal.Dict`) and only
+    after generation `n - 1` has expired or been released. Two invocations racing for an
+    expired lease both try to create the same key and exactly one succeeds; a plain
+    get/pop/put on a single key would let the loser delete the winner's fresh lease.
+    Generation keys are never reused; `<key>:newest` is only a hint to start the scan from.
+    """
+
+    def __init__(
+        self,
+        mapping: MutableMapping[str, Any],
+        *,
+        key: str = "lease",
+        ttl_seconds: float = 300.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._mapping = mapping
+        self._key = key
+        self._ttl_seconds = ttl_seconds
+        self._clock = clock
+        self.owner = uuid.uuid4().hex
+        self.generation: int | None = None
+
+    def acquire(self) -> bool:
+        newest = self._newest_generation()
+        if newest >= 0 and _lease_is_live(self._mapping.get(self._slot(newest)), self._clock()):
+            return False
+
+        claimed = newest + 1
+        record = {"owner": self.owner, "expires_at": self._clock() + self._ttl_seconds}
+        if not _put_if_absent(self._mapping, self._slot(claimed), record):
+            return False
+        self.generation = claimed
+        self._mapping[self._slot("newest")] = claimed
+        if claimed >= _KEPT_LEASE_GENERATIONS:
+            discard_key(self._mapping, self._slot(claimed - _KEPT_LEASE_GENERATIONS))
+        return True
+
+    def release(self) -> None:
+        if self.generation is None:
+            return
+        key = self._slot(self.generation)
+        current = self._mapping.get(key)
+        if isinstance(current, dict) and current.get("owner") == self.owner:
+            # Expire rather than delete: a free slot could be claimed below a newer generation.
+            self._mapping[key] = {**current, "expires_at": 0}
+        self.generation = None
+
+    def _newest_generation(self) -> int:
+        """Highest generation that has been taken, or -1 when the lease was never taken."""
+        hint = self._mapping.get(self._slot("newest"))
+        generation = hint if isinstance(hint, int) and not isinstance(hint, bool) else -1
+        while self._slot(generation + 1) in self._mapping:
+            generation += 1
+        return generation
+
+    def _slot(self, generation: int | str) -> str:
+        return f"{self._key}:{generation}"
+
+
+def compare_and_store(
+    state: MutableMapping[str, SavedState],
+    target_ids: Sequence[str],
+    observations: Sequence[bool],
+    *,
+    now: datetime,
+    offline_confirmation_cycles: int,
+    online_confirmation_cycles: int,
+) -> list[StateComparison | None]:
+    """Run `compare_states` for every target and store each updated state in `state`.
+
+    The result is aligned with `target_ids`; `None` means the stored state already matches
+    the observation. A `SnapshotStateStore` compares all targets in one batch over its columns.
+    """
+    if isinstance(state, SnapshotStateStore):
+        return state.compare_and_store(
+            target_ids,
+            observations,
+            now=now,
+            offline_confirmation_cycles=offline_confirmation_cycles,
+            online_confirmation_cycles=online_confirmation_cycles,
+        )
+
+    results: list[StateComparison | None] = []
+    for target_id, is_online in zip(target_ids, observations):
+        comparison = compare_states(
+            state.get(target_id),
+            is_online,
+            now=now,
+            offline_confirmation_cycles=offline_confirmation_cycles,
+            online_confirmation_cycles=online_confirmation_cycles,
+        )
+        if comparison.state_updated:
+            state[target_id] = comparison.new_state
+            results.append(comparison)
+        else:
+            results.append(None)
+    return results
+
+
+def open_state_store(state_path: str | Path, backend: StateBackend = "json") -> StateStore:
+    """Open the configured state store.
+
+    For SQLite and snapshots a `.json` path is treated as the legacy file: the new store
+    lives next to it (`.sqlite3` / `.lgs`) and is seeded from it on first use.
+    """
+    path = Path(state_path)
+    if backend == "json":
+        return JsonStateStore(path)
+
+    if backend == "snapshot":
+        if path.suffix == ".json":
+            return SnapshotStateStore(path.with_suffix(".lgs"), legacy_json_path=path)
+        return SnapshotStateStore(path, legacy_json_path=path.with_suffix(".json"))
+
+    if path.suffix == ".json":
+        return SqliteStateStore(path.with_suffix(".sqlite3"), legacy_json_path=path)
+    return SqliteStateStore(path, legacy_json_path=path.with_suffix(".json"))
+
+
+def _put_if_absent(mapping: MutableMapping[str, Any], key: str, value: Any) -> bool:
+    put = getattr(mapping, "put", None)
+    if put is not None:
+        return bool(put(key, value, skip_if_exists=True))
+    if key in mapping:
+        return False
+    mapping[key] = value
+    return True
+
+
+def _lease_is_live(record: object, now: float) -> bool:
+    expires_at = record.get("expires_at") if isinstance(record, dict) else None
+    return isinstance(expires_at, (int, float)) and expires_at > now
+
+
+def _unpack_record(record: object) -> tuple[int, SavedState | None]:
+    if not isinstance(record, dict):
+        return 0, None
+    version = record.get("version")
+    return (
+        version if isinstance(version, int) else 0,
+        _normalize_saved_state_entry(record.get("state")),
+    )
+
+
+def _state_to_row(target_id: str, entry: SavedState) -> tuple:
+    return (
+        target_id,
+        entry["status"],
+        entry["changed_at"],
+        entry.get("pending_status"),
+        entry.get("pending_count"),
+        entry.get("pending_since"),
+    )
+
+
+def _row_to_state(row: tuple) -> SavedState | None:
+    _, status, changed_at, pending_status, pending_count, pending_since = row
+    return _normalize_saved_state_entry(
+        {
+            "status": status,
+            "changed_at": changed_at,
+            "pending_status": pending_status,
+            "pending_count": pending_count,
+            "pending_since": pending_since,
+        }
+    )
@@ -0,0 +1,247 @@
+"""Columnar, array-backed state for large fleets and a batched `compare_states`.
+
+Each target is a row: status codes in `int8` columns, timestamps as `int64` microseconds
+since the epoch and the pending count as `int64`. No per-target dict, string or datetime is
+kept, and `compare_states_batch` runs the confirmation state machine over many rows in one
+pass, writing new states back in place.
+
+Timestamps are stored as instants, so they come back as UTC ISO-8601 strings, which is the
+form `compare_states` writes itself. Other spellings are normalized on load, and strings
+that do not parse are treated as missing.
+"""
+
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from .logic import SavedState, Status, _normalize_datetime
+
+UNKNOWN = -1
+OFFLINE = 0
+ONLINE = 1
+MISSING = -(2**63)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+_CODES: dict[object, int] = {"offline": OFFLINE, "online": ONLINE}
+_STATUSES: tuple[Status, Status] = ("offline", "online")
+
+
+def to_micros(value: object) -> int:
+    """ISO-8601 string or datetime -> microseconds since the epoch, `MISSING` when unusable."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return MISSING
+    if not isinstance(value, datetime):
+        return MISSING
+    return (_normalize_datetime(value) - _EPOCH) // _MICROSECOND
+
+
+def from_micros(value: int) -> str:
+    return (_EPOCH + timedelta(microseconds=value)).isoformat()
+
+
+class StateTable:
+    """Target states as parallel columns; row order is insertion order."""
+
+    __slots__ = ("_ids", "_index", "status", "changed_at", "pending_status", "pending_count", "pending_since")
+
+    def __init__(self) -> None:
+        self._ids: list[str] = []
+        self._index: dict[str, int] = {}
+        self.status = array("b")
+        self.changed_at = array("q")
+        self.pending_status = array("b")
+        self.pending_count = array("q")
+        self.pending_since = array("q")
+
+    @classmethod
+    def from_states(cls, states: Mapping[str, SavedState | dict]) -> StateTable:
+        table = cls()
+        for target_id, state in states.items():
+            table.set(target_id, state)
+        return table
+
+    @classmethod
+    def from_columns(
+        cls,
+        ids: list[str],
+        status: array,
+        changed_at: array,
+        pending_status: array,
+        pending_count: array,
+        pending_since: array,
+    ) -> StateTable:
+        """Wrap ready-made columns (e.g. read from a snapshot) without copying them."""
+        columns = (status, changed_at, pending_status, pending_count, pending_since)
+        if any(len(column) != len(ids) for column in columns):
+            raise ValueError("усі колонки мають бути завдовжки як список ID")
+        table = cls()
+        table._ids = ids
+        table._index = {target_id: index for index, target_id in enumerate(ids)}
+        if len(table._index) != len(ids):
+            raise ValueError("ID цілей у таблиці мають бути унікальними")
+        table.status, table.changed_at, table.pending_status, table.pending_count, table.pending_since = columns
+        return table
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, target_id: object) -> bool:
+        return target_id in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._ids)
+
+    @property
+    def ids(self) -> Sequence[str]:
+        return self._ids
+
+    def row(self, target_id: str) -> int:
+        """Row of `target_id`, appending an empty (never observed) row when it is new."""
+        index = self._index.get(target_id)
+        if index is None:
+            index = len(self._ids)
+            self._index[target_id] = index
+            self._ids.append(target_id)
+            self.status.append(UNKNOWN)
+            self.changed_at.append(MISSING)
+            self.pending_status.append(UNKNOWN)
+            self.pending_count.append(MISSING)
+            self.pending_since.append(MISSING)
+        return index
+
+    def rows(self, target_ids: Iterable[str]) -> list[int]:
+        return [self.row(target_id) for target_id in target_ids]
+
+    def set(self, target_id: str, state: SavedState | dict | None) -> None:
+        index = self.row(target_id)
+        state = state if isinstance(state, dict) else {}
+        pending_count = state.get("pending_count")
+        self.status[index] = _CODES.get(state.get("status"), UNKNOWN)
+        self.changed_at[index] = to_micros(state.get("changed_at"))
+        self.pending_status[index] = _CODES.get(state.get("pending_status"), UNKNOWN)
+        self.pending_count[index] = int(pending_count) if isinstance(pending_count, int) else MISSING
+        self.pending_since[index] = to_micros(state.get("pending_since"))
+
+    def clear(self, target_id: str) -> None:
+        """Forget the state of `target_id`; the row stays, reset to never observed."""
+        if target_id in self._index:
+            self.set(target_id, None)
+
+    def get(self, target_id: str) -> SavedState | None:
+        index = self._index.get(target_id)
+        if index is None or self.status[index] == UNKNOWN:
+            return None
+        state: SavedState = {"status": _STATUSES[self.status[index]]}
+        if self.changed_at[index] != MISSING:
+            state["changed_at"] = from_micros(self.changed_at[index])
+        if self.pending_status[index] != UNKNOWN:
+            state["pending_status"] = _STATUSES[self.pending_status[index]]
+        if self.pending_count[index] != MISSING:
+            state["pending_count"] = self.pending_count[index]
+        if self.pending_since[index] != MISSING:
+            state["pending_since"] = from_micros(self.pending_since[index])
+        return state
+
+    def to_states(self) -> dict[str, SavedState]:
+        states: dict[str, SavedState] = {}
+        for target_id in self._ids:
+            state = self.get(target_id)
+            if state is not None:
+                states[target_id] = state
+        return states
+
+    def nbytes(self) -> int:
+        """Bytes held by the columns (ids and the index not included)."""
+        columns = (self.status, self.changed_at, self.pending_status, self.pending_count, self.pending_since)
+        return sum(column.itemsize * len(column) for column in columns)
+
+
+@dataclass(slots=True)
+class BatchComparison:
+    """Per-row outcome of `compare_states_batch`, aligned with the `rows` it was given."""
+
+    rows: Sequence[int]
+    changed: bytearray
+    state_updated: bytearray
+    first_observation: bytearray
+    duration_seconds: array
+
+
+def compare_states_batch(
+    table: StateTable,
+    rows: Sequence[int],
+    is_online: Sequence[bool],
+    *,
+    now: datetime | None = None,
+    offline_confirmation_cycles: int = 1,
+    online_confirmation_cycles: int = 1,
+) -> BatchComparison:
+    """Apply `compare_states` to every row and store each updated state back in `table`.
+
+    Like the single-target version, a state is only rewritten when `state_updated` is set.
+    """
+    now_us = to_micros(now or datetime.now(timezone.utc))
+    required = (max(1, offline_confirmation_cycles), max(1, online_confirmation_cycles))
+    status = table.status
+    changed_at = table.changed_at
+    pending_status = table.pending_status
+    pending_count = table.pending_count
+    pending_since = table.pending_since
+
+    size = len(rows)
+    changed = bytearray(size)
+    state_updated = bytearray(size)
+    first_observation = bytearray(size)
+    duration_seconds = array("q", bytes(8 * size))
+
+    for position, (row, online) in enumerate(zip(rows, is_online)):
+        current = ONLINE if online else OFFLINE
+        previous = status[row]
+        if previous == UNKNOWN:
+            first_observation[position] = state_updated[position] = 1
+            status[row] = current
+            changed_at[row] = now_us
+            pending_status[row] = UNKNOWN
+            pending_count[row] = pending_since[row] = MISSING
+            continue
+
+        previous_changed_at = changed_at[row]
+        if previous_changed_at == MISSING:
+            previous_changed_at = now_us
+
+        if previous == current:
+            if pending_status[row] != UNKNOWN and pending_count[row] != MISSING and pending_since[row] != MISSING:
+                state_updated[position] = 1
+                changed_at[row] = previous_changed_at
+                pending_status[row] = UNKNOWN
+                pending_count[row] = pending_since[row] = MISSING
+            continue
+
+        state_updated[position] = 1
+        if pending_status[row] == current:
+            count = (pending_count[row] if pending_count[row] != MISSING else 0) + 1
+            since = pending_since[row] if pending_since[row] != MISSING else now_us
+        else:
+            count, since = 1, now_us
+
+        if count >= required[current]:
+            changed[position] = 1
+            duration_seconds[position] = max(0, (now_us - previous_changed_at) // 1_000_000)
+            status[row] = current
+            changed_at[row] = now_us
+            pending_status[row] = UNKNOWN
+            pending_count[row] = pending_since[row] = MISSING
+        else:
+            changed_at[row] = previous_changed_at
+            pending_status[row] = current
+            pending_count[row] = count
+            pending_since[row] = since
+
+    return BatchComparison(rows, changed, state_updated, first_observation, duration_seconds)
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import dataclasses
+from collections.abc import Callable, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from .config import RuntimeConfig, VantageConsensus
+from .logic import EndpointGroup, ProbeItem, ProbePolicy, ProbeResult, probe_targets
+from .resolver import get_resolver
+
+if TYPE_CHECKING:
+    from .metrics import CycleMetrics
+
+VantageCall = Callable[[dict[str, Any], dict[str, Any]], list[dict[str, Any]]]
+
+
+@dataclass(slots=True, frozen=True)
+class Vantage:
+    """A place probes run from: `call(config_payload, request)` returns plain-data results.
+
+    Arguments and results are plain data, so `call` may be a Modal function's `.remote`
+    pinned to a region, an RPC to another daemon, or `run_vantage_probe` in this process.
+    """
+
+    name: str
+    call: VantageCall
+
+
+def local_vantage(name: str = "local") -> Vantage:
+    """Probe from this process, like a cycle without vantages does."""
+    return Vantage(name, run_vantage_probe)
+
+
+@dataclass(slots=True, frozen=True)
+class Consensus:
+    """How vantage votes merge into one status.
+
+    - `majority`: online when more than half of the vantages see it online.
+    - `any`: online when any vantage reaches it (a dead path elsewhere does not count).
+    - `all`: online only when every vantage reaches it.
+    - `quorum`: online when at least `quorum` vantages reach it.
+
+    Vantages that fail or cannot resolve the host abstain; a vote that neither side can
+    win without them stays inconclusive, so the target's state is left alone.
+    """
+
+    rule: VantageConsensus = "majority"
+    quorum: int = 1
+
+    def required_online(self, voters: int) -> int:
+        if self.rule == "any":
+            return 1
+        if self.rule == "all":
+            return voters
+        if self.rule == "quorum":
+            return min(max(1, self.quorum), voters)
+        return voters // 2 + 1
+
+    def decision(self, online: int, offline: int, voters: int) -> bool | None:
+        """Online / offline once the remaining votes cannot change it, else `None`."""
+        required = self.required_online(voters)
+        if online >= required:
+            return True
+        if offline > voters - required:
+            return False
+        return None
+
+
+def probe_with_consensus(
+    vantages: Sequence[Vantage],
+    config: RuntimeConfig,
+    items: Sequence[ProbeItem],
+    policies: Sequence[ProbePolicy],
+    *,
+    metrics: CycleMetrics | None = None,
+) -> list[ProbeResult]:
+    """Probe `items` from every vantage in parallel and merge each item's votes.
+
+    Returns as soon as every item is decided; slower vantages are not waited for.
+    """
+    consensus = Consensus(config.vantage_consensus, config.vantage_quorum)
+    config_payload = config.worker_payload()
+    request = encode_request(items, policies)
+    votes: list[list[tuple[str, ProbeResult]]] = [[] for _ in items]
+    tallies = [[0, 0] for _ in items]
+    undecided = set(range(len(items)))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, len(vantages)), thread_name_prefix="lumenguard-vantage")
+    futures: dict[Future, Vantage] = {
+        executor.submit(vantage.call, config_payload, request): vantage for vantage in vantages
+    }
+    pending = set(futures)
+    try:
+        while pending and undecided:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                vantage = futures[future]
+                try:
+                    results = [decode_result(raw) for raw in future.result()]
+                except Exception as exc:  # a lost worker abstains, it does not fail the cycle
+                    print(f"Точка перевірки {vantage.name} не відповіла: {exc}")
+                    _count_votes(metrics, vantage.name, error=len(items))
+                    continue
+                _record(vantage.name, results, votes, tallies, undecided, consensus, len(vantages), metrics)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if pending:
+        print(f"Консенсус досягнуто без {len(pending)} з {len(vantages)} точок перевірки.")
+    return [
+        _merge(item_votes, tally, consensus, len(vantages))
+        for item_votes, tally in zip(votes, tallies)
+    ]
+
+
+def run_vantage_probe(config_payload: dict[str, Any], request: dict[str, Any]) -> list[dict[str, Any]]:
+    """Worker side: probe the requested items here and return plain-data results."""
+    config = RuntimeConfig.from_worker_payload(config_payload)
+    items, policies = decode_request(request)
+    results = probe_targets(
+        items,
+        timeout=config.check_timeout_seconds,
+        concurrency=config.check_concurrency,
+        policies=policies,
+        resolver=get_resolver(
+            ttl_seconds=config.dns_cache_ttl_seconds,
+            negative_ttl_seconds=config.dns_negative_ttl_seconds,
+            timeout=config.dns_timeout_seconds,
+        ),
+        engine=config.probe_engine,
+    )
+    return [encode_result(result) for result in results]
+
+
+def encode_request(items: Sequence[ProbeItem], policies: Sequence[ProbePolicy]) -> dict[str, Any]:
+    encoded_items: list[dict[str, Any]] = []
+    for item in items:
+        if isinstance(item, EndpointGroup):
+            encoded_items.append(
+                {"endpoints": [list(endpoint) for endpoint in item.endpoints], "rule": item.rule, "quorum": item.quorum}
+            )
+        else:
+            encoded_items.append({"host": item[0], "port": item[1]})
+    return {"items": encoded_items, "policies": [dataclasses.asdict(policy) for policy in policies]}
+
+
+def decode_request(request: dict[str, Any]) -> tuple[list[ProbeItem], list[ProbePolicy]]:
+    items: list[ProbeItem] = []
+    for item in request["items"]:
+        if "endpoints" in item:
+            endpoints = tuple((host, int(port)) for host, port in item["endpoints"])
+            items.append(EndpointGroup(endpoints, rule=item["rule"], quorum=item["quorum"]))
+        else:
+            items.append((item["host"], int(item["port"])))
+    return items, [ProbePolicy(**policy) for policy in request["policies"]]
+
+
+def encode_result(result: ProbeResult) -> dict[str, Any]:
+    return dataclasses.asdict(result)
+
+
+def decode_result(raw: dict[str, Any]) -> ProbeResult:
+    return ProbeResult(
+        **{**raw, "errors": tuple(raw.get("errors", ())), "rtt_seconds": tuple(raw.get("rtt_seconds", ()))}
+    )
+
+
+def _record(
+    name: str,
+    results: list[ProbeResult],
+    votes: list[list[tuple[str, ProbeResult]]],
+    tallies: list[list[int]],
+    undecided: set[int],
+    consensus: Consensus,
+    voters: int,
+    metrics: CycleMetrics | None,
+) -> None:
+    counts = {"online": 0, "offline": 0, "unknown": 0}
+    for index, result in enumerate(results[: len(votes)]):
+        votes[index].append((name, result))
+        if not result.is_conclusive:
+            counts["unknown"] += 1
+            continue
+        tallies[index][0 if result.is_online else 1] += 1
+        counts["online" if result.is_online else "offline"] += 1
+        if consensus.decision(tallies[index][0], tallies[index][1], voters) is not None:
+            undecided.discard(index)
+    _count_votes(metrics, name, **counts)
+
+
+def _count_votes(metrics: CycleMetrics | None, name: str, **counts: int) -> None:
+    if metrics is None:
+        return
+    for result, count in counts.items():
+        if count:
+            metrics.vantage_votes.inc(count, vantage=name, result=result)
+
+
+def _merge(
+    item_votes: list[tuple[str, ProbeResult]],
+    tally: list[int],
+    consensus: Consensus,
+    voters: int,
+) -> ProbeResult:
+    online, offline = tally
+    decision = consensus.decision(online, offline, voters)
+    results = [result for _, result in item_votes]
+    dns_error = None
+    if decision is None:
+        dns_error = f"консенсус не досягнуто: онлайн {online}, офлайн {offline}, без відповіді {voters - online - offline}"
+    return ProbeResult(
+        is_online=bool(decision),
+        successful_attempts=sum(result.successful_attempts for result in results),
+        total_attempts=sum(result.total_attempts for result in results),
+        errors=tuple(f"{name}: {error}" for name, result in item_votes for error in result.errors),
+        rtt_seconds=tuple(rtt for result in results for rtt in result.rtt_seconds),
+        slept_seconds=sum(result.slept_seconds for result in results),
+        resolve_seconds=max((result.resolve_seconds for result in results), default=0.0),
+        dns_error=dns_error,
+        inconclusive_reason=None if dns_error is None else "no_consensus",
+    )
@@ -3,7 +3,19 @@ from __future__ import annotations
 import sys
 from pathlib import Path
 
+import pytest
+
 ROOT_DIR = Path(__file__).resolve().parents[1]
 SRC_DIR = ROOT_DIR / "src"
 if str(SRC_DIR) not in sys.path:
     sys.path.insert(0, str(SRC_DIR))
+
+
+@pytest.fixture(autouse=True)
+def _fresh_send_schedulers():
+    """Rate-limit buckets are process-wide; do not let one test's sends throttle the next."""
+    from lumenguard import ratelimit
+
+    ratelimit._SCHEDULERS.clear()
+    yield
+    ratelimit._SCHEDULERS.clear()
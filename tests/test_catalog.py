@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from lumenguard import catalog
+from lumenguard.catalog import load_catalog, parse_catalog
+from lumenguard.config import load_runtime_config
+
+TARGETS = [
+    {"id": "home", "name": "Квартира", "host": "1.2.3.4", "port": 443, "chat_id": "-1001"},
+    {
+        "id": "dacha",
+        "name": "Дача",
+        "endpoints": [{"host": "dacha.example", "port": 80}, {"host": "5.6.7.8", "port": 8080}],
+        "endpoint_rule": "all",
+        "chat_id": "@dacha",
+    },
+]
+CSV = (
+    "id,name,host,port,chat_id,endpoints,endpoint_rule\n"
+    "home,Квартира,1.2.3.4,443,-1001,,\n"
+    "dacha,Дача,,,@dacha,dacha.example:80;5.6.7.8:8080,all\n"
+)
+
+
+def test_json_ndjson_and_csv_catalogs_parse_to_the_same_targets() -> None:
+    from_json = parse_catalog(json.dumps(TARGETS).encode(), ".json")
+    from_ndjson = parse_catalog("\n".join(json.dumps(item) for item in TARGETS).encode() + b"\n\n", ".ndjson")
+    from_csv = parse_catalog(CSV.encode(), ".csv")
+
+    assert from_json == from_ndjson == from_csv
+    assert from_csv[1].probe_endpoints == [("dacha.example", 80), ("5.6.7.8", 8080)]
+
+
+def test_ndjson_errors_name_the_line() -> None:
+    content = json.dumps(TARGETS[0]).encode() + b'\n{"id": "broken"}\n'
+
+    with pytest.raises(RuntimeError, match="рядок 2"):
+        parse_catalog(content, ".jsonl", source="targets.jsonl")
+
+
+def test_unchanged_catalog_is_served_from_cache_without_validation(tmp_path, monkeypatch) -> None:
+    path = tmp_path / "targets.json"
+    path.write_text(json.dumps(TARGETS), encoding="utf-8")
+    first = load_catalog(path)
+    validated: list[str] = []
+    parse = catalog.parse_catalog
+
+    def counting_parse(*args, **kwargs):
+        validated.append(kwargs["source"])
+        return parse(*args, **kwargs)
+
+    monkeypatch.setattr(catalog, "parse_catalog", counting_parse)
+
+    assert load_catalog(path) is first
+    path.write_text(json.dumps(TARGETS[:1]), encoding="utf-8")
+    assert [target.id for target in load_catalog(path)] == ["home"]
+    assert validated == [str(path)]
+
+
+def test_runtime_config_loads_targets_from_catalog_path(tmp_path, monkeypatch) -> None:
+    path = tmp_path / "targets.csv"
+    path.write_text(CSV, encoding="utf-8")
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "123456789:AAExampleToken")
+    monkeypatch.setenv("MONITOR_CONFIG", "not json")
+    monkeypatch.setenv("MONITOR_CONFIG_PATH", str(path))
+
+    config = load_runtime_config(dotenv_path=tmp_path / "missing.env")
+
+    assert [target.id for target in config.monitor_config] == ["home", "dacha"]
+    assert config.monitor_config_path == str(path)
+
+
+def test_catalog_path_makes_monitor_config_optional(tmp_path, monkeypatch) -> None:
+    path = tmp_path / "targets.csv"
+    path.write_text(CSV, encoding="utf-8")
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "123456789:AAExampleToken")
+    monkeypatch.delenv("MONITOR_CONFIG", raising=False)
+    monkeypatch.setenv("MONITOR_CONFIG_PATH", str(path))
+
+    assert len(load_runtime_config(dotenv_path=tmp_path / "missing.env").monitor_config) == 2
+
+    monkeypatch.delenv("MONITOR_CONFIG_PATH")
+    with pytest.raises(RuntimeError, match="MONITOR_CONFIG_PATH"):
+        load_runtime_config(dotenv_path=tmp_path / "missing.env")
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import os
+import threading
+from datetime import datetime, timezone
+
+from lumenguard.config import RuntimeConfig
+from lumenguard.daemon import ConfigWatcher, MonitorDaemon, StateWriter
+from lumenguard.logic import load_state
+from lumenguard.snapshot import SnapshotError
+from lumenguard.state_store import JsonStateStore
+
+
+def _config(tmp_path, **overrides) -> RuntimeConfig:
+    data = {
+        "telegram_bot_token": "123456789:AAExampleToken",
+        "monitor_config": [
+            {"id": "home", "name": "Квартира", "host": "1.2.3.4", "port": 443, "chat_id": "-100123"}
+        ],
+        "state_path": str(tmp_path / "state.json"),
+        "outbox_path": str(tmp_path / "outbox.json"),
+    }
+    data.update(overrides)
+    return RuntimeConfig.model_validate(data)
+
+
+def test_config_watcher_reloads_only_when_dotenv_changes(tmp_path) -> None:
+    dotenv_path = tmp_path / ".env"
+    dotenv_path.write_text("CHECK_ATTEMPTS=3\n", encoding="utf-8")
+    calls: list[bool] = []
+
+    def loader(*, dotenv_path, override):
+        calls.append(override)
+        return _config(tmp_path)
+
+    watcher = ConfigWatcher(dotenv_path, loader=loader)
+
+    assert watcher.current()[1] is True
+    assert watcher.current()[1] is False
+
+    dotenv_path.write_text("CHECK_ATTEMPTS=5\n# changed\n", encoding="utf-8")
+    stat = dotenv_path.stat()
+    os.utime(dotenv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert watcher.current()[1] is True
+    assert calls == [False, True]
+
+
+def test_state_writer_flushes_store_in_background(tmp_path) -> None:
+    store = JsonStateStore(tmp_path / "state.json")
+    writer = StateWriter(store.flush)
+
+    store["home"] = {"status": "offline", "changed_at": "2026-02-10T12:00:00+00:00"}
+    writer.request()
+    writer.wait()
+    writer.close()
+
+    assert load_state(tmp_path / "state.json") == {
+        "home": {"status": "offline", "changed_at": "2026-02-10T12:00:00+00:00"}
+    }
+
+
+def test_state_writer_survives_a_failed_flush() -> None:
+    calls: list[int] = []
+
+    def flush() -> None:
+        calls.append(len(calls))
+        if len(calls) == 1:
+            raise SnapshotError("ID цілі не може містити символ NUL")
+
+    writer = StateWriter(flush)
+    writer.request()
+    writer.wait()
+    writer.request()
+    writer.wait()
+    writer.close()
+
+    assert calls == [0, 1]
+
+
+def test_daemon_keeps_fixed_cadence_regardless_of_cycle_duration(tmp_path, monkeypatch) -> None:
+    clock = {"now": 1000.0}
+    sleeps: list[float] = []
+
+    def fake_run_cycle(config, state, **kwargs):
+        clock["now"] += 40.0
+        return state, False
+
+    def fake_sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+        clock["now"] += seconds
+
+    monkeypatch.setattr("lumenguard.daemon.run_cycle", fake_run_cycle)
+    watcher = ConfigWatcher(tmp_path / ".env", loader=lambda **kwargs: _config(tmp_path, check_jitter_ratio=0))
+    daemon = MonitorDaemon(watcher, clock=lambda: clock["now"], sleep=fake_sleep)
+
+    daemon.run(max_ticks=3)
+
+    assert sleeps == [260.0, 260.0]
+    assert clock["now"] == 1000.0 + 300.0 * 2 + 40.0
+
+
+def test_daemon_probes_targets_on_their_own_intervals(tmp_path, monkeypatch) -> None:
+    clock = {"now": 1000.0}
+    probed: list[tuple[float, list[str]]] = []
+
+    def fake_run_cycle(config, state, *, targets, **kwargs):
+        probed.append((clock["now"], [target.id for target in targets]))
+        return state, False
+
+    def fake_sleep(seconds: float) -> None:
+        clock["now"] += seconds
+
+    config = _config(
+        tmp_path,
+        check_jitter_ratio=0,
+        monitor_config=[
+            {"id": "hospital", "name": "Лікарня", "host": "1.2.3.4", "port": 443, "chat_id": "-1",
+             "check_interval_seconds": 30},
+            {"id": "dacha", "name": "Дача", "host": "5.6.7.8", "port": 443, "chat_id": "-2",
+             "check_interval_seconds": 600},
+        ],
+    )
+    monkeypatch.setattr("lumenguard.daemon.run_cycle", fake_run_cycle)
+    watcher = ConfigWatcher(tmp_path / ".env", loader=lambda **kwargs: config)
+    daemon = MonitorDaemon(watcher, clock=lambda: clock["now"], sleep=fake_sleep)
+
+    daemon.run(max_ticks=22)
+
+    assert probed[0] == (1000.0, ["hospital", "dacha"])
+    assert [moment for moment, ids in probed if "dacha" in ids] == [1000.0, 1600.0]
+    assert sum("hospital" in ids for _, ids in probed) == 22
+
+
+def test_daemon_saves_queued_alerts_before_delivery_and_state_flush(tmp_path, monkeypatch) -> None:
+    outbox_path = tmp_path / "outbox.json"
+    seen_on_disk: list[bool] = []
+    delivered = threading.Event()
+
+    def fake_run_cycle(config, state, *, outbox, now=None, **kwargs):
+        state["home"] = {"status": "offline", "changed_at": "2026-02-10T12:00:00+00:00"}
+        outbox.enqueue("home", "-100123", "🔴 Світло зникло", now=datetime(2026, 2, 10, 12, tzinfo=timezone.utc))
+        return state, True
+
+    def slow_deliver(config, outbox, metrics=None):
+        # A crash anywhere in here must not lose the alert: it is already on disk.
+        seen_on_disk.append(outbox_path.exists() and "home:" in outbox_path.read_text(encoding="utf-8"))
+        delivered.set()
+
+    def recording_flush(self) -> None:
+        seen_on_disk.append(outbox_path.exists())
+
+    monkeypatch.setattr("lumenguard.daemon.run_cycle", fake_run_cycle)
+    monkeypatch.setattr("lumenguard.daemon.deliver_outbox", slow_deliver)
+    monkeypatch.setattr(MonitorDaemon, "_flush_state", recording_flush)
+    watcher = ConfigWatcher(tmp_path / ".env", loader=lambda **kwargs: _config(tmp_path))
+    daemon = MonitorDaemon(watcher)
+
+    daemon.run_tick()
+    daemon._writer.wait()
+    assert delivered.wait(5)
+    daemon.close()
+
+    assert seen_on_disk == [True, True]
+
+
+def test_daemon_schedules_confirmation_probes_instead_of_sleeping_in_the_cycle(tmp_path, monkeypatch) -> None:
+    clock = {"now": 1000.0}
+    probed: list[float] = []
+
+    def fake_run_cycle(config, state, *, targets, on_pending, **kwargs):
+        probed.append(clock["now"])
+        if len(probed) == 1:
+            on_pending(list(targets))
+        return state, False
+
+    def fake_sleep(seconds: float) -> None:
+        clock["now"] += seconds
+
+    monkeypatch.setattr("lumenguard.daemon.run_cycle", fake_run_cycle)
+    config = _config(tmp_path, check_jitter_ratio=0, confirmation_probe_delay_seconds=15)
+    watcher = ConfigWatcher(tmp_path / ".env", loader=lambda **kwargs: config)
+    daemon = MonitorDaemon(watcher, clock=lambda: clock["now"], sleep=fake_sleep)
+
+    daemon.run(max_ticks=3)
+
+    assert probed == [1000.0, 1015.0, 1300.0]
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+from lumenguard.config import RuntimeConfig
+from lumenguard.history import (
+    FileTransitionHistory,
+    MappingTransitionHistory,
+    TargetHistory,
+    encode_record,
+    main,
+    move_mapping_history,
+)
+from lumenguard.logic import ProbeResult
+from lumenguard.outbox import Outbox
+from lumenguard.runner import run_cycle
+
+
+def _brute_force(transitions: list[tuple[int, bool]], start: int, end: int) -> tuple[int, int, int, int]:
+    """Second-by-second reference: known, offline, outage count, longest outage."""
+    known = offline = outages = longest = current = 0
+    previous_offline = False
+    for second in range(start, end):
+        statuses = [online for moment, online in transitions if moment <= second]
+        if not statuses:
+            previous_offline = False
+            continue
+        known += 1
+        is_offline = not statuses[-1]
+        if is_offline:
+            offline += 1
+            current = current + 1 if previous_offline else 1
+            if not previous_offline:
+                outages += 1
+            longest = max(longest, current)
+        previous_offline = is_offline
+    return known, offline, outages, longest
+
+
+def test_window_stats_match_brute_force() -> None:
+    rng = random.Random(7)
+    transitions: list[tuple[int, bool]] = []
+    moment, online = 100, True
+    for _ in range(40):
+        transitions.append((moment, online))
+        moment += rng.randint(1, 30)
+        online = not online
+    history = TargetHistory(encode_record(ts, status) for ts, status in transitions)
+
+    for _ in range(200):
+        start = rng.randint(0, moment + 20)
+        end = start + rng.randint(1, 400)
+        stats = history.window(start, end)
+        expected = _brute_force(transitions, start, end)
+        assert (
+            stats.known_seconds,
+            stats.offline_seconds,
+            stats.outage_count,
+            stats.longest_outage_seconds,
+        ) == expected
+
+
+def test_file_history_appends_and_reloads(tmp_path) -> None:
+    start = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    history = FileTransitionHistory(tmp_path)
+    history.observe("home/kyiv", {"status": "online", "changed_at": start.isoformat()})
+    history.observe("home/kyiv", {"status": "online", "changed_at": start.isoformat()})
+    history.observe(
+        "home/kyiv", {"status": "offline", "changed_at": (start + timedelta(hours=10)).isoformat()}
+    )
+    assert history.flush() == 2
+    history.observe(
+        "home/kyiv", {"status": "online", "changed_at": (start + timedelta(hours=14)).isoformat()}
+    )
+    assert history.flush() == 1
+
+    reloaded = FileTransitionHistory(tmp_path)
+    stats = reloaded.stats("home/kyiv", start, start + timedelta(days=1))
+
+    assert reloaded.target_ids() == ["home/kyiv"]
+    assert len(reloaded.get("home/kyiv")) == 3
+    assert stats.offline_seconds == 4 * 3600
+    assert stats.outage_count == 1
+    assert stats.uptime_ratio == 20 / 24
+
+
+def test_mapping_history_round_trips_through_shared_mapping() -> None:
+    shared: dict = {}
+    start = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    history = MappingTransitionHistory(shared)
+    history.observe("home", {"status": "offline", "changed_at": start.isoformat()})
+    history.flush()
+
+    reloaded = MappingTransitionHistory(shared)
+
+    assert list(shared) == ["history:home"]
+    assert reloaded.get("home").last_status == "offline"
+
+    state = {"target:home": {"version": 1, "state": {}}, **shared}
+    separate: dict = {}
+
+    assert move_mapping_history(state, separate) == 1
+    assert list(state) == ["target:home"]
+    assert MappingTransitionHistory(separate).get("home").last_status == "offline"
+
+
+def test_run_cycle_records_confirmed_transitions(monkeypatch, tmp_path) -> None:
+    config = RuntimeConfig.model_validate(
+        {
+            "telegram_bot_token": "123456789:AAExampleToken",
+            "monitor_config": [
+                {"id": "home", "name": "Квартира", "host": "1.2.3.4", "port": 443, "chat_id": "-1001"}
+            ],
+            "offline_confirmation_cycles": 1,
+        }
+    )
+    monkeypatch.setattr(
+        "lumenguard.runner.probe_targets",
+        lambda endpoints, **kwargs: [ProbeResult(False, 0, 1, ("timed out",))],
+    )
+    now = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+    state = {"home": {"status": "online", "changed_at": (now - timedelta(hours=2)).isoformat()}}
+    history = FileTransitionHistory(tmp_path)
+    history.observe("home", state["home"])
+
+    run_cycle(config, state, now=now, outbox=Outbox(), history=history)
+    history.flush()
+
+    stats = FileTransitionHistory(tmp_path).stats("home", now - timedelta(hours=2), now + timedelta(hours=1))
+    assert stats.offline_seconds == 3600
+    assert stats.longest_outage_seconds == 3600
+
+
+def test_cli_prints_json_report(tmp_path, capsys) -> None:
+    start = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    history = FileTransitionHistory(tmp_path)
+    history.observe("home", {"status": "offline", "changed_at": start.isoformat()})
+    history.flush()
+
+    exit_code = main(
+        ["--path", str(tmp_path), "--since", start.isoformat(), "--until", "2026-03-01T06:00:00+00:00", "--json"]
+    )
+
+    (row,) = json.loads(capsys.readouterr().out)
+    assert exit_code == 0
+    assert row["target_id"] == "home"
+    assert row["uptime_ratio"] == 0.0
+    assert row["longest_outage_seconds"] == 6 * 3600
@@ -1,9 +1,25 @@
 from __future__ import annotations
 
+import errno
 import socket
+import time
+from collections.abc import Iterator
 from datetime import datetime, timedelta, timezone
 
-from lumenguard.logic import check_ip, compare_states, format_ua_message, load_state, save_state
+from lumenguard import logic
+from lumenguard.resolver import HostResolver
+from lumenguard.logic import (
+    EndpointGroup,
+    ProbePolicy,
+    ProbeResult,
+    check_ip,
+    compare_states,
+    format_ua_message,
+    load_state,
+    probe_target,
+    probe_targets,
+    save_state,
+)
 
 
 class _DummySocket:
@@ -34,6 +50,252 @@ def test_check_ip_returns_false_when_connection_fails(monkeypatch) -> None:
     assert check_ip("8.8.8.8", 53, timeout=1.0) is False
 
 
+def _closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_probe_targets_keeps_input_order_and_reports_status() -> None:
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        open_port = listener.getsockname()[1]
+        closed_port = _closed_port()
+
+        results = probe_targets(
+            [("127.0.0.1", open_port), ("127.0.0.1", closed_port)],
+            timeout=1.0,
+            attempts=2,
+        )
+
+    assert [result.is_online for result in results] == [True, False]
+    assert results[0].successful_attempts == 2
+    assert results[1].successful_attempts == 0
+    assert len(results[1].errors) == 2
+
+
+def test_probe_targets_runs_targets_concurrently() -> None:
+    closed_port = _closed_port()
+    endpoints = [("127.0.0.1", closed_port)] * 10
+
+    started = time.monotonic()
+    results = probe_targets(endpoints, timeout=1.0, attempts=2, delay_seconds=0.2, concurrency=4)
+    elapsed = time.monotonic() - started
+
+    assert len(results) == 10
+    assert all(result.total_attempts == 2 for result in results)
+    assert elapsed < 1.0
+
+
+def _blackholed_listener() -> tuple[socket.socket, socket.socket, int]:
+    """Listener whose only backlog slot is taken, so further connects hang until timeout."""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(0)
+    filler = socket.create_connection(listener.getsockname(), timeout=1.0)
+    return listener, filler, listener.getsockname()[1]
+
+
+def test_selector_engine_matches_asyncio_engine() -> None:
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        open_port = listener.getsockname()[1]
+        endpoints = [("127.0.0.1", open_port), ("127.0.0.1", _closed_port())] * 5
+        policies = [ProbePolicy(mode="first_success", attempts=3, delay_seconds=0.01)] * len(endpoints)
+
+        by_engine = {
+            engine: probe_targets(endpoints, timeout=1.0, policies=policies, engine=engine)
+            for engine in ("asyncio", "selector", "blocking")
+        }
+
+    for results in by_engine.values():
+        assert [result.is_online for result in results] == [True, False] * 5
+        assert [result.total_attempts for result in results] == [1, 3] * 5
+    selector_results = by_engine["selector"]
+    assert all(len(result.rtt_seconds) == 1 for result in selector_results[::2])
+    assert all("Errno 111" in error for result in selector_results[1::2] for error in result.errors)
+    assert selector_results[1].slept_seconds == 0.02
+
+
+def test_every_engine_falls_through_to_the_next_resolved_address() -> None:
+    async def lookup(host: str) -> tuple[str, ...]:
+        # 127.0.0.2 refuses: the listener is bound to 127.0.0.1 only.
+        return ("127.0.0.2", "127.0.0.1")
+
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        endpoints = [("dual.example", listener.getsockname()[1])]
+
+        by_engine = {
+            engine: probe_targets(endpoints, timeout=1.0, resolver=HostResolver(lookup=lookup), engine=engine)
+            for engine in ("asyncio", "selector", "blocking")
+        }
+
+    for result in (results[0] for results in by_engine.values()):
+        assert result.is_online
+        assert (result.successful_attempts, result.total_attempts) == (1, 1)
+
+
+class _NoFreeDescriptors:
+    """Stand-in for the `socket` module whose `socket()` always fails with EMFILE."""
+
+    def __getattr__(self, name: str):
+        return getattr(socket, name)
+
+    @staticmethod
+    def socket(*args, **kwargs):
+        raise OSError(errno.EMFILE, "Too many open files")
+
+
+def test_selector_engine_out_of_descriptors_is_inconclusive(monkeypatch) -> None:
+    monkeypatch.setattr(logic, "socket", _NoFreeDescriptors())
+
+    [result] = probe_targets([("127.0.0.1", 443)], timeout=1.0, attempts=3, engine="selector")
+
+    assert not result.is_conclusive
+    assert result.inconclusive_reason == "local_resources"
+    assert result.total_attempts == 0
+
+
+def test_selector_engine_times_out_with_bounded_open_sockets() -> None:
+    listener, filler, port = _blackholed_listener()
+    try:
+        started = time.monotonic()
+        results = logic.probe_targets_selector([("127.0.0.1", port)] * 6, timeout=0.3, concurrency=3)
+        elapsed = time.monotonic() - started
+    finally:
+        filler.close()
+        listener.close()
+
+    assert [result.errors for result in results] == [("timed out",)] * 6
+    assert 0.55 < elapsed < 1.5
+
+
+def test_endpoint_group_any_finishes_without_waiting_for_blackholed_endpoint() -> None:
+    blackholed, filler, hung_port = _blackholed_listener()
+    try:
+        with socket.socket() as listener:
+            listener.bind(("127.0.0.1", 0))
+            listener.listen()
+            group = EndpointGroup((("127.0.0.1", hung_port), ("127.0.0.1", listener.getsockname()[1])))
+            for engine in ("asyncio", "selector"):
+                started = time.monotonic()
+                (result,) = probe_targets([group], timeout=2.0, attempts=1, engine=engine)
+                elapsed = time.monotonic() - started
+
+                assert result.is_online and result.is_conclusive
+                assert elapsed < 1.0
+    finally:
+        filler.close()
+        blackholed.close()
+
+
+def test_endpoint_group_all_and_quorum_rules() -> None:
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        endpoints = (
+            ("127.0.0.1", listener.getsockname()[1]),
+            ("127.0.0.1", listener.getsockname()[1]),
+            ("127.0.0.1", _closed_port()),
+        )
+        groups = [
+            EndpointGroup(endpoints, rule="all"),
+            EndpointGroup(endpoints, rule="quorum", quorum=2),
+            EndpointGroup(endpoints, rule="quorum", quorum=3),
+        ]
+        by_engine = {
+            engine: probe_targets(groups, timeout=1.0, attempts=1, engine=engine)
+            for engine in ("asyncio", "selector", "blocking")
+        }
+
+    for results in by_engine.values():
+        assert [result.is_online for result in results] == [False, True, False]
+    assert any("Errno 111" in error for error in by_engine["blocking"][0].errors)
+
+
+def test_endpoint_group_is_inconclusive_until_rule_is_decided() -> None:
+    group = EndpointGroup((("a.test", 1), ("b.test", 1)), rule="all")
+    online = ProbeResult(True, 1, 1, ())
+    unresolved = ProbeResult(False, 0, 0, ("DNS: boom",), dns_error="boom")
+
+    undecided = group.combine([online, unresolved])
+    decided = group.combine([ProbeResult(False, 0, 1, ("timed out",)), None])
+
+    assert undecided.is_conclusive is False
+    assert undecided.errors == ("b.test:1: DNS: boom",)
+    assert decided.is_conclusive and decided.is_online is False
+
+
+def _scripted_checks(monkeypatch, outcomes: list[bool]) -> list[float]:
+    results: Iterator[bool] = iter(outcomes)
+    sleeps: list[float] = []
+
+    monkeypatch.setattr(
+        logic,
+        "check_ip_once",
+        lambda *args, **kwargs: (True, None) if next(results) else (False, "refused"),
+    )
+    monkeypatch.setattr(logic.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def test_probe_target_first_success_stops_after_successful_connect(monkeypatch) -> None:
+    sleeps = _scripted_checks(monkeypatch, [True, True, True])
+
+    result = probe_target(
+        "1.2.3.4",
+        443,
+        policy=ProbePolicy(mode="first_success", attempts=3, delay_seconds=2.0),
+    )
+
+    assert result.is_online is True
+    assert result.total_attempts == 1
+    assert sleeps == []
+
+
+def test_probe_target_all_mode_keeps_legacy_behaviour(monkeypatch) -> None:
+    sleeps = _scripted_checks(monkeypatch, [True, False, True])
+
+    result = probe_target("1.2.3.4", 443, attempts=3, delay_seconds=2.0)
+
+    assert result.is_online is True
+    assert result.successful_attempts == 2
+    assert result.total_attempts == 3
+    assert sleeps == [2.0, 2.0]
+
+
+def test_probe_target_quorum_stops_once_result_is_certain(monkeypatch) -> None:
+    _scripted_checks(monkeypatch, [False, True, False, True, True])
+
+    result = probe_target(
+        "1.2.3.4",
+        443,
+        policy=ProbePolicy(mode="quorum", attempts=5, quorum=2),
+    )
+
+    assert result.is_online is False
+    assert result.total_attempts == 3
+    assert result.errors == ("refused", "refused")
+
+
+def test_probe_target_backoff_grows_delay_between_retries(monkeypatch) -> None:
+    sleeps = _scripted_checks(monkeypatch, [False, False, False, True])
+
+    result = probe_target(
+        "1.2.3.4",
+        443,
+        policy=ProbePolicy(mode="backoff", attempts=4, delay_seconds=1.0, backoff_factor=2.0),
+    )
+
+    assert result.is_online is True
+    assert result.total_attempts == 4
+    assert sleeps == [1.0, 2.0, 4.0]
+
+
 def test_compare_states_marks_first_observation() -> None:
     now = datetime(2026, 2, 10, 12, 0, tzinfo=timezone.utc)
 
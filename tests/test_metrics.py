@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import urllib.request
+from datetime import datetime, timedelta, timezone
+
+from lumenguard.config import RuntimeConfig
+from lumenguard.logic import EndpointGroup, ProbeResult
+from lumenguard.metrics import CycleMetrics, MetricsRegistry, classify_probe_error
+from lumenguard.notifier import SendResult
+from lumenguard.runner import run_cycle
+
+
+class _FakeNotifier:
+    def send_many(self, messages):
+        return [SendResult(chat_id=chat_id, ok=True, latency_seconds=0.2) for chat_id, _ in messages]
+
+
+def _config() -> RuntimeConfig:
+    return RuntimeConfig.model_validate(
+        {
+            "telegram_bot_token": "123456789:AAExampleToken",
+            "monitor_config": [
+                {"id": "home", "name": "Квартира", "host": "1.2.3.4", "port": 443, "chat_id": "-1001"},
+                {"id": "dacha", "name": "Дача", "host": "5.6.7.8", "port": 443, "chat_id": "-1002"},
+            ],
+            "offline_confirmation_cycles": 1,
+        }
+    )
+
+
+def test_classify_probe_error_covers_common_socket_errors() -> None:
+    assert classify_probe_error("timed out") == "timeout"
+    assert classify_probe_error("[Errno 111] Connect call failed ('127.0.0.1', 1)") == "refused"
+    assert classify_probe_error("[Errno 113] No route to host") == "unreachable"
+    assert classify_probe_error("[Errno -2] Name or service not known") == "dns"
+    assert classify_probe_error("something odd") == "other"
+
+
+def test_histogram_renders_cumulative_prometheus_buckets() -> None:
+    registry = MetricsRegistry()
+    histogram = registry.histogram("demo_seconds", "Demo.", buckets=(0.1, 1.0))
+    counter = registry.counter("demo_total", "Demo count.")
+    histogram.observe(0.05, route="a")
+    histogram.observe(0.5, route="a")
+    histogram.observe(5.0, route="a")
+    counter.inc(kind='quote"d')
+
+    text = registry.render_prometheus()
+
+    assert "# TYPE demo_seconds histogram" in text
+    assert 'demo_seconds_bucket{route="a",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{route="a",le="1"} 2' in text
+    assert 'demo_seconds_bucket{route="a",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{route="a"} 3' in text
+    assert 'demo_total{kind="quote\\"d"} 1' in text
+
+
+def test_summary_merges_into_another_registry() -> None:
+    shard = CycleMetrics()
+    shard.notify_latency.observe(0.2, outcome="ok")
+    shard.probe_errors.inc(error_class="timeout")
+    merged = CycleMetrics()
+    merged.notify_latency.observe(0.3, outcome="ok")
+
+    merged.merge(shard.summary())
+
+    summary = merged.summary()
+    (latency,) = summary["histograms"]["lumenguard_notify_latency_seconds"]
+    assert latency["count"] == 2
+    assert latency["p95"] == 0.3
+    assert merged.probe_errors.value(error_class="timeout") == 1
+
+
+def test_run_cycle_records_probe_cycle_and_notify_metrics(monkeypatch) -> None:
+    config = _config()
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    probes = [
+        ProbeResult(True, 1, 1, (), rtt_seconds=(0.02,)),
+        ProbeResult(False, 0, 3, ("timed out", "timed out", "[Errno 111] refused"), slept_seconds=4.0),
+    ]
+    monkeypatch.setattr("lumenguard.runner.probe_targets", lambda endpoints, **kwargs: probes)
+    state = {
+        target.id: {"status": "online", "changed_at": (now - timedelta(hours=1)).isoformat()}
+        for target in config.monitor_config
+    }
+    metrics = CycleMetrics()
+
+    run_cycle(config, state, now=now, notifier=_FakeNotifier(), metrics=metrics)
+
+    assert metrics.probes.value(status="online") == 1
+    assert metrics.probes.value(status="offline") == 1
+    assert metrics.probe_errors.value(error_class="timeout") == 2
+    assert metrics.probe_errors.value(error_class="refused") == 1
+    assert metrics.probe_sleep.value() == 4.0
+    assert metrics.probe_rtt.count() == 1
+    assert metrics.transitions.value(status="offline") == 1
+    assert metrics.notify_latency.count(outcome="ok") == 1
+    assert metrics.cycle_duration.count() == 1
+
+
+def test_metrics_are_exported_as_textfile_and_http(tmp_path) -> None:
+    metrics = CycleMetrics()
+    metrics.observe_probe(ProbeResult(True, 1, 1, (), rtt_seconds=(0.01,)))
+    textfile = tmp_path / "textfile" / "lumenguard.prom"
+
+    metrics.write_textfile(textfile)
+    server = metrics.serve(0, host="127.0.0.1")
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert 'lumenguard_probes_total{status="online"} 1' in textfile.read_text(encoding="utf-8")
+    assert body == textfile.read_text(encoding="utf-8")
+
+
+def test_inconclusive_probes_are_classified_by_reason() -> None:
+    group = EndpointGroup((("1.2.3.4", 443), ("home.example.net", 443)), rule="all")
+    online = ProbeResult(True, 1, 1, ())
+    unresolved = ProbeResult(False, 0, 0, ("DNS: timed out",), dns_error="timed out", inconclusive_reason="dns")
+    split_vote = ProbeResult(False, 2, 2, (), dns_error="консенсус не досягнуто", inconclusive_reason="no_consensus")
+    metrics = CycleMetrics()
+
+    for probe in (group.combine([online, None]), group.combine([online, unresolved]), split_vote):
+        metrics.observe_probe(probe)
+
+    assert metrics.probes.value(status="unknown") == 3
+    assert [metrics.probe_errors.value(error_class=name) for name in ("undecided", "dns", "no_consensus")] == [1, 1, 1]
+    assert metrics.probe_errors.value(error_class="timeout") == 0
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import json
+
+import httpx
+
+from lumenguard.notifier import TelegramNotifier
+
+
+def _notifier(handler) -> TelegramNotifier:
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    return TelegramNotifier("123456789:AAExampleToken", client=client, max_connections=4)
+
+
+def test_send_posts_html_message_and_reports_latency() -> None:
+    requests: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json={"ok": True, "result": {"message_id": 1}})
+
+    with _notifier(handler) as notifier:
+        result = notifier.send("-100123456789", "🟢 <b>Світло з'явилося</b>")
+
+    assert result.ok is True
+    assert result.status_code == 200
+    assert result.latency_seconds >= 0
+    assert str(requests[0].url) == "https://api.telegram.org/bot123456789:AAExampleToken/sendMessage"
+    assert json.loads(requests[0].content) == {
+        "chat_id": "-100123456789",
+        "text": "🟢 <b>Світло з'явилося</b>",
+        "parse_mode": "HTML",
+    }
+
+
+def test_send_many_keeps_order_and_reports_failures() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        chat_id = json.loads(request.content)["chat_id"]
+        if chat_id == "bad":
+            return httpx.Response(400, json={"ok": False, "description": "chat not found"})
+        return httpx.Response(200, json={"ok": True})
+
+    with _notifier(handler) as notifier:
+        results = notifier.send_many([("a", "1"), ("bad", "2"), ("c", "3")])
+
+    assert [result.chat_id for result in results] == ["a", "bad", "c"]
+    assert [result.ok for result in results] == [True, False, True]
+    assert results[1].status_code == 400
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+from lumenguard.notifier import SendResult
+from lumenguard.outbox import Outbox, digest_text, drain_outbox, group_digests, load_outbox, save_outbox
+
+
+class _ScriptedNotifier:
+    def __init__(self, results: list[SendResult]) -> None:
+        self.results = results
+        self.sent: list[tuple[str, str]] = []
+
+    def send_many(self, messages):
+        self.sent.extend(messages)
+        return self.results[: len(messages)]
+
+
+def test_drain_outbox_honors_retry_after() -> None:
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    outbox = Outbox()
+    outbox.enqueue("home", "-100123", "🔴 <b>Світло зникло</b>", now=now)
+    notifier = _ScriptedNotifier(
+        [SendResult(chat_id="-100123", ok=False, latency_seconds=0.1, status_code=429, retry_after=42)]
+    )
+
+    report = drain_outbox(outbox, notifier, now=now)
+
+    assert report.retried == 1
+    assert outbox.due(now + timedelta(seconds=41)) == []
+    assert len(outbox.due(now + timedelta(seconds=42))) == 1
+
+
+def test_drain_outbox_drops_permanent_failures_and_removes_sent() -> None:
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    outbox = Outbox()
+    outbox.enqueue("home", "good", "1", now=now)
+    outbox.enqueue("garage", "missing", "2", now=now + timedelta(seconds=1))
+    notifier = _ScriptedNotifier(
+        [
+            SendResult(chat_id="good", ok=True, latency_seconds=0.1, status_code=200),
+            SendResult(chat_id="missing", ok=False, latency_seconds=0.1, status_code=400),
+        ]
+    )
+
+    report = drain_outbox(outbox, notifier, now=now + timedelta(seconds=1))
+
+    assert (report.sent, report.dropped, report.remaining) == (1, 1, 0)
+    assert notifier.sent == [("good", "1"), ("missing", "2")]
+
+
+def test_outbox_writes_per_key_into_shared_mapping() -> None:
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    shared: dict = {}
+
+    Outbox(shared).enqueue("home", "-100123", "text", now=now)
+    Outbox(shared).enqueue("garage", "-100456", "text", now=now)
+
+    assert sorted(item["target_id"] for item in shared.values()) == ["garage", "home"]
+
+
+def test_retract_drops_every_alert_the_cycle_queued_for_the_target() -> None:
+    run_time = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    outbox = Outbox()
+    outbox.enqueue("home", "-100123", "earlier cycle", now=run_time - timedelta(minutes=5))
+    outbox.enqueue("home", "-100123", "fast-track round", now=run_time + timedelta(seconds=0.2))
+    outbox.enqueue("garage", "-100456", "other target", now=run_time)
+
+    assert outbox.retract("home", since=run_time) == 1
+
+    assert sorted(item["text"] for item in outbox.pending()) == ["earlier cycle", "other target"]
+
+
+def test_save_and_load_outbox_roundtrip(tmp_path) -> None:
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    outbox = Outbox()
+    outbox.enqueue("home", "-100123", "🟢 <b>Світло з'явилося</b>", now=now)
+
+    save_outbox(tmp_path / "outbox.json", outbox)
+    loaded = load_outbox(tmp_path / "outbox.json")
+
+    assert loaded.pending() == outbox.pending()
+
+
+def test_drain_outbox_sends_one_digest_per_chat_split_at_message_limit() -> None:
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    outbox = Outbox()
+    for index in range(5):
+        outbox.enqueue(f"house-{index}", "district", f"🔴 <b>Світло зникло</b> #{index}", now=now)
+    outbox.enqueue("dacha", "family", "🟢 <b>Світло з'явилося</b>", now=now)
+    notifier = _ScriptedNotifier([SendResult(chat_id="any", ok=True, latency_seconds=0.1)] * 3)
+
+    report = drain_outbox(outbox, notifier, now=now, digest_threshold=3)
+
+    assert (report.sent, report.remaining) == (6, 0)
+    assert [chat_id for chat_id, _ in notifier.sent] == ["district", "family"]
+    assert notifier.sent[0][1].startswith("⚡ <b>Зміни світла: 5</b>")
+    assert notifier.sent[1][1] == "🟢 <b>Світло з'явилося</b>"
+
+    items = outbox_items(5, now)
+    batches = group_digests(items, threshold=3, max_length=100)
+    assert len(batches) > 1
+    assert [item for batch in batches for item in batch] == items
+    assert all(len(digest_text(batch)) <= 100 for batch in batches)
+
+
+def test_digest_window_holds_first_attempts_until_the_oldest_is_old_enough() -> None:
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    outbox = Outbox()
+    outbox.enqueue("house-1", "district", "1", now=now)
+    outbox.enqueue("house-2", "district", "2", now=now + timedelta(seconds=20))
+    notifier = _ScriptedNotifier([SendResult(chat_id="district", ok=True, latency_seconds=0.1)])
+
+    held = drain_outbox(outbox, notifier, now=now + timedelta(seconds=20), digest_threshold=2, digest_window_seconds=30)
+    assert (held.sent, held.remaining, notifier.sent) == (0, 2, [])
+
+    report = drain_outbox(outbox, notifier, now=now + timedelta(seconds=30), digest_threshold=2, digest_window_seconds=30)
+    assert (report.sent, report.remaining) == (2, 0)
+    assert notifier.sent == [("district", "⚡ <b>Зміни світла: 2</b>\n\n1\n\n2")]
+
+
+def outbox_items(count: int, now: datetime) -> list:
+    outbox = Outbox()
+    for index in range(count):
+        outbox.enqueue(f"house-{index}", "district", f"🔴 Світло зникло, будинок {index}", now=now)
+    return outbox.pending()
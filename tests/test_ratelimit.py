@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from lumenguard.notifier import SendResult
+from lumenguard.outbox import PRIORITY_OUTAGE, Outbox, drain_outbox
+from lumenguard.ratelimit import SendScheduler
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class _RecordingSender:
+    """Records `(time, chat_id, text)` per send; answers 429 for the listed texts once."""
+
+    def __init__(self, clock: _Clock, throttled: dict[str, float] | None = None) -> None:
+        self.clock = clock
+        self.throttled = dict(throttled or {})
+        self.sent: list[tuple[float, str, str]] = []
+
+    def send_many(self, messages):
+        results = []
+        for chat_id, text in messages:
+            self.sent.append((round(self.clock.now, 3), chat_id, text))
+            retry_after = self.throttled.pop(text, None)
+            if retry_after is not None:
+                results.append(SendResult(chat_id, False, 0.0, status_code=429, retry_after=retry_after))
+            else:
+                results.append(SendResult(chat_id, True, 0.0, status_code=200))
+        return results
+
+
+def test_scheduler_paces_per_chat_and_globally_with_priority_first() -> None:
+    clock = _Clock()
+    scheduler = SendScheduler(global_rate=2.0, chat_rate=1.0, clock=clock, sleep=clock.sleep)
+    sender = _RecordingSender(clock)
+    messages = [("a", "a1"), ("a", "a2"), ("b", "b1"), ("c", "c1"), ("a", "a3")]
+
+    results = scheduler.send(sender, messages, priorities=[1, 1, 1, 0, 1])
+
+    assert all(result is not None and result.ok for result in results)
+    assert sender.sent == [
+        (0.0, "c", "c1"),
+        (0.0, "a", "a1"),
+        (0.5, "b", "b1"),
+        (1.0, "a", "a2"),
+        (2.0, "a", "a3"),
+    ]
+
+
+def test_scheduler_honors_retry_after_and_gives_up_at_the_deadline() -> None:
+    clock = _Clock()
+    scheduler = SendScheduler(global_rate=30.0, chat_rate=1.0, clock=clock, sleep=clock.sleep)
+    sender = _RecordingSender(clock, throttled={"a1": 3.0, "b1": 60.0})
+
+    results = scheduler.send(sender, [("a", "a1"), ("b", "b1"), ("a", "a2")], max_wait_seconds=10.0)
+
+    assert [(sent_at, text) for sent_at, _, text in sender.sent] == [(0.0, "a1"), (0.0, "b1"), (3.0, "a1"), (4.0, "a2")]
+    assert results[0].ok and results[2].ok
+    assert results[1].status_code == 429
+
+
+def test_drain_outbox_defers_what_the_scheduler_cannot_send_in_time() -> None:
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    clock = _Clock()
+    scheduler = SendScheduler(global_rate=30.0, chat_rate=1.0, clock=clock, sleep=clock.sleep)
+    sender = _RecordingSender(clock)
+    outbox = Outbox()
+    for index in range(4):
+        outbox.enqueue(f"house-{index}", "district", f"🟢 {index}", now=now)
+    outbox.enqueue("garage", "district", "🔴 garage", now=now, priority=PRIORITY_OUTAGE)
+
+    report = drain_outbox(outbox, sender, now=now, scheduler=scheduler, max_queue=4, max_wait_seconds=1.0)
+
+    assert [text for _, _, text in sender.sent] == ["🔴 garage", "🟢 0"]
+    assert (report.sent, report.deferred, report.remaining) == (2, 3, 3)
+    assert all(item["attempts"] == 0 for item in outbox.pending())
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+import socket
+
+from lumenguard.logic import probe_targets
+from lumenguard.resolver import HostResolver
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _scripted_lookup(answers: dict[str, tuple[str, ...] | Exception]) -> tuple[list[str], object]:
+    calls: list[str] = []
+
+    async def lookup(host: str) -> tuple[str, ...]:
+        calls.append(host)
+        await asyncio.sleep(0.05)
+        answer = answers[host]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    return calls, lookup
+
+
+def test_resolve_many_looks_up_each_unique_host_once_and_concurrently() -> None:
+    calls, lookup = _scripted_lookup({f"host-{index}.test": ("10.0.0.1",) for index in range(10)})
+    resolver = HostResolver(lookup=lookup)
+    hosts = [f"host-{index % 10}.test" for index in range(50)] + ["192.0.2.7"]
+
+    resolutions = asyncio.run(resolver.resolve_many(hosts))
+    cached = asyncio.run(resolver.resolve_many(hosts))
+
+    assert sorted(calls) == sorted(f"host-{index}.test" for index in range(10))
+    assert resolutions["192.0.2.7"].address == "192.0.2.7"
+    assert max(resolution.seconds for resolution in resolutions.values()) < 0.5
+    assert all(resolution.from_cache for resolution in cached.values())
+
+
+def test_failures_are_negatively_cached_until_their_ttl_expires() -> None:
+    clock = _Clock()
+    calls, lookup = _scripted_lookup({"ddns.test": socket.gaierror(-2, "Name or service not known")})
+    resolver = HostResolver(negative_ttl_seconds=30, clock=clock, lookup=lookup)
+
+    first = asyncio.run(resolver.resolve("ddns.test"))
+    second = asyncio.run(resolver.resolve("ddns.test"))
+    clock.now += 31
+    asyncio.run(resolver.resolve("ddns.test"))
+
+    assert first.address is None and "Name or service" in (first.error or "")
+    assert second.from_cache and second.error == first.error
+    assert len(calls) == 2
+
+
+def test_last_good_answer_is_served_when_refresh_fails() -> None:
+    clock = _Clock()
+    answers: dict[str, tuple[str, ...] | Exception] = {"ddns.test": ("198.51.100.4",)}
+    _, lookup = _scripted_lookup(answers)
+    resolver = HostResolver(ttl_seconds=60, clock=clock, lookup=lookup)
+
+    asyncio.run(resolver.resolve("ddns.test"))
+    answers["ddns.test"] = socket.gaierror(-3, "Temporary failure in name resolution")
+    clock.now += 61
+    stale = asyncio.run(resolver.resolve("ddns.test"))
+
+    assert stale.stale is True
+    assert stale.address == "198.51.100.4"
+
+
+def test_probe_targets_reports_dns_failures_apart_from_tcp_results() -> None:
+    _, lookup = _scripted_lookup(
+        {
+            "home.test": ("127.0.0.1",),
+            "gone.test": socket.gaierror(-2, "Name or service not known"),
+        }
+    )
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        port = listener.getsockname()[1]
+
+        online, unresolved = probe_targets(
+            [("home.test", port), ("gone.test", port)],
+            timeout=1.0,
+            resolver=HostResolver(lookup=lookup),
+        )
+
+    assert online.is_online and online.is_conclusive
+    assert online.resolve_seconds > 0
+    assert unresolved.is_conclusive is False
+    assert unresolved.total_attempts == 0
+    assert unresolved.errors[0].startswith("DNS:")
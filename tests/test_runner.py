@@ -1,9 +1,21 @@
 from __future__ import annotations
 
+import os
+import subprocess
+import sys
 from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from pydantic import ValidationError
 
 from lumenguard.config import RuntimeConfig
-from lumenguard.runner import run_cycle
+from lumenguard.logic import EndpointGroup, ProbeResult, load_state, save_state
+from lumenguard.metrics import CycleMetrics
+from lumenguard.notifier import SendResult
+from lumenguard.outbox import Outbox, drain_outbox, load_outbox
+from lumenguard.runner import SentinelCache, run_cycle, run_once_file_state
 
 
 def _config() -> RuntimeConfig:
@@ -32,31 +44,60 @@ def _config() -> RuntimeConfig:
     )
 
 
+class _FakeNotifier:
+    def __init__(self, *, ok: bool = True) -> None:
+        self.ok = ok
+        self.sent: list[tuple[str, str]] = []
+
+    def send_many(self, messages):
+        self.sent.extend(messages)
+        return [
+            SendResult(chat_id=chat_id, ok=self.ok, latency_seconds=0.01)
+            for chat_id, _ in messages
+        ]
+
+
+def _fake_probes(*, is_online: bool, successful_attempts: int):
+    probe = ProbeResult(
+        is_online=is_online,
+        successful_attempts=successful_attempts,
+        total_attempts=3,
+        errors=(),
+    )
+    return lambda endpoints, **kwargs: [probe] * len(endpoints)
+
+
+def test_probe_policy_for_applies_per_target_overrides() -> None:
+    config = _config()
+    target = config.monitor_config[0].model_copy(
+        update={"probe_policy": "quorum", "check_attempts": 5, "check_quorum": 3}
+    )
+
+    default_policy = config.probe_policy_for(config.monitor_config[0])
+    target_policy = config.probe_policy_for(target)
+
+    assert default_policy.mode == "first_success"
+    assert default_policy.total_attempts == 3
+    assert target_policy.mode == "quorum"
+    assert target_policy.total_attempts == 5
+    assert target_policy.required_agreement == 3
+
+
 def test_run_cycle_first_observation_saves_state_without_notification(monkeypatch) -> None:
     config = _config()
     now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
 
-    sent = {"called": False}
+    notifier = _FakeNotifier()
 
     monkeypatch.setattr(
-        "lumenguard.runner.probe_target",
-        lambda *args, **kwargs: type(
-            "Probe",
-            (),
-            {"is_online": True, "successful_attempts": 3, "total_attempts": 3},
-        )(),
+        "lumenguard.runner.probe_targets",
+        _fake_probes(is_online=True, successful_attempts=3),
     )
 
-    def fake_send(*args, **kwargs):
-        sent["called"] = True
-        return True
-
-    monkeypatch.setattr("lumenguard.runner.send_telegram_message", fake_send)
-
-    state, has_state_update = run_cycle(config, {}, now=now)
+    state, has_state_update = run_cycle(config, {}, now=now, notifier=notifier)
 
     assert has_state_update is True
-    assert sent["called"] is False
+    assert notifier.sent == []
     assert state["home"]["status"] == "online"
     assert state["home"]["changed_at"] == now.isoformat()
 
@@ -75,54 +116,54 @@ def test_run_cycle_updates_state_when_status_changed_and_sent(monkeypatch) -> No
     }
 
     monkeypatch.setattr(
-        "lumenguard.runner.probe_target",
-        lambda *args, **kwargs: type(
-            "Probe",
-            (),
-            {"is_online": False, "successful_attempts": 0, "total_attempts": 3},
-        )(),
+        "lumenguard.runner.probe_targets",
+        _fake_probes(is_online=False, successful_attempts=0),
     )
-    monkeypatch.setattr("lumenguard.runner.send_telegram_message", lambda *args, **kwargs: True)
+    notifier = _FakeNotifier()
 
-    state, has_state_update = run_cycle(config, previous_state, now=now)
+    state, has_state_update = run_cycle(config, previous_state, now=now, notifier=notifier)
 
     assert has_state_update is True
+    assert [chat_id for chat_id, _ in notifier.sent] == ["-100123456789"]
     assert state["home"]["status"] == "offline"
     assert state["home"]["changed_at"] == now.isoformat()
 
 
-def test_run_cycle_does_not_update_state_when_telegram_fails(monkeypatch) -> None:
+def test_run_cycle_commits_state_and_keeps_message_queued_when_telegram_fails(
+    monkeypatch,
+) -> None:
     config = _config()
     now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
-    previous_pending_since = (now - timedelta(minutes=5)).isoformat()
     previous_state = {
         "home": {
             "status": "online",
             "changed_at": (now - timedelta(minutes=10)).isoformat(),
             "pending_status": "offline",
             "pending_count": 1,
-            "pending_since": previous_pending_since,
+            "pending_since": (now - timedelta(minutes=5)).isoformat(),
         }
     }
 
     monkeypatch.setattr(
-        "lumenguard.runner.probe_target",
-        lambda *args, **kwargs: type(
-            "Probe",
-            (),
-            {"is_online": False, "successful_attempts": 0, "total_attempts": 3},
-        )(),
+        "lumenguard.runner.probe_targets",
+        _fake_probes(is_online=False, successful_attempts=0),
     )
-    monkeypatch.setattr("lumenguard.runner.send_telegram_message", lambda *args, **kwargs: False)
+    notifier = _FakeNotifier(ok=False)
+    outbox = Outbox()
 
-    state, has_state_update = run_cycle(config, previous_state, now=now)
+    state, has_state_update = run_cycle(config, previous_state, now=now, outbox=outbox)
 
-    assert has_state_update is False
-    assert state["home"]["status"] == "online"
-    assert state["home"]["changed_at"] == (now - timedelta(minutes=10)).isoformat()
-    assert state["home"]["pending_status"] == "offline"
-    assert state["home"]["pending_count"] == 1
-    assert state["home"]["pending_since"] == previous_pending_since
+    assert has_state_update is True
+    assert notifier.sent == []
+    assert state["home"] == {"status": "offline", "changed_at": now.isoformat()}
+    assert [item["target_id"] for item in outbox.pending()] == ["home"]
+
+    report = drain_outbox(outbox, notifier, now=now)
+
+    assert report.retried == 1
+    assert outbox.pending()[0]["attempts"] == 1
+    assert outbox.due(now) == []
+    assert outbox.due(now + timedelta(minutes=1))[0]["target_id"] == "home"
 
 
 def test_run_cycle_no_change_keeps_state_and_skips_notification(monkeypatch) -> None:
@@ -135,26 +176,45 @@ def test_run_cycle_no_change_keeps_state_and_skips_notification(monkeypatch) ->
         }
     }
 
-    sent = {"count": 0}
+    notifier = _FakeNotifier()
     monkeypatch.setattr(
-        "lumenguard.runner.probe_target",
-        lambda *args, **kwargs: type(
-            "Probe",
-            (),
-            {"is_online": False, "successful_attempts": 0, "total_attempts": 3},
-        )(),
+        "lumenguard.runner.probe_targets",
+        _fake_probes(is_online=False, successful_attempts=0),
     )
 
-    def fake_send(*args, **kwargs):
-        sent["count"] += 1
-        return True
+    state, has_state_update = run_cycle(config, previous_state, now=now, notifier=notifier)
 
-    monkeypatch.setattr("lumenguard.runner.send_telegram_message", fake_send)
+    assert has_state_update is False
+    assert notifier.sent == []
+    assert state == previous_state
+
+
+def test_run_cycle_leaves_state_untouched_when_host_does_not_resolve(monkeypatch) -> None:
+    config = _config()
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    previous_state = {
+        "home": {
+            "status": "online",
+            "changed_at": (now - timedelta(minutes=30)).isoformat(),
+        }
+    }
+    unresolved = ProbeResult(
+        is_online=False,
+        successful_attempts=0,
+        total_attempts=0,
+        errors=("DNS: Name or service not known",),
+        dns_error="Name or service not known",
+    )
+    monkeypatch.setattr("lumenguard.runner.probe_targets", lambda endpoints, **kwargs: [unresolved])
 
-    state, has_state_update = run_cycle(config, previous_state, now=now)
+    state, has_state_update = run_cycle(
+        RuntimeConfig.model_validate({**config.model_dump(), "offline_confirmation_cycles": 1}),
+        dict(previous_state),
+        now=now,
+        notifier=_FakeNotifier(),
+    )
 
     assert has_state_update is False
-    assert sent["count"] == 0
     assert state == previous_state
 
 
@@ -168,26 +228,341 @@ def test_run_cycle_stores_pending_offline_without_notification_on_first_bad_cycl
         }
     }
 
-    sent = {"count": 0}
+    notifier = _FakeNotifier()
     monkeypatch.setattr(
-        "lumenguard.runner.probe_target",
-        lambda *args, **kwargs: type(
-            "Probe",
-            (),
-            {"is_online": False, "successful_attempts": 0, "total_attempts": 3},
-        )(),
+        "lumenguard.runner.probe_targets",
+        _fake_probes(is_online=False, successful_attempts=0),
     )
 
-    def fake_send(*args, **kwargs):
-        sent["count"] += 1
-        return True
-
-    monkeypatch.setattr("lumenguard.runner.send_telegram_message", fake_send)
-
-    state, has_state_update = run_cycle(config, previous_state, now=now)
+    state, has_state_update = run_cycle(config, previous_state, now=now, notifier=notifier)
 
     assert has_state_update is True
-    assert sent["count"] == 0
+    assert notifier.sent == []
     assert state["home"]["status"] == "online"
     assert state["home"]["pending_status"] == "offline"
     assert state["home"]["pending_count"] == 1
+
+
+def test_run_cycle_fast_tracks_pending_transition_within_one_cycle(monkeypatch) -> None:
+    config = _config().model_copy(update={"confirmation_probe_delay_seconds": 10.0})
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    previous_state = {
+        "home": {"status": "online", "changed_at": (now - timedelta(minutes=30)).isoformat()},
+        "dacha": {"status": "online", "changed_at": (now - timedelta(minutes=30)).isoformat()},
+    }
+    config = config.model_copy(
+        update={
+            "monitor_config": [
+                config.monitor_config[0],
+                config.monitor_config[0].model_copy(update={"id": "dacha", "host": "5.6.7.8"}),
+            ]
+        }
+    )
+    probed: list[list] = []
+    sleeps: list[float] = []
+    clock = {"now": 500.0}
+
+    def fake_probe_targets(endpoints, **kwargs):
+        probed.append(list(endpoints))
+        clock["now"] += 3.0  # probes take time too; the confirmation is stamped after them
+        return [ProbeResult(endpoint[0] == "5.6.7.8", 1, 1, ()) for endpoint in endpoints]
+
+    def fake_sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+        clock["now"] += seconds
+
+    monkeypatch.setattr("lumenguard.runner.probe_targets", fake_probe_targets)
+    monkeypatch.setattr("lumenguard.runner.time.sleep", fake_sleep)
+    monkeypatch.setattr("lumenguard.runner.time.monotonic", lambda: clock["now"])
+    notifier = _FakeNotifier()
+
+    state, _ = run_cycle(config, previous_state, now=now, notifier=notifier)
+
+    assert sleeps == [10.0]
+    assert probed == [[("1.2.3.4", 443), ("5.6.7.8", 443)], [("1.2.3.4", 443)]]
+    assert state["home"]["status"] == "offline"
+    assert state["home"]["changed_at"] == (now + timedelta(seconds=13)).isoformat()
+    assert "pending_status" not in state["dacha"]
+    assert len(notifier.sent) == 1
+
+
+def test_fast_track_rounds_stay_within_the_cycle_budget(monkeypatch) -> None:
+    with pytest.raises(ValidationError, match="confirmation_probe_delay_seconds"):
+        RuntimeConfig.model_validate(
+            {
+                **_config().model_dump(),
+                "confirmation_probe_delay_seconds": 60,
+                "offline_confirmation_cycles": 4,
+            }
+        )
+
+    config = _config().model_copy(
+        update={"confirmation_probe_delay_seconds": 30.0, "offline_confirmation_cycles": 4}
+    )
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    previous_state = {"home": {"status": "online", "changed_at": (now - timedelta(minutes=30)).isoformat()}}
+    clock = {"now": 0.0}
+    sleeps: list[float] = []
+
+    def slow_offline_probes(endpoints, **kwargs):
+        clock["now"] += 40.0
+        return [ProbeResult(False, 0, 1, ("timed out",)) for _ in endpoints]
+
+    def fake_sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+        clock["now"] += seconds
+
+    monkeypatch.setattr("lumenguard.runner.probe_targets", slow_offline_probes)
+    monkeypatch.setattr("lumenguard.runner.time.sleep", fake_sleep)
+    monkeypatch.setattr("lumenguard.runner.time.monotonic", lambda: clock["now"])
+
+    state, _ = run_cycle(config, previous_state, now=now, outbox=Outbox())
+
+    assert sleeps == [30.0]
+    assert state["home"]["status"] == "online"
+    assert state["home"]["pending_count"] == 2
+
+
+def test_run_cycle_probes_a_shared_endpoint_once(monkeypatch, capsys) -> None:
+    base = _config()
+    config = RuntimeConfig.model_validate(
+        {
+            **base.model_dump(),
+            "monitor_config": [
+                {**base.monitor_config[0].model_dump(), "id": f"home-{index}", "chat_id": f"-100{index}"}
+                for index in range(3)
+            ]
+            + [{**base.monitor_config[0].model_dump(), "id": "office", "port": 8443}],
+        }
+    )
+    probed: list[list[tuple[str, int]]] = []
+
+    def fake_probe_targets(endpoints, **kwargs):
+        probed.append(list(endpoints))
+        return [ProbeResult(True, 1, 1, ())] * len(endpoints)
+
+    monkeypatch.setattr("lumenguard.runner.probe_targets", fake_probe_targets)
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+
+    state, _ = run_cycle(config, {}, now=now, notifier=_FakeNotifier())
+
+    assert probed == [[("1.2.3.4", 443), ("1.2.3.4", 8443)]]
+    assert sorted(state) == ["home-0", "home-1", "home-2", "office"]
+    assert "заощаджено 2" in capsys.readouterr().out
+
+
+def test_multi_endpoint_target_is_probed_as_one_group(monkeypatch) -> None:
+    base = _config()
+    config = RuntimeConfig.model_validate(
+        {
+            **base.model_dump(),
+            "monitor_config": [
+                {
+                    "id": "home",
+                    "name": "Квартира",
+                    "endpoints": [{"host": "Router.example", "port": 443}, {"host": "5.6.7.8", "port": 80}],
+                    "endpoint_rule": "quorum",
+                    "endpoint_quorum": 2,
+                    "chat_id": "-100123456789",
+                }
+            ],
+        }
+    )
+    probed: list = []
+
+    def fake_probe_targets(endpoints, **kwargs):
+        probed.extend(endpoints)
+        return [ProbeResult(True, 2, 2, ())] * len(endpoints)
+
+    monkeypatch.setattr("lumenguard.runner.probe_targets", fake_probe_targets)
+
+    run_cycle(config, {}, now=datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc), notifier=_FakeNotifier())
+
+    (group,) = probed
+    target = config.monitor_config[0]
+    assert (target.host, target.port) == ("Router.example", 443)
+    assert group == EndpointGroup((("router.example", 443), ("5.6.7.8", 80)), rule="quorum", quorum=2)
+
+
+def test_endpoint_quorum_cannot_exceed_endpoint_count() -> None:
+    target = {**_config().monitor_config[0].model_dump(), "endpoint_rule": "quorum", "endpoint_quorum": 2}
+
+    with pytest.raises(ValidationError):
+        RuntimeConfig.model_validate({**_config().model_dump(), "monitor_config": [target]})
+
+
+def test_target_id_cannot_contain_nul() -> None:
+    target = {**_config().monitor_config[0].model_dump(), "id": "home\0annex"}
+
+    with pytest.raises(ValidationError, match="NUL"):
+        RuntimeConfig.model_validate({**_config().model_dump(), "monitor_config": [target]})
+
+
+def _sentinel_config(mode: str) -> RuntimeConfig:
+    base = _config()
+    return RuntimeConfig.model_validate(
+        {
+            **base.model_dump(),
+            "monitor_config": [
+                base.monitor_config[0].model_dump(),
+                {**base.monitor_config[0].model_dump(), "id": "dacha", "host": "5.6.7.8"},
+            ],
+            "sentinel_endpoints": [{"host": "1.1.1.1", "port": 443}, {"host": "8.8.8.8", "port": 53}],
+            "sentinel_mode": mode,
+        }
+    )
+
+
+@pytest.mark.parametrize("mode", ["abort", "freeze"])
+def test_sentinels_down_before_probing_skip_the_targets(monkeypatch, mode) -> None:
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    probed: list[list] = []
+
+    def fake_probe_targets(endpoints, **kwargs):
+        probed.append(list(endpoints))
+        return [ProbeResult(False, 0, 3, ("timed out",)) for _ in endpoints]
+
+    monkeypatch.setattr("lumenguard.runner.probe_targets", fake_probe_targets)
+    metrics = CycleMetrics()
+    previous_state = {"home": {"status": "online", "changed_at": (now - timedelta(hours=1)).isoformat()}}
+
+    state, has_state_update = run_cycle(_sentinel_config(mode), dict(previous_state), now=now, metrics=metrics)
+
+    assert len(probed) == 1 and isinstance(probed[0][0], EndpointGroup)
+    assert (state, has_state_update) == (previous_state, False)
+    assert metrics.sentinel_suppressed.value(action="skipped") == 2
+    assert metrics.sentinel_checks.value(result="offline") == 1
+
+
+@pytest.mark.parametrize(("mode", "expected_status"), [("abort", "offline"), ("freeze", "online")])
+def test_sentinels_lost_during_the_pass_abort_or_freeze_offline_transitions(
+    monkeypatch, mode, expected_status
+) -> None:
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    sentinel_calls = 0
+
+    def fake_probe_targets(endpoints, **kwargs):
+        nonlocal sentinel_calls
+        if isinstance(endpoints[0], EndpointGroup):
+            sentinel_calls += 1
+            return [ProbeResult(sentinel_calls == 1, int(sentinel_calls == 1), 1, ())]
+        return [ProbeResult(endpoint[0] == "1.2.3.4", 1, 1, ()) for endpoint in endpoints]
+
+    monkeypatch.setattr("lumenguard.runner.probe_targets", fake_probe_targets)
+    config = _sentinel_config(mode).model_copy(update={"online_confirmation_cycles": 1, "offline_confirmation_cycles": 1})
+    metrics = CycleMetrics()
+    changed_at = (now - timedelta(hours=1)).isoformat()
+    previous_state = {
+        "home": {"status": "offline", "changed_at": changed_at},
+        "dacha": {"status": "online", "changed_at": changed_at},
+    }
+
+    state, _ = run_cycle(config, dict(previous_state), now=now, notifier=_FakeNotifier(), metrics=metrics)
+
+    assert sentinel_calls == 2
+    assert state["home"]["status"] == expected_status
+    assert state["dacha"] == previous_state["dacha"]
+    suppressed = {"abort": ("discarded", 2), "freeze": ("frozen", 1)}[mode]
+    assert metrics.sentinel_suppressed.value(action=suppressed[0]) == suppressed[1]
+
+
+def test_sentinel_cache_shares_one_verdict_across_close_passes(monkeypatch) -> None:
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    clock = {"now": 0.0}
+    sentinel_calls = 0
+
+    def fake_probe_targets(endpoints, **kwargs):
+        nonlocal sentinel_calls
+        if isinstance(endpoints[0], EndpointGroup):
+            sentinel_calls += 1
+        return [ProbeResult(True, 1, 1, ()) for _ in endpoints]
+
+    monkeypatch.setattr("lumenguard.runner.probe_targets", fake_probe_targets)
+    config = _sentinel_config("freeze")
+    sentinels = SentinelCache(60.0, clock=lambda: clock["now"])
+    metrics = CycleMetrics()
+
+    for target in config.monitor_config:
+        run_cycle(config, {}, now=now, outbox=Outbox(), metrics=metrics, targets=[target], sentinels=sentinels)
+        clock["now"] += 20.0
+    assert sentinel_calls == 1
+
+    clock["now"] += 40.0
+    run_cycle(config, {}, now=now, outbox=Outbox(), targets=config.monitor_config[:1], sentinels=sentinels)
+    assert sentinel_calls == 2
+    assert metrics.sentinel_checks.value(result="online") == 1
+
+
+def test_package_import_defers_heavy_dependencies() -> None:
+    code = (
+        "import sys, lumenguard, lumenguard.logic, lumenguard.metrics; "
+        "print(sorted(m for m in ('pydantic', 'httpx', 'dotenv', 'http.server') if m in sys.modules))"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": str(Path(__file__).resolve().parents[1] / "src")},
+        check=True,
+    )
+
+    assert completed.stdout.strip() == "[]"
+
+
+def test_run_once_saves_the_outbox_before_committing_state(tmp_path, monkeypatch) -> None:
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    state_path = tmp_path / "state.json"
+    outbox_path = tmp_path / "outbox.json"
+    config = _config().model_copy(
+        update={"state_path": str(state_path), "outbox_path": str(outbox_path), "history_path": None}
+    )
+    online = {"home": {"status": "online", "changed_at": (now - timedelta(hours=1)).isoformat()}}
+    save_state(state_path, online)
+
+    def crashing_cycle(config, state, *, outbox, **kwargs):
+        state["home"] = {"status": "offline", "changed_at": now.isoformat()}
+        outbox.enqueue("home", "-100123456789", "🔴 Світло зникло", now=now)
+        raise RuntimeError("crash after the transition was committed")
+
+    monkeypatch.setattr("lumenguard.runner.load_runtime_config", lambda: config)
+    monkeypatch.setattr("lumenguard.runner.run_cycle", crashing_cycle)
+
+    with pytest.raises(RuntimeError):
+        run_once_file_state()
+
+    assert load_state(state_path)["home"]["status"] == "offline"
+    assert [item["target_id"] for item in load_outbox(outbox_path).pending()] == ["home"]
+
+    save_state(state_path, online)
+    outbox_path.unlink()
+
+    def failing_save_outbox(path, outbox):
+        raise OSError("disk full")
+
+    monkeypatch.setattr("lumenguard.runner.save_outbox", failing_save_outbox)
+
+    with pytest.raises(OSError):
+        run_once_file_state()
+
+    assert load_state(state_path) == online
+
+
+def test_selector_fallback_is_reported_by_the_runner(monkeypatch, capsys) -> None:
+    def no_selector():
+        raise OSError("too many open files")
+
+    probed: list[str] = []
+
+    def fake_check(host, port, timeout=3.0):
+        probed.append(host)
+        return True, None
+
+    monkeypatch.setattr("lumenguard.logic.selectors", SimpleNamespace(DefaultSelector=no_selector))
+    monkeypatch.setattr("lumenguard.logic.check_ip_once", fake_check)
+    config = _config().model_copy(update={"probe_engine": "selector"})
+
+    state, _ = run_cycle(config, {}, now=datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc))
+
+    assert probed == ["1.2.3.4"]
+    assert state["home"]["status"] == "online"
+    assert "Selector недоступний" in capsys.readouterr().out
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import random
+
+from lumenguard.scheduler import ProbeScheduler
+
+
+def _fire_times(scheduler: ProbeScheduler, until: float) -> dict[str, list[float]]:
+    fired: dict[str, list[float]] = {}
+    now = scheduler.next_due()
+    while now is not None and now < until:
+        for target_id in scheduler.pop_due(now):
+            fired.setdefault(target_id, []).append(now)
+        now = scheduler.next_due()
+    return fired
+
+
+def test_targets_sharing_an_interval_are_spread_across_it() -> None:
+    scheduler = ProbeScheduler()
+    scheduler.sync([(f"t{index}", 300.0) for index in range(10)], now=0.0)
+
+    fired = _fire_times(scheduler, until=600.0)
+
+    assert sorted(times[0] for times in fired.values()) == [30.0 * index for index in range(10)]
+    assert all(times[1] - times[0] == 300.0 for times in fired.values())
+
+
+def test_jitter_delays_firings_without_drift() -> None:
+    scheduler = ProbeScheduler(jitter_ratio=0.1, rng=random.Random(3))
+    scheduler.sync([("home", 100.0)], now=0.0)
+
+    (times,) = _fire_times(scheduler, until=1000.0).values()
+
+    assert len(times) == 10
+    assert all(100.0 * index <= moment <= 100.0 * index + 10.0 for index, moment in enumerate(times))
+
+
+def test_sync_keeps_phase_drops_removed_and_skips_missed_firings() -> None:
+    scheduler = ProbeScheduler()
+    scheduler.sync([("a", 60.0), ("b", 60.0)], now=0.0)
+    scheduler.pop_due(0.0)
+
+    scheduler.sync([("a", 120.0), ("c", 30.0)], now=10.0)
+
+    assert len(scheduler) == 2
+    assert scheduler.pop_due(10.0) == ["c"]
+    assert scheduler.pop_due(60.0) == ["c", "a"]
+    assert scheduler.pop_due(1000.0) == ["c", "a"]
+    assert scheduler.skipped == 31 + 6
+    assert scheduler.next_due() == 1020.0
+
+
+def test_probe_once_adds_an_extra_firing_without_moving_the_schedule() -> None:
+    scheduler = ProbeScheduler()
+    scheduler.sync([("home", 300.0)], now=0.0)
+    scheduler.pop_due(0.0)
+
+    scheduler.probe_once(["home", "removed"], at=15.0)
+
+    assert scheduler.next_due() == 15.0
+    assert scheduler.pop_due(15.0) == ["home"]
+    assert scheduler.next_due() == 300.0
+    assert scheduler.skipped == 0
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from lumenguard.config import RuntimeConfig
+from lumenguard.logic import ProbeResult
+from lumenguard.metrics import CycleMetrics
+from lumenguard.outbox import Outbox
+from lumenguard.runner import run_cycle
+from lumenguard.sharding import executor_shard_map, local_shard_map, run_sharded_cycle, shard_targets
+
+
+def _config(target_count: int) -> RuntimeConfig:
+    return RuntimeConfig.model_validate(
+        {
+            "telegram_bot_token": "123456789:AAExampleToken",
+            "monitor_config": [
+                {
+                    "id": f"target-{index}",
+                    "name": f"Об'єкт {index}",
+                    "host": f"10.0.{index // 200}.{index % 200 + 1}",
+                    "port": 443,
+                    "chat_id": f"-100{index % 3}",
+                }
+                for index in range(target_count)
+            ],
+            "offline_confirmation_cycles": 1,
+            "shard_size": 4,
+        }
+    )
+
+
+def _fake_probes(endpoints, **kwargs):
+    probe = ProbeResult(is_online=False, successful_attempts=0, total_attempts=1, errors=("timed out",))
+    return [probe] * len(endpoints)
+
+
+def test_shard_targets_is_stable_and_covers_every_target() -> None:
+    targets = _config(40).monitor_config
+
+    shards = shard_targets(targets, 5)
+    reshuffled = shard_targets(list(reversed(targets)), 5)
+
+    assert sorted(target.id for shard in shards for target in shard) == sorted(t.id for t in targets)
+    assert [{t.id for t in shard} for shard in shards] == [{t.id for t in shard} for shard in reshuffled]
+
+
+def test_targets_sharing_an_endpoint_land_in_one_shard() -> None:
+    config = _config(12)
+    shared = [
+        target.model_copy(update={"host": "Shared.Example", "port": 8443})
+        for target in config.monitor_config[:4]
+    ]
+
+    shards = shard_targets(shared + config.monitor_config[4:], 5)
+
+    assert sum(1 for shard in shards if any(target.host == "Shared.Example" for target in shard)) == 1
+
+
+def test_sharded_cycle_matches_single_cycle(monkeypatch) -> None:
+    monkeypatch.setattr("lumenguard.runner.probe_targets", _fake_probes)
+    config = _config(20)
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    previous = {
+        target.id: {"status": "online", "changed_at": (now - timedelta(hours=1)).isoformat()}
+        for target in config.monitor_config
+    }
+
+    single_outbox = Outbox()
+    single_state, _ = run_cycle(config, dict(previous), now=now, outbox=single_outbox)
+
+    sharded_outbox = Outbox()
+    metrics = CycleMetrics()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        sharded_state, has_state_update = run_sharded_cycle(
+            config,
+            dict(previous),
+            now=now,
+            outbox=sharded_outbox,
+            shard_count=5,
+            shard_map=executor_shard_map(executor),
+            metrics=metrics,
+        )
+
+    assert has_state_update is True
+    assert sharded_state == single_state
+    assert sharded_outbox.snapshot() == single_outbox.snapshot()
+    assert metrics.probes.value(status="offline") == 20
+    assert metrics.cycle_duration.count() == sum(1 for shard in shard_targets(config.monitor_config, 5) if shard)
+
+
+def test_shard_payloads_do_not_carry_the_bot_token(monkeypatch) -> None:
+    monkeypatch.setattr("lumenguard.runner.probe_targets", _fake_probes)
+    config = _config(8)
+    seen: list[dict] = []
+
+    def recording_map(config_payloads, shard_states, now_isos):
+        seen.extend(config_payloads)
+        return local_shard_map(config_payloads, shard_states, now_isos)
+
+    run_sharded_cycle(
+        config,
+        {},
+        now=datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc),
+        outbox=Outbox(),
+        shard_count=3,
+        shard_map=recording_map,
+    )
+
+    assert seen
+    assert all("telegram_bot_token" not in payload for payload in seen)
+    assert config.telegram_bot_token not in repr(seen)
+
+
+def test_failed_shard_abstains_and_a_raising_map_merges_nothing(monkeypatch) -> None:
+    monkeypatch.setattr("lumenguard.runner.probe_targets", _fake_probes)
+    config = _config(12)
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    previous = {
+        target.id: {"status": "online", "changed_at": (now - timedelta(hours=1)).isoformat()}
+        for target in config.monitor_config
+    }
+    failed_ids = {target.id for target in shard_targets(config.monitor_config, 3)[1]}
+
+    def one_shard_lost(config_payloads, shard_states, now_isos):
+        results = list(local_shard_map(config_payloads, shard_states, now_isos))
+        results[1] = ConnectionError("container lost")
+        return results
+
+    outbox = Outbox()
+    state, has_state_update = run_sharded_cycle(
+        config, dict(previous), now=now, outbox=outbox, shard_count=3, shard_map=one_shard_lost
+    )
+
+    assert has_state_update
+    assert {target_id for target_id, entry in state.items() if entry == previous[target_id]} == failed_ids
+    assert {item["target_id"] for item in outbox.pending()} == set(previous) - failed_ids
+
+    def raising_map(config_payloads, shard_states, now_isos):
+        yield from local_shard_map(config_payloads[:1], shard_states[:1], now_isos[:1])
+        raise ConnectionError("map failed")
+
+    outbox = Outbox()
+    state = dict(previous)
+    with pytest.raises(ConnectionError):
+        run_sharded_cycle(config, state, now=now, outbox=outbox, shard_count=3, shard_map=raising_map)
+
+    assert state == previous
+    assert len(outbox) == 0
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import pytest
+
+from lumenguard.logic import coerce_state, save_state
+from lumenguard.snapshot import SnapshotError, SnapshotReader, decode_snapshot, encode_snapshot, write_snapshot
+from lumenguard.state_store import SnapshotStateStore, open_state_store
+
+ONLINE = {"status": "online", "changed_at": "2026-02-10T12:00:00+00:00"}
+PENDING = {
+    "status": "online",
+    "changed_at": "2026-02-10T12:00:00+00:00",
+    "pending_status": "offline",
+    "pending_count": 1,
+    "pending_since": "2026-02-10T12:05:00+00:00",
+}
+STATES = {"home": ONLINE, "дача": PENDING, "garage": {"status": "offline", "changed_at": "2026-02-09T08:30:00+00:00"}}
+
+
+def test_snapshot_round_trips_and_reads_single_targets_via_mmap(tmp_path) -> None:
+    assert decode_snapshot(encode_snapshot(STATES)).to_states() == STATES
+    assert decode_snapshot(encode_snapshot({})).to_states() == {}
+
+    path = tmp_path / "state.lgs"
+    write_snapshot(path, STATES)
+    with SnapshotReader(path) as reader:
+        assert len(reader) == 3
+        assert list(reader) == sorted(STATES, key=lambda target_id: target_id.encode("utf-8"))
+        assert reader.get("дача") == PENDING
+        assert reader.get("home") == ONLINE
+        assert reader.get("missing") is None
+        assert "garage" in reader and "gar" not in reader
+        assert reader.to_table().to_states() == STATES
+
+
+def test_corrupt_snapshot_is_rejected() -> None:
+    data = bytearray(encode_snapshot(STATES))
+    data[-1] ^= 0xFF
+    with pytest.raises(SnapshotError, match="контрольна сума"):
+        decode_snapshot(data)
+    with pytest.raises(SnapshotError):
+        decode_snapshot(b"LGS1")
+    assert coerce_state(bytes(data)) == {}
+    assert coerce_state(encode_snapshot(STATES)) == STATES
+
+
+def test_snapshot_store_migrates_legacy_json_and_persists_changes(tmp_path) -> None:
+    save_state(tmp_path / "state.json", STATES)
+    store = open_state_store(tmp_path / "state.json", "snapshot")
+    assert isinstance(store, SnapshotStateStore)
+    assert store.path == tmp_path / "state.lgs"
+    assert dict(store) == STATES
+
+    store["home"] = PENDING
+    del store["garage"]
+    assert store.flush() == 2
+    assert len(store) == 2
+
+    reopened = SnapshotStateStore(tmp_path / "state.lgs", legacy_json_path=tmp_path / "state.json")
+    assert dict(reopened) == {"home": PENDING, "дача": PENDING}
+
+
+def test_snapshot_store_falls_back_to_json_when_snapshot_is_unreadable(tmp_path, capsys) -> None:
+    save_state(tmp_path / "state.json", STATES)
+    (tmp_path / "state.lgs").write_bytes(b"garbage")
+
+    store = SnapshotStateStore(tmp_path / "state.lgs", legacy_json_path=tmp_path / "state.json")
+
+    assert dict(store) == STATES
+    assert "Не вдалося прочитати знімок стану" in capsys.readouterr().out
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from datetime import datetime, timezone
+
+from lumenguard.logic import save_state
+from lumenguard.state_store import (
+    JsonStateStore,
+    MappingStateStore,
+    SnapshotStateStore,
+    SqliteStateStore,
+    StateLease,
+    compare_and_store,
+    open_state_store,
+)
+
+ONLINE = {"status": "online", "changed_at": "2026-02-10T12:00:00+00:00"}
+PENDING = {
+    "status": "online",
+    "changed_at": "2026-02-10T12:00:00+00:00",
+    "pending_status": "offline",
+    "pending_count": 1,
+    "pending_since": "2026-02-10T12:05:00+00:00",
+}
+
+
+def test_sqlite_store_upserts_only_changed_entries(tmp_path) -> None:
+    store = SqliteStateStore(tmp_path / "state.sqlite3")
+    store["home"] = ONLINE
+    store["garage"] = ONLINE
+    assert store.flush() == 2
+
+    store["home"] = PENDING
+    assert store.flush() == 1
+    assert store.flush() == 0
+    store.close()
+
+    reopened = SqliteStateStore(tmp_path / "state.sqlite3")
+    assert reopened.get("home") == PENDING
+    assert reopened.get("garage") == ONLINE
+    assert reopened.get("missing") is None
+    reopened.close()
+
+
+def test_sqlite_store_migrates_legacy_json_once(tmp_path) -> None:
+    legacy_path = tmp_path / "state.json"
+    save_state(legacy_path, {"home": PENDING})
+
+    store = open_state_store(legacy_path, "sqlite")
+    assert isinstance(store, SqliteStateStore)
+    assert dict(store) == {"home": PENDING}
+    store["home"] = ONLINE
+    store.close()
+
+    save_state(legacy_path, {"home": PENDING, "garage": ONLINE})
+    reopened = open_state_store(legacy_path, "sqlite")
+    assert dict(reopened) == {"home": ONLINE}
+    reopened.close()
+
+    with sqlite3.connect(tmp_path / "state.sqlite3") as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_prune_removes_orphaned_entries(tmp_path) -> None:
+    for store in (JsonStateStore(tmp_path / "state.json"), SqliteStateStore(tmp_path / "state.db")):
+        store["home"] = ONLINE
+        store["removed"] = ONLINE
+        store.flush()
+
+        assert store.prune(["home"]) == 1
+        store.close()
+
+    assert json.loads((tmp_path / "state.json").read_text(encoding="utf-8")) == {"home": ONLINE}
+    reopened = SqliteStateStore(tmp_path / "state.db")
+    assert list(reopened) == ["home"]
+    reopened.close()
+
+
+def test_mapping_store_splits_legacy_blob_and_writes_only_changed_keys() -> None:
+    shared: dict = {"state": {"home": ONLINE, "garage": ONLINE}}
+
+    store = MappingStateStore(shared)
+    assert dict(store) == {"home": ONLINE, "garage": ONLINE}
+    assert "state" not in shared
+    assert shared["target:home"] == {"version": 1, "state": ONLINE}
+
+    store["home"] = PENDING
+    store.flush()
+
+    assert shared["target:home"] == {"version": 2, "state": PENDING}
+    assert shared["target:garage"] == {"version": 1, "state": ONLINE}
+
+
+def test_mapping_store_skips_entries_changed_by_another_writer() -> None:
+    shared: dict = {"target:home": {"version": 1, "state": ONLINE}}
+    first = MappingStateStore(shared)
+    second = MappingStateStore(shared)
+    assert first["home"] == second["home"] == ONLINE
+
+    first["home"] = PENDING
+    first.flush()
+    second["home"] = {"status": "offline", "changed_at": "2026-02-10T12:10:00+00:00"}
+    second.flush()
+
+    assert second.conflicts == {"home"}
+    assert shared["target:home"] == {"version": 2, "state": PENDING}
+
+
+class _CountingMapping(dict):
+    """Dict that counts reads the way a `modal.Dict` would pay for them (one round-trip each)."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.gets = 0
+        self.scans = 0
+
+    def get(self, key, default=None):
+        self.gets += 1
+        return super().get(key, default)
+
+    def items(self):
+        self.scans += 1
+        return super().items()
+
+
+def test_mapping_store_rereads_many_versions_in_one_scan() -> None:
+    shared = _CountingMapping({f"target:t{index}": {"version": 1, "state": ONLINE} for index in range(40)})
+    store = MappingStateStore(shared)
+    other = MappingStateStore(shared)
+    assert len(store) == len(other) == 40
+
+    other["t3"] = PENDING
+    other.flush()
+    shared.gets = shared.scans = 0
+    for index in range(40):
+        store[f"t{index}"] = PENDING
+    store.flush()
+
+    assert (shared.gets, shared.scans) == (0, 1)
+    assert store.conflicts == {"t3"}
+    assert shared["target:t0"] == {"version": 2, "state": PENDING}
+
+
+def test_state_lease_is_exclusive_until_released_or_expired() -> None:
+    shared: dict = {}
+    clock = {"now": 1000.0}
+    first = StateLease(shared, ttl_seconds=300, clock=lambda: clock["now"])
+    second = StateLease(shared, ttl_seconds=300, clock=lambda: clock["now"])
+
+    assert first.acquire() is True
+    assert second.acquire() is False
+
+    clock["now"] += 301
+    assert second.acquire() is True
+
+    first.release()
+    assert shared["lease:1"]["owner"] == second.owner
+    assert first.acquire() is False
+    second.release()
+    assert first.acquire() is True
+    assert first.generation == 2
+
+
+class _RacingMapping(dict):
+    """Runs `rival` right after the first read of `lease:0`, between the expiry check and the claim."""
+
+    def __init__(self, *args, rival=None) -> None:
+        super().__init__(*args)
+        self.rival = rival
+
+    def get(self, key, default=None):
+        value = super().get(key, default)
+        if key == "lease:0" and self.rival is not None:
+            rival, self.rival = self.rival, None
+            rival()
+        return value
+
+    def put(self, key, value, *, skip_if_exists=False):
+        if skip_if_exists and key in self:
+            return False
+        self[key] = value
+        return True
+
+
+def test_state_lease_race_on_an_expired_lease_has_one_winner() -> None:
+    shared = _RacingMapping({"lease:0": {"owner": "crashed", "expires_at": 0.0}, "lease:newest": 0})
+    first = StateLease(shared, clock=lambda: 1000.0)
+    second = StateLease(shared, clock=lambda: 1000.0)
+    shared.rival = second.acquire
+
+    assert first.acquire() is False
+    assert second.generation == 1
+    assert shared["lease:1"]["owner"] == second.owner
+
+
+def test_snapshot_store_compares_in_one_batch_like_the_dict_path(tmp_path, monkeypatch) -> None:
+    states = {"home": ONLINE, "garage": PENDING, "dacha": ONLINE}
+    plain = dict(states)
+    snapshot_store = SnapshotStateStore(tmp_path / "state.lgs")
+    snapshot_store.update(states)
+    snapshot_store.flush()
+    monkeypatch.setattr("lumenguard.state_store.compare_states", None)  # the batch path must not need it
+    now = datetime(2026, 2, 10, 12, 5, tzinfo=timezone.utc)
+    ids = ["home", "garage", "dacha", "new"]
+    observations = [True, False, False, True]
+
+    batched = compare_and_store(
+        snapshot_store, ids, observations, now=now, offline_confirmation_cycles=2, online_confirmation_cycles=2
+    )
+    monkeypatch.undo()
+    expected = compare_and_store(
+        plain, ids, observations, now=now, offline_confirmation_cycles=2, online_confirmation_cycles=2
+    )
+
+    assert batched == expected
+    assert batched[0] is None and batched[1].changed and batched[3].is_first_observation
+    assert dict(snapshot_store) == plain
+    assert snapshot_store.flush() == 3
+    assert dict(SnapshotStateStore(tmp_path / "state.lgs")) == plain
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import random
+from datetime import datetime, timedelta, timezone
+
+from lumenguard.logic import compare_states
+from lumenguard.state_table import StateTable, compare_states_batch
+
+NOW = datetime(2026, 3, 1, 12, 0, 30, 250_000, tzinfo=timezone.utc)
+
+
+def _random_state(rng: random.Random) -> dict | None:
+    if rng.random() < 0.1:
+        return None
+    moment = (NOW - timedelta(seconds=rng.randint(0, 90_000), microseconds=rng.randint(0, 999_999))).isoformat()
+    state: dict = {"status": rng.choice(["online", "offline", "online", "offline", "unknown"])}
+    if rng.random() < 0.95:
+        state["changed_at"] = moment
+    if rng.random() < 0.5:
+        state["pending_status"] = rng.choice(["online", "offline"])
+        if rng.random() < 0.9:
+            state["pending_count"] = rng.randint(1, 4)
+        if rng.random() < 0.9:
+            state["pending_since"] = (NOW - timedelta(seconds=rng.randint(0, 600))).isoformat()
+    return state
+
+
+def test_batch_matches_compare_states_exactly() -> None:
+    rng = random.Random(20)
+    for confirmations in ((1, 1), (2, 2), (3, 1)):
+        states = {f"t{index}": _random_state(rng) for index in range(3000)}
+        observations = [rng.random() < 0.5 for _ in states]
+        table = StateTable.from_states({key: value for key, value in states.items() if value is not None})
+
+        batch = compare_states_batch(
+            table,
+            table.rows(states),
+            observations,
+            now=NOW,
+            offline_confirmation_cycles=confirmations[0],
+            online_confirmation_cycles=confirmations[1],
+        )
+
+        for position, ((target_id, state), is_online) in enumerate(zip(states.items(), observations)):
+            expected = compare_states(
+                state,
+                is_online,
+                now=NOW,
+                offline_confirmation_cycles=confirmations[0],
+                online_confirmation_cycles=confirmations[1],
+            )
+            assert bool(batch.changed[position]) == expected.changed
+            assert bool(batch.state_updated[position]) == expected.state_updated
+            assert bool(batch.first_observation[position]) == expected.is_first_observation
+            assert batch.duration_seconds[position] == expected.duration_seconds
+            if expected.state_updated:
+                assert table.get(target_id) == expected.new_state
+            elif state is not None and state["status"] in {"online", "offline"}:
+                assert table.get(target_id) == state
+
+
+def test_table_round_trips_states_and_is_compact() -> None:
+    states = {
+        f"t{index}": {
+            "status": "offline",
+            "changed_at": "2026-03-01T10:00:00+00:00",
+            "pending_status": "online",
+            "pending_count": 1,
+            "pending_since": "2026-03-01T11:55:00.500000+00:00",
+        }
+        for index in range(1000)
+    }
+    table = StateTable.from_states(states)
+
+    assert table.to_states() == states
+    assert table.nbytes() == 1000 * (1 + 8 + 1 + 8 + 8)
+    assert StateTable.from_states({"x": {"status": "online", "changed_at": "2026-03-01T12:00:00+02:00"}}).get(
+        "x"
+    ) == {"status": "online", "changed_at": "2026-03-01T10:00:00+00:00"}
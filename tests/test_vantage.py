@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from lumenguard.config import RuntimeConfig
+from lumenguard.logic import EndpointGroup, ProbePolicy, ProbeResult
+from lumenguard.metrics import CycleMetrics
+from lumenguard.outbox import Outbox
+from lumenguard.runner import run_cycle
+from lumenguard.vantage import (
+    Consensus,
+    Vantage,
+    decode_request,
+    encode_request,
+    encode_result,
+    probe_with_consensus,
+    run_vantage_probe,
+)
+
+
+def _config(**overrides) -> RuntimeConfig:
+    target = {"id": "home", "name": "Квартира", "host": "1.2.3.4", "port": 443, "chat_id": "-100123456789"}
+    return RuntimeConfig.model_validate(
+        {
+            "telegram_bot_token": "123456789:AAExampleToken",
+            "monitor_config": [target, {**target, "id": "dacha", "host": "5.6.7.8"}],
+            "check_attempt_delay_seconds": 0.0,
+            "offline_confirmation_cycles": 1,
+            "online_confirmation_cycles": 1,
+            **overrides,
+        }
+    )
+
+
+def _stand_in(name: str, online_hosts: set[str], *, gate: threading.Event | None = None) -> Vantage:
+    """In-process vantage that sees `online_hosts` online, optionally blocking on `gate` first."""
+
+    def call(config_payload, request):
+        if gate is not None:
+            gate.wait(5)
+        items, _ = decode_request(request)
+        return [encode_result(ProbeResult(item[0] in online_hosts, 1, 1, ())) for item in items]
+
+    return Vantage(name, call)
+
+
+ITEMS = [("1.2.3.4", 443), ("5.6.7.8", 443)]
+POLICIES = [ProbePolicy(), ProbePolicy()]
+
+
+@pytest.mark.parametrize(
+    ("rule", "expected"),
+    [("majority", [True, False]), ("any", [True, True]), ("all", [False, False]), ("quorum", [True, False])],
+)
+def test_votes_merge_by_consensus_rule(rule, expected) -> None:
+    vantages = [
+        _stand_in("kyiv", {"1.2.3.4", "5.6.7.8"}),
+        _stand_in("frankfurt", {"1.2.3.4"}),
+        _stand_in("virginia", set()),
+    ]
+    metrics = CycleMetrics()
+
+    results = probe_with_consensus(
+        vantages, _config(vantage_consensus=rule, vantage_quorum=2), ITEMS, POLICIES, metrics=metrics
+    )
+
+    assert [result.is_online for result in results] == expected
+    assert all(result.is_conclusive for result in results)
+    assert results[0].total_attempts == 3
+    assert metrics.vantage_votes.value(vantage="frankfurt", result="offline") == 1
+
+
+def test_consensus_returns_without_waiting_for_a_slow_vantage() -> None:
+    gate = threading.Event()
+    vantages = [
+        _stand_in("kyiv", {"1.2.3.4"}),
+        _stand_in("frankfurt", {"1.2.3.4"}),
+        _stand_in("stuck", {"5.6.7.8"}, gate=gate),
+    ]
+    try:
+        results = probe_with_consensus(vantages, _config(), ITEMS, POLICIES)
+    finally:
+        gate.set()
+
+    assert [result.is_online for result in results] == [True, False]
+    assert not any(error.startswith("stuck") for result in results for error in result.errors)
+
+
+def test_failed_vantage_abstains_and_an_open_vote_stays_inconclusive() -> None:
+    def broken(config_payload, request):
+        raise ConnectionError("region unavailable")
+
+    vantages = [_stand_in("kyiv", {"1.2.3.4"}), _stand_in("frankfurt", set()), Vantage("virginia", broken)]
+    metrics = CycleMetrics()
+
+    home, dacha = probe_with_consensus(vantages, _config(), ITEMS, POLICIES, metrics=metrics)
+
+    assert not home.is_conclusive and "онлайн 1, офлайн 1" in home.dns_error
+    assert dacha.is_conclusive and not dacha.is_online
+    assert metrics.vantage_votes.value(vantage="virginia", result="error") == 2
+
+
+def test_vantages_never_receive_the_bot_token() -> None:
+    payloads: list[dict] = []
+
+    def call(config_payload, request):
+        payloads.append(config_payload)
+        return [encode_result(ProbeResult(True, 1, 1, ())) for _ in ITEMS]
+
+    config = _config()
+    probe_with_consensus([Vantage("kyiv", call)], config, ITEMS, POLICIES)
+
+    assert payloads and "telegram_bot_token" not in payloads[0]
+    assert config.telegram_bot_token not in repr(payloads)
+
+
+def test_consensus_required_votes() -> None:
+    assert [Consensus("majority").required_online(n) for n in (1, 2, 3, 4)] == [1, 2, 2, 3]
+    assert Consensus("quorum", quorum=5).required_online(3) == 3
+    assert Consensus("all").decision(online=2, offline=0, voters=3) is None
+    assert Consensus("all").decision(online=0, offline=1, voters=3) is False
+
+
+def test_worker_round_trips_groups_and_policies(monkeypatch) -> None:
+    seen: dict = {}
+
+    def fake_probe_targets(items, **kwargs):
+        seen.update(items=items, policies=kwargs["policies"])
+        return [ProbeResult(True, 1, 2, ("timed out",), rtt_seconds=(0.02,)) for _ in items]
+
+    monkeypatch.setattr("lumenguard.vantage.probe_targets", fake_probe_targets)
+    group = EndpointGroup((("home.example.net", 443), ("1.2.3.5", 8080)), rule="quorum", quorum=2)
+    policies = [ProbePolicy(mode="quorum", attempts=3, quorum=2), ProbePolicy()]
+    config = _config()
+
+    raw = run_vantage_probe(config.worker_payload(), encode_request([group, ("1.2.3.4", 443)], policies))
+
+    assert seen == {"items": [group, ("1.2.3.4", 443)], "policies": policies}
+    assert raw[0] == {
+        "is_online": True,
+        "successful_attempts": 1,
+        "total_attempts": 2,
+        "errors": ("timed out",),
+        "rtt_seconds": (0.02,),
+        "slept_seconds": 0.0,
+        "resolve_seconds": 0.0,
+        "dns_error": None,
+        "inconclusive_reason": None,
+    }
+
+
+def test_run_cycle_applies_the_vantage_consensus(monkeypatch) -> None:
+    def local_probe_targets(items, **kwargs):
+        raise AssertionError("with vantages the cycle must not probe on its own")
+
+    monkeypatch.setattr("lumenguard.runner.probe_targets", local_probe_targets)
+    now = datetime(2026, 2, 11, 10, 0, tzinfo=timezone.utc)
+    changed_at = (now - timedelta(hours=1)).isoformat()
+    previous_state = {
+        "home": {"status": "online", "changed_at": changed_at},
+        "dacha": {"status": "online", "changed_at": changed_at},
+    }
+    vantages = [
+        _stand_in("kyiv", {"1.2.3.4"}),
+        _stand_in("frankfurt", {"1.2.3.4", "5.6.7.8"}),
+        _stand_in("virginia", {"1.2.3.4"}),
+    ]
+    outbox = Outbox()
+
+    state, has_state_update = run_cycle(_config(), dict(previous_state), now=now, outbox=outbox, vantages=vantages)
+
+    assert has_state_update
+    assert state["home"] == previous_state["home"]
+    assert state["dacha"]["status"] == "offline"
+    assert [item["target_id"] for item in outbox.pending()] == ["dacha"]